@@ -3,6 +3,7 @@ from contextlib import asynccontextmanager
 
 from backend.routers import (actions, auth, dashboard, history, learning,
                              settings)
+from backend.services.identity import reload_identity_registry
 from backend.services.scheduler import start_scheduler, stop_scheduler
 from fastapi import FastAPI
 from fastapi.responses import FileResponse, JSONResponse
@@ -26,6 +27,7 @@ async def lifespan(app: FastAPI):
         print(f"Startup Migration Error: {e}")
 
     print("Startup: Database checks complete.")
+    reload_identity_registry()
     start_scheduler()
     yield
     # Shutdown
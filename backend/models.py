@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
+from sqlalchemy import JSON, BigInteger, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
@@ -27,6 +28,10 @@ class ProcessedEmail(SQLModel, table=True):
     encrypted_body: Optional[str] = None
     encrypted_html: Optional[str] = None
     retention_expires_at: Optional[datetime] = None
+    # Where the original lives, so it can be re-read with a direct UID FETCH
+    imap_folder: Optional[str] = None
+    imap_uidvalidity: Optional[int] = Field(default=None, sa_type=BigInteger)
+    imap_uid: Optional[int] = Field(default=None, sa_type=BigInteger)
 
 
 class Stats(SQLModel, table=True):
@@ -75,6 +80,12 @@ class ProcessingRun(SQLModel, table=True):
     check_interval_minutes: Optional[int] = (
         None  # The configured interval at the time of run
     )
+    # Per-account fetch results: [{"account", "status", "seconds", "emails"}]
+    account_timings: Optional[list] = Field(default=None, sa_type=JSON)
+    # Detector decisions and time per stage for the run (DetectionStats)
+    detection_stats: Optional[dict] = Field(default=None, sa_type=JSON)
+    # Items, busy/wait time, throughput and queue depth per pipeline stage
+    pipeline_stats: Optional[dict] = Field(default=None, sa_type=JSON)
 
 
 class LearningCandidate(SQLModel, table=True):
@@ -91,3 +102,22 @@ class LearningCandidate(SQLModel, table=True):
     matches: int = 1  # How many emails matched this pattern during scan
     example_subject: Optional[str] = None  # One example subject for context
     created_at: datetime = Field(default_factory=utc_now)
+
+
+class MailboxSyncState(SQLModel, table=True):
+    """
+    Incremental IMAP sync cursor for one account/folder pair.
+    Polls search for UIDs above last_uid while the mailbox UIDVALIDITY is unchanged.
+    """
+
+    __table_args__ = (UniqueConstraint("account_email", "folder"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    account_email: str = Field(index=True)
+    folder: str = "inbox"
+    # UIDVALIDITY and UIDs are unsigned 32-bit values per RFC 3501
+    uidvalidity: Optional[int] = Field(default=None, sa_type=BigInteger)
+    last_uid: int = Field(
+        default=0, sa_type=BigInteger
+    )  # Highest UID fully handled by the scheduler
+    updated_at: datetime = Field(default_factory=utc_now)
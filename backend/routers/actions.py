@@ -12,6 +12,7 @@ from backend.security import generate_hmac_signature, verify_dashboard_token
 from backend.services.command_service import CommandService
 from backend.services.email_service import EmailService
 from backend.services.forwarder import EmailForwarder
+from backend.services.rules_snapshot import bump_rules_version
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
@@ -272,6 +273,7 @@ def update_preferences(
         for item in data.allowed_senders:
             session.add(Preference(item=item, type="Always Forward"))
 
+        bump_rules_version(session)
         session.commit()
         return {"success": True, "message": "Preferences updated"}
 
@@ -331,6 +333,7 @@ def toggle_ignored_email(
             purpose=f"Auto-created from ignored email: {truncated_subject}",
         )
         session.add(manual_rule)
+        bump_rules_version(session)
     else:
         manual_rule = existing_rule
 
@@ -345,6 +348,9 @@ def toggle_ignored_email(
     # 1. Get credentials for the source account
     creds = EmailService.get_credentials_for_account(str(email.account_email))
 
+    # Recorded UID location is only meaningful for the account that received it
+    location = None
+
     if not creds:
         # Fallback to SENDER_EMAIL if specific account not found
         email_user = os.environ.get("SENDER_EMAIL")
@@ -358,6 +364,7 @@ def toggle_ignored_email(
         email_user = creds["email"]
         email_pass = creds["password"]
         imap_server = creds["imap_server"]
+        location = EmailService.get_message_location(email)
 
     first_attempt_user = email_user
 
@@ -367,7 +374,7 @@ def toggle_ignored_email(
         # Do not log credentials, passwords, or account objects. Only log minimal, non-sensitive account identifier.
         print(f"DEBUG: Fetching email {email.email_id} for [REDACTED_ACCOUNT]")
         original_content = EmailService.fetch_email_by_id(
-            email_user, email_pass, email.email_id, imap_server
+            email_user, email_pass, email.email_id, imap_server, location=location
         )
 
     # 2b. Universal Fallback: If not found, try all other accounts
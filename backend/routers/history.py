@@ -9,6 +9,7 @@ from backend.security import decrypt_content
 from backend.services.detector import ReceiptDetector
 from backend.services.email_service import EmailService
 from backend.services.forwarder import EmailForwarder
+from backend.services.rules_snapshot import bump_rules_version, get_rules_snapshot
 from fastapi import APIRouter, Body, Depends, HTTPException, Query
 from sqlmodel import Session, and_, func, select
 
@@ -125,7 +126,11 @@ def reprocess_email(email_id: int, session: Session = Depends(get_session)):
             )
 
         fetched = EmailService.fetch_email_by_id(
-            email.account_email, creds["password"], email.email_id, creds["imap_server"]
+            email.account_email,
+            creds["password"],
+            email.email_id,
+            creds["imap_server"],
+            location=EmailService.get_message_location(email),
         )
         if not fetched:
             raise HTTPException(status_code=404, detail="Email not found in IMAP inbox")
@@ -141,12 +146,15 @@ def reprocess_email(email_id: int, session: Session = Depends(get_session)):
         "html_body": html_body,
     }
 
-    analysis = ReceiptDetector.debug_is_receipt(email_data, session=session)
-    category = ReceiptDetector.categorize_receipt(email_data)
+    # One evaluation: decision, trace, matched IDs and per-stage timings.
+    # The shared rules snapshot lets an unchanged email reuse a cached result.
+    analysis = ReceiptDetector.debug_is_receipt(
+        email_data, rules=get_rules_snapshot(session)
+    )
 
     return {
         "analysis": analysis,
-        "category": category,
+        "category": analysis.get("category"),
         "current_status": email.status,
         "suggested_status": "forwarded" if analysis["final_decision"] else "blocked",
     }
@@ -184,6 +192,7 @@ def submit_feedback(
                 match_count=0,
             )
             session.add(new_rule)
+            bump_rules_version(session)
 
     session.commit()
     return {"status": "success", "message": "Feedback recorded and rule suggested"}
@@ -208,25 +217,31 @@ def reprocess_all_ignored(session: Session = Depends(get_session)):
     forwarded_count = 0
     target_email = os.environ.get("WIFE_EMAIL")
 
+    batch = []
     for email in ignored_emails:
         body = decrypt_content(email.encrypted_body or "")
         html_body = decrypt_content(email.encrypted_html or "")
 
-        email_data = {
-            "subject": email.subject,
-            "from": email.sender,
-            "body": body,
-            "html_body": html_body,
-            "message_id": email.email_id,
-            "date": email.received_at,  # format_email_date will handle datetime objects
-        }
-
-        is_receipt = ReceiptDetector.is_receipt(email_data, session=session)
-        if is_receipt and target_email:
+        batch.append(
+            {
+                "subject": email.subject,
+                "from": email.sender,
+                "body": body,
+                "html_body": html_body,
+                "message_id": email.email_id,
+                "date": email.received_at,  # format_email_date will handle datetime objects
+            }
+        )
+
+    # Rules and preferences are loaded once and the batch classified together
+    results = ReceiptDetector.classify_batch(batch, session=session)
+
+    for email, email_data, result in zip(ignored_emails, batch, results):
+        if result.is_receipt and target_email:
             success = EmailForwarder.forward_email(email_data, target_email)
             if success:
                 email.status = "forwarded"
-                email.category = ReceiptDetector.categorize_receipt(email_data)
+                email.category = result.category
                 email.reason = "Reprocessed: Now detected as receipt"
                 session.add(email)
                 forwarded_count += 1
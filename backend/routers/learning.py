@@ -4,6 +4,7 @@ from typing import List
 from backend.database import engine, get_session
 from backend.models import LearningCandidate, ManualRule
 from backend.services.learning_service import LearningService
+from backend.services.rules_snapshot import bump_rules_version
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlmodel import Session, desc, select
 
@@ -70,6 +71,7 @@ def approve_candidate(candidate_id: int, session: Session = Depends(get_session)
         new_rule.subject_pattern = candidate.subject_pattern
 
     session.add(new_rule)
+    bump_rules_version(session)
 
     # Remove the candidate after approval
     session.delete(candidate)
@@ -3,7 +3,10 @@ from typing import List
 from backend.constants import DEFAULT_EMAIL_TEMPLATE
 from backend.database import get_session
 from backend.models import GlobalSettings, ManualRule, Preference
+from backend.services.detection_cache import detection_cache
 from backend.services.email_service import EmailService
+from backend.services.imap_pool import imap_pool
+from backend.services.rules_snapshot import bump_rules_version
 from backend.services.scheduler import process_emails
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel
@@ -20,6 +23,7 @@ def get_preferences(session: Session = Depends(get_session)):
 @router.post("/preferences", response_model=Preference)
 def create_preference(pref: Preference, session: Session = Depends(get_session)):
     session.add(pref)
+    bump_rules_version(session)
     session.commit()
     session.refresh(pref)
     return pref
@@ -31,6 +35,7 @@ def delete_preference(pref_id: int, session: Session = Depends(get_session)):
     if not pref:
         raise HTTPException(status_code=404, detail="Preference not found")
     session.delete(pref)
+    bump_rules_version(session)
     session.commit()
     return {"ok": True}
 
@@ -43,6 +48,7 @@ def get_rules(session: Session = Depends(get_session)):
 @router.post("/rules", response_model=ManualRule)
 def create_rule(rule: ManualRule, session: Session = Depends(get_session)):
     session.add(rule)
+    bump_rules_version(session)
     session.commit()
     session.refresh(rule)
     return rule
@@ -54,6 +60,7 @@ def delete_rule(rule_id: int, session: Session = Depends(get_session)):
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
     session.delete(rule)
+    bump_rules_version(session)
     session.commit()
     return {"ok": True}
 
@@ -139,3 +146,15 @@ def test_connections():
         )
 
     return results
+
+
+@router.get("/imap-pool")
+def get_imap_pool_stats():
+    """Connection pool counters and open/idle sessions per IMAP server."""
+    return imap_pool.stats()
+
+
+@router.get("/detection-cache")
+def get_detection_cache_stats():
+    """Detection result cache counters: hits, misses, evictions and size."""
+    return detection_cache.stats()
@@ -1,42 +1,71 @@
 import hashlib
 import hmac
 import os
+import zlib
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 import bleach
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
+
+# Ciphertexts of zlib-compressed content start with this. Older rows (and
+# content that does not shrink) are plain Fernet tokens, which never contain
+# ":" and so cannot be mistaken for it.
+COMPRESSED_PREFIX = "v2:"
+COMPRESSION_LEVEL = 6
+
+# (SECRET_KEY it was built from, cipher); rebuilt when the key changes
+_fernet_cache: Optional[Tuple[str, Fernet]] = None
 
 
 def get_fernet() -> Fernet:
-    """Initialize Fernet with the SECRET_KEY from environment."""
+    """Fernet for the SECRET_KEY from environment, cached until the key changes."""
+    global _fernet_cache
     key = os.getenv("SECRET_KEY")
     if not key:
         raise ValueError(
             "SECRET_KEY environment variable is not set. Required for email encryption."
         )
 
-    return Fernet(key.encode())
+    cached = _fernet_cache
+    if cached is None or cached[0] != key:
+        cached = (key, Fernet(key.encode()))
+        _fernet_cache = cached
+    return cached[1]
+
+
+def _compression_enabled() -> bool:
+    return os.getenv("ENCRYPTION_COMPRESSION", "zlib").strip().lower() != "none"
 
 
 def encrypt_content(content: str) -> str:
-    """Encrypt content using Fernet."""
+    """
+    Encrypt content using Fernet. Content is zlib-compressed first (unless
+    ENCRYPTION_COMPRESSION=none) and stored with COMPRESSED_PREFIX when that
+    makes it smaller; otherwise it is a plain Fernet token as before.
+    """
     if not content:
         return ""
     f = get_fernet()
-    return f.encrypt(content.encode()).decode()
+    data = content.encode()
+    if _compression_enabled():
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        if len(compressed) < len(data):
+            return COMPRESSED_PREFIX + f.encrypt(compressed).decode()
+    return f.encrypt(data).decode()
 
 
 def decrypt_content(encrypted_content: str) -> str:
-    """Decrypt content using Fernet."""
+    """Decrypt content using Fernet, in either the compressed or the plain format."""
     if not encrypted_content:
         return ""
     f = get_fernet()
     try:
-        from cryptography.fernet import InvalidToken
-
+        if encrypted_content.startswith(COMPRESSED_PREFIX):
+            token = encrypted_content[len(COMPRESSED_PREFIX) :]
+            return zlib.decompress(f.decrypt(token.encode())).decode()
         return f.decrypt(encrypted_content.encode()).decode()
-    except (InvalidToken, ValueError) as e:
+    except (InvalidToken, ValueError, zlib.error) as e:
         print(f"Error decrypting content: {e}")
         return ""
     except Exception as e:
@@ -2,6 +2,7 @@ import os
 
 from backend.database import engine
 from backend.models import Preference
+from backend.services.rules_snapshot import bump_rules_version
 from sqlmodel import Session, select
 
 
@@ -83,6 +84,7 @@ class CommandService:
             if not existing:
                 pref = Preference(item=item, type=type_)
                 session.add(pref)
+                bump_rules_version(session)
                 session.commit()
                 print(f"⚙️ Preference added: {type_} -> {item}")
             else:
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:  # From requirements.txt: vectorized scoring and fitting, pure Python without it
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None  # type: ignore[assignment]
+
+from sqlmodel import col, select
+
+from ..models import ProcessedEmail
+from ..security import decrypt_content
+from .detector_engine import FEATURES, DetectorEngine, PreparedEmail
+
+# The original hand-tuned score: 40 for strong indicators, 10 per
+# transactional point, 20 for a known sender and 10 for a confirmation,
+# capped at 100. Promotional mail scores 0 without running the other checks.
+HAND_GATES = ("promotional",)
+HAND_WEIGHTS = {
+    "strong_indicators": 40.0,
+    "transactional_score": 10.0,
+    "known_sender": 20.0,
+    "transaction_confirmation": 10.0,
+}
+
+# Below this many rows a plain loop beats building NumPy arrays
+NUMPY_MIN_ROWS = 16
+
+_FEEDBACK = re.compile(r"User Feedback: Should be receipt=(True|False)\.")
+
+
+def _sigmoid(z: float) -> float:
+    if z < 0:
+        e = math.exp(z)
+        return e / (1 + e)
+    return 1 / (1 + math.exp(-z))
+
+
+class ConfidenceModel:
+    """
+    Linear model over the DetectorEngine feature vector: a weight per
+    feature column plus a bias. "linear" models clip the weighted sum to
+    0-100 (the hand-tuned default); "logistic" models, fitted from user
+    feedback, map it through a sigmoid, so a confidence of 80 means about
+    80% of similar emails were receipts. Columns without a weight are never
+    extracted. An email with any of the `gates` features set scores 0 before
+    the weighted columns are extracted.
+    """
+
+    KINDS = ("linear", "logistic")
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        bias: float = 0.0,
+        kind: str = "linear",
+        gates: Sequence[str] = (),
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        unknown = sorted((set(weights) | set(gates)) - set(FEATURES))
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(unknown)}")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown model kind: {kind}")
+        self.features = tuple(name for name in FEATURES if weights.get(name))
+        self.weights = [float(weights[name]) for name in self.features]
+        self.bias = float(bias)
+        self.kind = kind
+        self.gates = tuple(name for name in FEATURES if name in gates)
+        self.metadata = dict(metadata or {})
+        # Identifies the scoring, so cached confidences follow a retrained model
+        self.fingerprint = hashlib.sha256(
+            json.dumps(
+                [self.kind, self.gates, self.features, self.weights, self.bias]
+            ).encode()
+        ).hexdigest()[:16]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "weights": dict(zip(self.features, self.weights)),
+            "bias": self.bias,
+            "gates": list(self.gates),
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConfidenceModel":
+        return cls(
+            data["weights"],
+            bias=data.get("bias", 0.0),
+            kind=data.get("kind", "linear"),
+            gates=data.get("gates", ()),
+            metadata=data.get("metadata"),
+        )
+
+    def score_rows(self, rows: Sequence[Sequence[float]]) -> List[int]:
+        """Confidences (0-100) for feature rows ordered like self.features."""
+        if not rows:
+            return []
+        if np is not None and len(rows) >= NUMPY_MIN_ROWS:
+            z = np.asarray(rows, dtype=float).reshape(len(rows), -1) @ np.asarray(
+                self.weights, dtype=float
+            )
+            z += self.bias
+            if self.kind == "logistic":
+                scores = 100 / (1 + np.exp(-np.clip(z, -500, 500)))
+            else:
+                scores = np.clip(z, 0, 100)
+            return [int(score) for score in np.rint(scores)]
+
+        scores = []
+        for row in rows:
+            z = self.bias + sum(w * x for w, x in zip(self.weights, row))
+            if self.kind == "logistic":
+                scores.append(round(100 * _sigmoid(z)))
+            else:
+                scores.append(round(min(max(z, 0.0), 100.0)))
+        return scores
+
+    def score(
+        self, engine: DetectorEngine, emails: Sequence[PreparedEmail]
+    ) -> List[int]:
+        """Extracts the model's columns for each email and scores them at once."""
+        open_emails = [
+            i
+            for i, email in enumerate(emails)
+            if not (self.gates and any(engine.features(email, self.gates)))
+        ]
+        rows = [engine.features(emails[i], self.features) for i in open_emails]
+        return self._ungated(len(emails), open_emails, rows)
+
+    def score_vectors(self, vectors: Sequence[Sequence[float]]) -> List[int]:
+        """Confidences for full feature vectors, as engine.features() returns."""
+        gates = [FEATURES.index(name) for name in self.gates]
+        columns = [FEATURES.index(name) for name in self.features]
+        open_rows = [
+            i for i, vector in enumerate(vectors) if not any(vector[j] for j in gates)
+        ]
+        rows = [[vectors[i][j] for j in columns] for i in open_rows]
+        return self._ungated(len(vectors), open_rows, rows)
+
+    def _ungated(
+        self, count: int, indices: List[int], rows: List[List[float]]
+    ) -> List[int]:
+        # Gated emails keep 0; the rest get their scores in one product
+        scores = [0] * count
+        for i, score in zip(indices, self.score_rows(rows)):
+            scores[i] = score
+        return scores
+
+
+def fit_confidence_model(
+    rows: Sequence[Sequence[float]],
+    labels: Sequence[bool],
+    epochs: int = 2000,
+    learning_rate: float = 0.5,
+    l2: float = 0.01,
+) -> ConfidenceModel:
+    """
+    Logistic regression by batch gradient descent on full FEATURES rows.
+    Columns are standardized for the fit and the weights mapped back, so
+    the transactional points and the 0/1 flags train at the same pace.
+    Constant columns carry no information and get no weight.
+    """
+    if not rows:
+        raise ValueError("No training samples")
+    n, width = len(rows), len(FEATURES)
+    means = [sum(row[j] for row in rows) / n for j in range(width)]
+    stds = [
+        math.sqrt(sum((row[j] - means[j]) ** 2 for row in rows) / n)
+        for j in range(width)
+    ]
+    active = [j for j in range(width) if stds[j] > 0]
+    x = [[(row[j] - means[j]) / stds[j] for j in active] for row in rows]
+    y = [1.0 if label else 0.0 for label in labels]
+
+    if np is not None:
+        xs, ys = np.asarray(x, dtype=float).reshape(n, len(active)), np.asarray(y)
+        coef, b = np.zeros(len(active)), 0.0
+        for _ in range(epochs):
+            error = 1 / (1 + np.exp(-np.clip(xs @ coef + b, -500, 500))) - ys
+            coef -= learning_rate * (xs.T @ error / n + l2 * coef)
+            b -= learning_rate * float(error.mean())
+        w = [float(v) for v in coef]
+    else:
+        w, b = [0.0] * len(active), 0.0
+        for _ in range(epochs):
+            grad, grad_b = [0.0] * len(active), 0.0
+            for xi, yi in zip(x, y):
+                error = _sigmoid(b + sum(wj * xj for wj, xj in zip(w, xi))) - yi
+                grad_b += error
+                for k, xj in enumerate(xi):
+                    grad[k] += error * xj
+            w = [wk - learning_rate * (g / n + l2 * wk) for wk, g in zip(w, grad)]
+            b -= learning_rate * grad_b / n
+
+    # Undo the standardization: w'x' + b = sum(w/std * x) + (b - sum(w*mean/std))
+    weights = {FEATURES[j]: wk / stds[j] for j, wk in zip(active, w)}
+    bias = b - sum(wk * means[j] / stds[j] for j, wk in zip(active, w))
+    model = ConfidenceModel(weights, bias=bias, kind="logistic")
+    predictions = model.score_vectors(rows)
+    model.metadata = {
+        "trained_on": n,
+        "receipts": int(sum(y)),
+        "train_accuracy": round(
+            sum((p >= 50) == bool(label) for p, label in zip(predictions, labels)) / n,
+            4,
+        ),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return model
+
+
+def feedback_samples(
+    session: Any, engine: DetectorEngine
+) -> Tuple[List[List[float]], List[bool]]:
+    """
+    Feature rows and labels from the feedback recorded by
+    POST /api/history/feedback (the latest verdict per email). Bodies are
+    only kept for the retention window, so older samples are scored on their
+    subject and sender alone.
+    """
+    rows, labels = [], []
+    statement = select(ProcessedEmail).where(
+        col(ProcessedEmail.reason).startswith("User Feedback:")
+    )
+    for email in session.exec(statement):
+        verdict = _FEEDBACK.match(email.reason or "")
+        if not verdict:
+            continue
+        body = ""
+        if email.encrypted_body:
+            try:
+                body = decrypt_content(email.encrypted_body) or ""
+            except Exception:
+                body = ""
+        prepared = engine.prepare(email.subject or "", body, email.sender or "")
+        rows.append(engine.features(prepared))
+        labels.append(verdict.group(1) == "True")
+    return rows, labels
+
+
+def load_confidence_model(path: Optional[str] = None) -> ConfidenceModel:
+    """
+    The model saved at `path` (default: DETECTOR_CONFIDENCE_MODEL), or the
+    hand-tuned weights when none is configured or the file is unusable.
+    """
+    path = path if path is not None else os.environ.get("DETECTOR_CONFIDENCE_MODEL")
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return ConfidenceModel.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(
+                "Invalid confidence model %r (%s); falling back to hand weights",
+                path,
+                type(e).__name__,
+            )
+    return ConfidenceModel(HAND_WEIGHTS, gates=HAND_GATES)
+
+
+def save_confidence_model(model: ConfidenceModel, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model.to_dict(), f, indent=2)
+
+
+_model: Optional[ConfidenceModel] = None
+_model_lock = threading.Lock()
+
+
+def get_confidence_model() -> ConfidenceModel:
+    """The shared model, loaded on first use."""
+    global _model
+    model = _model
+    if model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_confidence_model()
+            model = _model
+    return model
+
+
+def reload_confidence_model() -> ConfidenceModel:
+    """Loads the configured model again, e.g. after retraining."""
+    global _model
+    model = load_confidence_model()
+    with _model_lock:
+        _model = model
+    return model
@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Enough for several days of mail on a busy account
+DEFAULT_MAX_SIZE = 10000
+# Bounds how long a result survives changes the key cannot see
+DEFAULT_TTL = 3600
+
+
+def _env_int(name: str, default: int) -> int:
+    raw_value = os.environ.get(name)
+    if raw_value is None:
+        return default
+    try:
+        value = int(raw_value)
+        if value < 0:
+            raise ValueError(f"{name} must not be negative")
+        return value
+    except (TypeError, ValueError):
+        logging.warning(
+            "Invalid %s value %r; falling back to %s", name, raw_value, default
+        )
+        return default
+
+
+class DetectionCache:
+    """
+    Least-recently-used cache of detection results with a time-to-live.
+    Keys must change whenever the outcome could (email content, detector
+    patterns, rules version), so entries never need explicit invalidation;
+    stale ones simply stop being looked up and age out.
+
+    Configuration (environment):
+        DETECTION_CACHE_SIZE: Results kept; 0 disables the cache (default: 10000)
+        DETECTION_CACHE_TTL: Seconds a result stays valid (default: 3600)
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = (
+            max_size
+            if max_size is not None
+            else _env_int("DETECTION_CACHE_SIZE", DEFAULT_MAX_SIZE)
+        )
+        self.ttl = (
+            ttl if ttl is not None else _env_int("DETECTION_CACHE_TTL", DEFAULT_TTL)
+        )
+        self._lock = threading.Lock()
+        # key -> (stored_at, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._metrics = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """The cached value for `key`, or None if absent or expired."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._metrics["misses"] += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._metrics["expired"] += 1
+                self._metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._metrics["hits"] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._metrics["evicted"] += 1
+
+    def clear(self) -> None:
+        """Drops every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            for name in self._metrics:
+                self._metrics[name] = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters, hit rate and current size."""
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["misses"]
+            return {
+                **self._metrics,
+                "hit_rate": (
+                    round(self._metrics["hits"] / lookups, 3) if lookups else 0.0
+                ),
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+            }
+
+
+detection_cache = DetectionCache()
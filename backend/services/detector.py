@@ -1,178 +1,404 @@
-import fnmatch
+import hashlib
+import math
+import multiprocessing
 import os
-import re
-from typing import Any, Dict, Optional
-
-from sqlmodel import col, select
-
-from ..models import ManualRule, Preference
-from .email_service import EmailService
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+from ..models import ManualRule
+from .confidence_model import get_confidence_model
+from .detection_cache import detection_cache
+from .detector_engine import PreparedEmail, get_engine
+from .identity import get_identity_registry
+from .rules_snapshot import RulesSnapshot, get_rules_snapshot
+
+
+# Detector stages in evaluation order, with the labels used in decision traces
+STAGE_LABELS = {
+    "manual_rule": "Manual Rule",
+    "always_forward": "Always Forward",
+    "blocked": "Blocked Preference",
+    "reply_or_forward": "Reply/Forward",
+    "strong_indicators": "Strong Receipt Indicators",
+    "promotional": "Promotional Filter",
+    "shipping": "Shipping Notification",
+    "transactional_score": "Transactional Score",
+    "known_sender": "Known Sender",
+}
+NO_MATCH = "no_match"
+
+
+@dataclass
+class DetectionResult:
+    """
+    One detector evaluation: the decision, the stage that made it, the IDs
+    of what matched ("rule:<id>", "preference:<id>", "<pattern set>:<index>"
+    or "<keyword list>:<keyword>"), confidence (0-100), category and
+    nanosecond timings per stage. `steps` traces every stage evaluated.
+    A result served from the detection cache has `cached` set and only the
+    lookup time in `timings_ns`.
+    """
+
+    is_receipt: bool = False
+    stage: str = NO_MATCH
+    matched_ids: List[str] = field(default_factory=list)
+    confidence: int = 0
+    category: Optional[str] = None
+    timings_ns: Dict[str, int] = field(default_factory=dict)
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+    cached: bool = False
+
+    @property
+    def matched_by(self) -> Optional[str]:
+        return STAGE_LABELS.get(self.stage)
+
+    @property
+    def total_ns(self) -> int:
+        return sum(self.timings_ns.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["final_decision"] = self.is_receipt
+        data["matched_by"] = self.matched_by
+        data["total_ns"] = self.total_ns
+        return data
+
+
+class DetectionStats:
+    """
+    Aggregates the DetectionResults of a run: how many emails each stage
+    decided, and how much detection time each stage took.
+    """
+
+    def __init__(self):
+        self.emails = 0
+        self.receipts = 0
+        self.cache_hits = 0
+        self.decided_by: Dict[str, int] = {}
+        self.stage_calls: Dict[str, int] = {}
+        self.stage_ns: Dict[str, int] = {}
+
+    def add(self, result: DetectionResult) -> None:
+        self.emails += 1
+        self.receipts += int(result.is_receipt)
+        self.cache_hits += int(result.cached)
+        self.decided_by[result.stage] = self.decided_by.get(result.stage, 0) + 1
+        for stage, elapsed in result.timings_ns.items():
+            self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+            self.stage_ns[stage] = self.stage_ns.get(stage, 0) + elapsed
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        """JSON summary for ProcessingRun.detection_stats (None if empty)."""
+        if not self.emails:
+            return None
+        total = sum(self.stage_ns.values())
+        return {
+            "emails": self.emails,
+            "receipts": self.receipts,
+            "cache_hits": self.cache_hits,
+            "decided_by": dict(self.decided_by),
+            "total_ms": round(total / 1e6, 3),
+            "slowest_stage": (
+                max(self.stage_ns, key=self.stage_ns.__getitem__)
+                if self.stage_ns
+                else None
+            ),
+            "stages": {
+                stage: {
+                    "calls": self.stage_calls[stage],
+                    "total_ms": round(elapsed / 1e6, 3),
+                    "share": round(elapsed / total, 3) if total else 0.0,
+                }
+                for stage, elapsed in self.stage_ns.items()
+            },
+        }
 
 
 class ReceiptDetector:
     @staticmethod
-    def is_receipt(email: Any, session: Any = None) -> bool:
+    def is_receipt(
+        email: Any,
+        session: Any = None,
+        rules: Optional[RulesSnapshot] = None,
+        prepared: Optional[PreparedEmail] = None,
+    ) -> bool:
         """
         Determines if an email is a receipt based on subject, body, and sender.
         Optional 'session' allows checking against database ManualRule and Preference.
+        Batch callers pass a preloaded 'rules' snapshot instead to skip the queries,
+        and may pass the email already 'prepared' to share work with other checks.
         """
-        subject = (
-            getattr(email, "subject", None) or email.get("subject", "") or ""
-        ).lower()
-        body = (getattr(email, "body", None) or email.get("body", "") or "").lower()
-        sender = (
-            getattr(email, "sender", None)
-            or getattr(email, "from", None)
-            or email.get("sender", "")
-            or email.get("from", "")
-            or ""
-        ).lower()
+        return ReceiptDetector._evaluate(
+            email, session, rules, prepared, full=False
+        ).is_receipt
+
+    @staticmethod
+    def detect(
+        email: Any,
+        session: Any = None,
+        rules: Optional[RulesSnapshot] = None,
+        prepared: Optional[PreparedEmail] = None,
+    ) -> DetectionResult:
+        """
+        Same evaluation as is_receipt, returned as a DetectionResult with the
+        matched IDs, confidence and category filled in.
+
+        Results are cached by email content, detector patterns and the
+        content of the rules passed in, so editing rules invalidates them
+        while a change that leaves the rules as they were does not. With only
+        a 'session' the rules are read fresh and the cache is bypassed.
+        """
+        if prepared is None:
+            prepared = ReceiptDetector._prepare(email)
+        started = time.perf_counter_ns()
+        key = _cache_key(prepared, rules, session)
+        cached = detection_cache.get(key) if key else None
+        if cached is not None:
+            return _cache_hit(cached, prepared, time.perf_counter_ns() - started)
+        result = ReceiptDetector._evaluate(email, session, rules, prepared, full=True)
+        if key:
+            detection_cache.put(key, result)
+        return result
+
+    @staticmethod
+    def _evaluate(
+        email: Any,
+        session: Any,
+        rules: Optional[RulesSnapshot],
+        prepared: Optional[PreparedEmail],
+        full: bool,
+    ) -> DetectionResult:
+        """
+        The single detection path. Each stage is timed and traced; `full`
+        adds what only callers of detect() need (IDs, confidence, category).
+        """
+        if prepared is None:
+            prepared = ReceiptDetector._prepare(email)
+        subject, sender = prepared.subject, prepared.sender
+        mask = ReceiptDetector._mask_text
+        engine = get_engine()
+        clock = time.perf_counter_ns
+        result = DetectionResult()
+
+        def check(stage: str, test: Callable[[], Any]) -> Any:
+            started = clock()
+            outcome = test()
+            result.timings_ns[stage] = clock() - started
+            result.steps.append({"step": STAGE_LABELS[stage], "result": bool(outcome)})
+            return outcome
+
+        def decide(
+            stage: str,
+            is_receipt: bool,
+            message: str,
+            matched_ids: Optional[List[str]] = None,
+            confidence: Optional[int] = None,
+        ) -> DetectionResult:
+            print(message)
+            result.is_receipt = is_receipt
+            result.stage = stage
+            if not full:
+                return result
+            started = clock()
+            result.matched_ids = (
+                matched_ids
+                if matched_ids is not None
+                else engine.explain(result.stage, prepared)
+            )
+            result.timings_ns["explain"] = clock() - started
+            started = clock()
+            result.category = engine.categorize(prepared)
+            result.timings_ns["category"] = clock() - started
+            started = clock()
+            result.confidence = (
+                confidence
+                if confidence is not None
+                else ReceiptDetector._confidence(prepared)
+            )
+            result.timings_ns["confidence"] = clock() - started
+            return result
 
         # STEP -1: Check for Database Overrides (Manual Rules & Preferences)
-        if session:
+        if rules is not None or session:
             try:
+                if rules is None:
+                    started = clock()
+                    rules = RulesSnapshot.load(session)
+                    result.timings_ns["load_rules"] = clock() - started
 
                 # 1. Manual Rules (Priority ordering)
-                matched_rule = ReceiptDetector._check_manual_rules(
-                    subject, sender, session
+                matched_rule = check(
+                    "manual_rule", lambda: rules.match_rule(subject, sender)
                 )
                 if matched_rule:
-                    print(
-                        f"✅ Manual rule match: {matched_rule.purpose or 'No purpose'}"
+                    result.steps[-1]["detail"] = f"Matched rule: {matched_rule.purpose}"
+                    return decide(
+                        "manual_rule",
+                        True,
+                        f"✅ Manual rule match: {matched_rule.purpose or 'No purpose'}",
+                        [f"rule:{matched_rule.id}"],
+                        round((matched_rule.confidence or 0) * 100),
                     )
-                    return True
 
                 # 2. Preferences (Always Forward)
-                always_forward = session.exec(
-                    select(Preference).where(Preference.type == "Always Forward")
-                ).all()
-                for pref in always_forward:
-                    p_item = pref.item.lower()
-                    if p_item in sender or p_item in subject:
-                        print(
-                            f"✅ Preference match (Always Forward): {ReceiptDetector._mask_text(pref.item)}"
-                        )
-                        return True
+                pref = check(
+                    "always_forward", lambda: rules.always_forward(subject, sender)
+                )
+                if pref:
+                    return decide(
+                        "always_forward",
+                        True,
+                        f"✅ Preference match (Always Forward): {mask(pref.item)}",
+                        [f"preference:{pref.id}"],
+                        100,
+                    )
 
                 # 3. Preferences (Blocked Sender / Category)
-                blocked = session.exec(
-                    select(Preference).where(
-                        col(Preference.type).in_(["Blocked Sender", "Blocked Category"])
+                pref = check("blocked", lambda: rules.blocked(subject, sender))
+                if pref:
+                    return decide(
+                        "blocked",
+                        False,
+                        f"🚫 Preference match (Blocked): {mask(pref.item)}",
+                        [f"preference:{pref.id}"],
+                        0,
                     )
-                ).all()
-                for pref in blocked:
-                    p_item = pref.item.lower()
-                    if p_item in sender or p_item in subject:
-                        print(
-                            f"🚫 Preference match (Blocked): {ReceiptDetector._mask_text(pref.item)}"
-                        )
-                        return False
             except Exception as e:
                 print(f"⚠️ Error checking database rules: {type(e).__name__}")
 
         # STEP 0: EXCLUDE reply emails and forwards first
-        if ReceiptDetector.is_reply_or_forward(subject, sender):
-            print(
-                f"🚫 Excluded reply/forward email: {ReceiptDetector._mask_text(subject)}"
+        if check(
+            "reply_or_forward",
+            lambda: ReceiptDetector.is_reply_or_forward(subject, sender),
+        ):
+            return decide(
+                "reply_or_forward",
+                False,
+                f"🚫 Excluded reply/forward email: {mask(subject)}",
             )
-            return False
 
         # STEP 0.5: Check for strong receipt indicators (OVERRIDES promotional filter)
-        if ReceiptDetector.has_strong_receipt_indicators(subject, body):
-            print(
-                f"✅ Strong receipt indicators found: {ReceiptDetector._mask_text(subject)}"
+        if check(
+            "strong_indicators", lambda: engine.has_strong_receipt_indicators(prepared)
+        ):
+            return decide(
+                "strong_indicators",
+                True,
+                f"✅ Strong receipt indicators found: {mask(subject)}",
             )
-            return True
 
         # STEP 1: HARD EXCLUDE spam/promotional emails
         # Use an allowlist for known receipt-like promotional emails (e.g. subscription renewals)
-        promo_allowlist_patterns = [
-            "xbox",
-            "game pass",
-            "subscription renewal",
-            "renewal receipt",
-        ]
-        if ReceiptDetector.is_promotional_email(subject, body, sender) and not any(
-            pattern in subject or pattern in body or pattern in sender
-            for pattern in promo_allowlist_patterns
+        if check(
+            "promotional",
+            lambda: engine.is_promotional_email(prepared)
+            and not engine.is_promo_allowlisted(prepared),
         ):
-            print(
-                f"🚫 Excluded promotional email: {ReceiptDetector._mask_text(subject)}"
+            return decide(
+                "promotional", False, f"🚫 Excluded promotional email: {mask(subject)}"
             )
-            return False
 
         # STEP 1.5: EXCLUDE shipping notifications (not receipts)
-        if ReceiptDetector.is_shipping_notification(subject, body, sender):
-            print(
-                f"🚫 Excluded shipping notification: {ReceiptDetector._mask_text(subject)}"
+        if check("shipping", lambda: engine.is_shipping_notification(prepared)):
+            return decide(
+                "shipping", False, f"🚫 Excluded shipping notification: {mask(subject)}"
             )
-            return False
 
         # STEP 3: Check for transactional patterns (order + amount + confirmation)
-        transactional_score = ReceiptDetector.calculate_transactional_score(
-            subject, body, sender
+        transactional_score = check(
+            "transactional_score",
+            lambda: engine.calculate_transactional_score(prepared),
         )
+        result.steps[-1]["result"] = transactional_score >= 3
+        result.steps[-1]["detail"] = f"Score: {transactional_score}"
         if transactional_score >= 3:
-            print(
-                f"✅ High transactional score ({transactional_score}): {ReceiptDetector._mask_text(subject)}"
+            return decide(
+                "transactional_score",
+                True,
+                f"✅ High transactional score ({transactional_score}): {mask(subject)}",
             )
-            return True
 
         # STEP 4: Known receipt senders with transaction confirmation
-        if ReceiptDetector.is_known_receipt_sender(
-            sender
-        ) and ReceiptDetector.has_transaction_confirmation(subject, body):
-            print(
-                f"✅ Known sender with transaction: {ReceiptDetector._mask_text(subject)}"
+        if check(
+            "known_sender",
+            lambda: engine.is_known_receipt_sender(prepared)
+            and engine.has_transaction_confirmation(prepared),
+        ):
+            return decide(
+                "known_sender",
+                True,
+                f"✅ Known sender with transaction: {mask(subject)}",
             )
-            return True
 
-        print(f"❌ Not a receipt: {ReceiptDetector._mask_text(subject)}")
-        return False
+        return decide(NO_MATCH, False, f"❌ Not a receipt: {mask(subject)}")
 
     @staticmethod
-    def debug_is_receipt(email: Any, session: Any = None) -> Dict[str, Any]:
+    def debug_is_receipt(
+        email: Any, session: Any = None, rules: Optional[RulesSnapshot] = None
+    ) -> Dict[str, Any]:
         """
-        Detailed trace of the logic for debugging or history analysis.
+        Detailed trace of the logic for debugging or history analysis:
+        DetectionResult.to_dict() plus the lowercased subject and sender.
         """
-        subject = (
-            getattr(email, "subject", None) or email.get("subject", "") or ""
-        ).lower()
-        (getattr(email, "body", None) or email.get("body", "") or "").lower()
-        sender = (
-            getattr(email, "sender", None)
-            or email.get("from", None)
-            or email.get("sender", "")
-            or ""
-        ).lower()
-
-        trace: Dict[str, Any] = {
-            "subject": subject,
-            "sender": sender,
-            "steps": [],
-            "final_decision": False,
-            "matched_by": None,
+        prepared = ReceiptDetector._prepare(email)
+        result = ReceiptDetector.detect(email, session, rules=rules, prepared=prepared)
+        return {
+            "subject": prepared.subject,
+            "sender": prepared.sender,
+            **result.to_dict(),
         }
 
-        # Check Manual Rules
-        matched_rule = ReceiptDetector._check_manual_rules(subject, sender, session)
-        if matched_rule:
-            trace["steps"].append(
-                {
-                    "step": "Manual Rule",
-                    "result": True,
-                    "detail": f"Matched rule: {matched_rule.purpose}",
-                }
-            )
-            trace["final_decision"] = True
-            trace["matched_by"] = "Manual Rule"
-            return trace
+    @staticmethod
+    def classify_batch(
+        emails: Sequence[Any],
+        rules: Optional[RulesSnapshot] = None,
+        session: Any = None,
+        workers: Optional[int] = None,
+    ) -> List[DetectionResult]:
+        """
+        Classifies many emails at once, returning one DetectionResult per
+        email, in order.
+
+        'rules' is a preloaded RulesSnapshot; without one the cached snapshot
+        for 'session' is used. Emails already in the detection cache are not
+        evaluated again. With more than one worker (DETECTOR_WORKERS, default 1)
+        the emails are split into chunks and classified in a process pool,
+        falling back to serial classification if the pool is unavailable.
+        """
+        if not emails:
+            return []
+        if rules is None and session:
+            try:
+                rules = get_rules_snapshot(session)
+            except Exception as e:
+                print(f"⚠️ Error checking database rules: {type(e).__name__}")
+
+        if workers is None:
+            workers = _detector_workers()
+        if workers > 1 and len(emails) > 1:
+            try:
+                return _classify_in_pool(emails, rules, session, workers)
+            except Exception as e:
+                print(
+                    f"⚠️ Parallel classification failed ({type(e).__name__}), running serially"
+                )
+                shutdown_batch_pool()
+        return [
+            ReceiptDetector.detect(email, session=session, rules=rules)
+            for email in emails
+        ]
 
-        # ... (rest of trace logic would follow same structure as is_receipt)
-        # Simplified for now, will expand as needed.
-        decision = ReceiptDetector.is_receipt(email, session)
-        trace["final_decision"] = decision
-        return trace
+    @staticmethod
+    def _prepare(email: Any) -> PreparedEmail:
+        """
+        Normalized subject, body and sender of an email object or dict: see
+        DetectorEngine.prepare for the body windows.
+        """
+        fields = _slim_email(email)
+        return get_engine().prepare(fields["subject"], fields["body"], fields["sender"])
 
     @staticmethod
     def _mask_text(text: str, max_chars: int = 20) -> str:
@@ -194,504 +420,43 @@ class ReceiptDetector:
         """Helper to check if any manual rule matches."""
         if not session:
             return None
-        rules = session.exec(
-            select(ManualRule).order_by(ManualRule.priority.desc())  # type: ignore
-        ).all()
-        for rule in rules:
-            matches = True
-            if rule.email_pattern:
-                if not fnmatch.fnmatch(sender, rule.email_pattern.lower()):
-                    matches = False
-            if matches and rule.subject_pattern:
-                if not fnmatch.fnmatch(subject, rule.subject_pattern.lower()):
-                    matches = False
-            if matches:
-                return rule
-        return None
+        return RulesSnapshot.load(session).match_rule(subject, sender)
 
     @staticmethod
     def is_reply_or_forward(subject: str, sender: str) -> bool:
-        reply_patterns = [
-            r"re:\s*",  # "Re: "
-            r"fwd?:\s*",  # "Fwd: " or "Fw: "
-            r"fw:\s*",  # "Fw: "
-            r"forward:\s*",  # "Forward: "
-            r"\[fwd\]",  # "[FWD]"
-            r"\(fwd\)",  # "(FWD)"
-        ]
-
-        # Use re.IGNORECASE for all patterns
-        if any(re.match(pattern, subject, re.IGNORECASE) for pattern in reply_patterns):
-            return True
-
-        # Check if from wife's email
-        wife_email = (os.environ.get("WIFE_EMAIL") or "your-wife@email.com").lower()
-        if wife_email in sender:
+        if get_engine().is_reply_subject(PreparedEmail(subject, "", sender)):
             return True
 
-        # Check if from your own email addresses
-        your_emails = [
-            e.lower()
-            for e in [
-                os.environ.get("GMAIL_EMAIL"),
-                os.environ.get("ICLOUD_EMAIL"),
-                os.environ.get("SENDER_EMAIL"),
-            ]
-            if e
-        ]
-
-        # Add emails from centralized account logic
-        accounts = EmailService.get_all_accounts()
-        for acc in accounts:
-            if acc.get("email"):
-                your_emails.append(acc.get("email").lower())
-
-        if any(email in sender for email in your_emails):
-            return True
-
-        return False
+        # From the forwarding recipient or one of our own addresses
+        return get_identity_registry().is_own(sender)
 
     @staticmethod
     def is_shipping_notification(subject: str, body: str, sender: str) -> bool:
-        shipping_email_patterns = [
-            r"shipment-tracking@amazon\.com",
-            r"ship-confirm@amazon\.com",
-            r"shipping@amazon\.com",
-            r"delivery@amazon\.com",
-            r"tracking@amazon\.com",
-            r"shipment@amazon\.com",
-            r"logistics@amazon\.com",
-            r"fulfillment@amazon\.com",
-            r"shipping-",
-            r"delivery-",
-            r"tracking-",
-            r"shipment-",
-            # Other carriers
-            r"tracking@ups\.com",
-            r"delivery@fedex\.com",
-            r"tracking@usps\.com",
-            r"shipment@dhl\.com",
-        ]
-
-        if any(
-            re.search(pattern, sender, re.IGNORECASE)
-            for pattern in shipping_email_patterns
-        ):
-            return True
-
-        shipping_patterns = [
-            # Amazon shipping patterns
-            r"your\s+.*\s+(has\s+)?shipped",
-            r"shipped\s+today",
-            r"out\s+for\s+delivery",
-            r"delivered",
-            r"delivery\s+update",
-            r"package\s+delivered",
-            r"package\s+update",
-            r"shipment\s+notification",
-            r"tracking\s+information",
-            r"track\s+your\s+package",
-            r"delivery\s+notification",
-            r"shipment\s+delivered",
-            r"order.*shipped",
-            r"item.*shipped",
-            r"package.*shipped",
-            # Delivery status updates
-            r"delivery\s+attempt",
-            r"delivery\s+rescheduled",
-            r"delivery\s+delayed",
-            r"package\s+is\s+on\s+the\s+way",
-            r"arriving\s+today",
-            r"arriving\s+tomorrow",
-            r"expected\s+delivery",
-            r"estimated\s+delivery",
-            # Carrier notifications
-            r"ups\s+delivery",
-            r"fedex\s+delivery",
-            r"usps\s+delivery",
-            r"amazon\s+delivery",
-            r"dhl\s+delivery",
-            # Amazon-specific shipping language
-            r"amazon.*shipment",
-            r"preparing\s+to\s+ship",
-            r"now\s+shipped",
-            r"has\s+been\s+shipped",
-            r"will\s+arrive",
-        ]
-
-        text = f"{subject} {body}".lower()
-
-        has_shipping_pattern = any(
-            re.search(pattern, text, re.IGNORECASE) for pattern in shipping_patterns
-        )
-        if not has_shipping_pattern:
-            return False
-
-        purchase_indicators = [
-            r"order\s+confirmation",
-            r"purchase\s+confirmation",
-            r"payment\s+confirmation",
-            r"receipt",
-            r"invoice",
-            r"charged",
-            r"payment\s+received",
-            r"total.*\$\d+",
-            r"amount.*\$\d+",
-            r"order\s+total",
-            r"subtotal",
-            r"tax.*\$\d+",
-            r"order\s+placed",
-            r"thank\s+you\s+for.*order",
-        ]
-
-        has_purchase_indicators = any(
-            re.search(pattern, text, re.IGNORECASE) for pattern in purchase_indicators
+        return get_engine().is_shipping_notification(
+            PreparedEmail(subject, body, sender)
         )
 
-        return has_shipping_pattern and not has_purchase_indicators
-
     @staticmethod
     def is_promotional_email(subject: str, body: str, sender: str) -> bool:
-        promotional_keywords = [
-            "sale",
-            "discount",
-            "coupon",
-            "deal",
-            "deals",
-            "offer",
-            "promotion",
-            "promo",
-            "save",
-            "savings",
-            "off",
-            "clearance",
-            "limited time",
-            "hurry",
-            "newsletter",
-            "weekly ad",
-            "special offer",
-            "flash sale",
-            "free shipping",
-            "member exclusive",
-            "subscriber",
-            "unsubscribe",
-            "marketing",
-            "browse",
-            "shop now",
-            "check out",
-            "new arrivals",
-            "trending",
-            "bestseller",
-            "featured",
-            "recommended",
-            "catalog",
-            "circular",
-            "black friday",
-            "cyber monday",
-            "holiday sale",
-            "back to school",
-            "rewards program",
-            "loyalty",
-            "points earned",
-            "cashback earned",
-            "gift card",
-            "sweepstakes",
-            "contest",
-            "giveaway",
-            "win",
-            "personalized",
-            "just for you",
-            "based on your",
-            "you might like",
-            # Gaming/deals specific
-            "weekly digest",
-            "daily digest",
-            "roundup",
-            "this week",
-            "new releases",
-            "best deals",
-            "top deals",
-            "hot deals",
-            "price drop",
-            "discounted",
-            "on sale",
-            "reduced price",
-            "lowest price",
-            "price alert",
-            "wishlist",
-            "watch list",
-            "compare prices",
-            "deal alert",
-            # Newsletter patterns
-            "digest",
-            "update",
-            "news",
-            "updates",
-            "latest",
-            "recent",
-            "weekly",
-            "monthly",
-            "daily",
-            "edition",
-            "issue",
-            "curated",
-            "handpicked",
-            "selected",
-            "picks",
-            # Marketing action words
-            "discover",
-            "explore",
-            "find",
-            "search",
-            "browse",
-            "view all",
-            "see more",
-            "learn more",
-            "read more",
-            "get started",
-            "sign up",
-            "join",
-            "register",
-            "download",
-            "try",
-            # Promotional urgency
-            "expires",
-            "ending",
-            "last chance",
-            "final",
-            "closing",
-            "while supplies last",
-            "limited quantity",
-            "almost gone",
-        ]
-
-        # Whitelist specific phrases that might look promotional but are receipts
-        text = f"{subject} {body}".lower()
-        if "subscribe & save" in text or "subscription order" in text:
-            return False
-
-        # Exempt government-related senders from being treated as promotional
-        if any(gov in sender for gov in ["irs", "dmv", "gov"]):
-            return False
-
-        if any(keyword in subject for keyword in promotional_keywords):
-            return True
-
-        if any(keyword in body for keyword in promotional_keywords):
-            return True
-
-        marketing_patterns = [
-            r"\d+%\s*off",
-            r"save\s*\$\d+",
-            r"free\s*shipping",
-            r"limited\s*time",
-            r"act\s*now",
-            r"shop\s*now",
-            r"don't\s*miss",
-            r"hurry",
-            r"ends\s*(soon|today)",
-            r"check\s*this\s*week",
-            r"new\s*discounts",
-            r"best\s*deals",
-            r"weekly\s*digest",
-            r"\+\d+\s*this\s*week",
-            r"deals?\s*weekly",
-            r"price\s*drop",
-            r"now\s*\$\d+",
-        ]
-
-        if any(
-            re.search(pattern, subject, re.IGNORECASE)
-            or re.search(pattern, body, re.IGNORECASE)
-            for pattern in marketing_patterns
-        ):
-            return True
-
-        tracking_patterns = [
-            r"awstrack\.me",
-            r"click\.",
-            r"track\.",
-            r"utm_",
-            r"newsletter",
-            r"unsubscribe",
-        ]
-
-        # JS used replace(/[\/\\]/g, "") before checking source, but in python we check string
-        # JS: body.includes(pattern.source...) -> Replicated by checking regex simply
-        if any(
-            re.search(pattern, body, re.IGNORECASE) for pattern in tracking_patterns
-        ):
-            return True
-
-        deals_patterns = [
-            r"deals?\s*net",
-            r"deals?\s*com",
-            r"bargain",
-            r"slickdeals",
-            r"reddit.*deals",
-            r"steam.*sale",
-            r"game.*deals",
-        ]
-
-        if any(
-            re.search(pattern, sender, re.IGNORECASE)
-            or re.search(pattern, subject, re.IGNORECASE)
-            or re.search(pattern, body, re.IGNORECASE)
-            for pattern in deals_patterns
-        ):
-            return True
-
-        return False
+        return get_engine().is_promotional_email(PreparedEmail(subject, body, sender))
 
     @staticmethod
     def has_strong_receipt_indicators(subject: str, body: str) -> bool:
-        # Definitive phrases that don't need supporting evidence
-        definitive_patterns = [
-            r"payment\s+receipt",
-            r"order\s+confirmation",
-            r"purchase\s+confirmation",
-            r"receipt\s+for\s+your\s+payment",
-        ]
-
-        subject_lower = subject.lower()
-        if any(re.search(p, subject_lower) for p in definitive_patterns):
-            return True
-
-        strong_keywords = [
-            "receipt",
-            "invoice",
-            "order complete",
-            "payment received",
-            "order summary",
-            "order placed",
-            "billing statement",
-            "account statement",
-            "thank you for your order",
-            "order total",
-            "amount charged",
-            "subscribe & save",
-            "subscription order",
-            "ordered",
-            "ordered:",
-            "renewal",
-            "license plate renewal",
-        ]
-
-        # Check literal keywords
-        subject_lower = subject.lower()
-        body_lower = body.lower()
-        has_keyword = any(
-            keyword in subject_lower or keyword in body_lower
-            for keyword in strong_keywords
-        )
-
-        # Check regex patterns (handles interleaved text like "Order #123 Confirmation")
-        strong_regex_patterns = [
-            r"order.*confirmation",
-            r"payment.*confirmation",
-            r"purchase.*confirmation",
-        ]
-
-        text = f"{subject} {body}"
-        has_regex = any(
-            re.search(pattern, text, re.IGNORECASE) for pattern in strong_regex_patterns
-        )
-
-        if not (has_keyword or has_regex):
-            return False
-
-        supporting_evidence = [
-            r"order\s*#?\s*[a-z0-9\-]{6,}",
-            r"invoice\s*#?\s*[a-z0-9\-]{6,}",
-            r"transaction\s*#?\s*[a-z0-9\-]{6,}",
-            r"tracking\s*#?\s*[a-z0-9\-]{8,}",
-            r"\$[0-9,]+\.[0-9]{2}",
-            r"total:?\s*\$[0-9,]+\.[0-9]{2}",
-            r"amount:?\s*\$[0-9,]+\.[0-9]{2}",
-            r"paid:?\s*\$[0-9,]+\.[0-9]{2}",
-            r"view your order",
-            r"arriving (tomorrow|today|monday|tuesday|wednesday|thursday|friday|saturday|sunday)",
-        ]
-
-        text = f"{subject} {body}"
-        return any(
-            re.search(pattern, text, re.IGNORECASE) for pattern in supporting_evidence
-        )
+        return get_engine().has_strong_receipt_indicators(PreparedEmail(subject, body))
 
     @staticmethod
     def calculate_transactional_score(subject: str, body: str, sender: str) -> int:
-        score = 0
-        text = f"{subject} {body} {sender}"
-
-        indicators = [
-            (r"order\s*#?\s*[a-z0-9\-]{6,}", 2),
-            (r"\$[0-9,]+\.[0-9]{2}", 2),
-            (r"thank\s*you\s*for\s*(your\s*)?(order|purchase)", 2),
-            (r"invoice\s*#?\s*[a-z0-9\-]{6,}", 2),
-            (r"transaction", 1),
-            (r"payment", 1),
-            (r"billing", 1),
-            (r"statement", 1),
-            (r"account\s*balance", 1),
-            (r"due\s*date", 1),
-            (r"autopay", 1),
-            (r"direct\s*debit", 1),
-            (r"^ordered:", 2),
-        ]
-
-        for pattern, points in indicators:
-            if re.search(pattern, text, re.IGNORECASE):
-                score += points
-
-        return score
+        return get_engine().calculate_transactional_score(
+            PreparedEmail(subject, body, sender)
+        )
 
     @staticmethod
     def is_known_receipt_sender(sender: str) -> bool:
-        reliable_receipt_senders = [
-            "amazon.com",
-            "amazon.co",
-            "amazonses.com",
-            "auto-confirm@amazon.com",
-            "order-update@amazon.com",
-            "digital-no-reply@amazon.com",
-            "payments-messages@amazon.com",
-            "paypal.com",
-            "paypal-communications.com",
-            "stripe.com",
-            "square.com",
-            "apple.com",
-            "itunes.com",
-            "google.com",
-            "googlepayments.com",
-            "microsoft.com",
-            "xbox.com",
-            "uber.com",
-            "lyft.com",
-            "doordash.com",
-            "grubhub.com",
-            "instacart.com",
-            "shipt.com",
-        ]
-        return any(s in sender for s in reliable_receipt_senders)
+        return get_engine().is_known_receipt_sender(PreparedEmail("", "", sender))
 
     @staticmethod
     def has_transaction_confirmation(subject: str, body: str) -> bool:
-        confirmation_patterns = [
-            r"confirmation",
-            r"receipt",
-            r"order\s*#",
-            r"invoice",
-            r"payment",
-            r"charged",
-            r"bill",
-            r"statement",
-            r"\$[0-9,]+\.[0-9]{2}",
-        ]
-        return any(
-            re.search(pattern, subject, re.IGNORECASE)
-            or re.search(pattern, body, re.IGNORECASE)
-            for pattern in confirmation_patterns
-        )
+        return get_engine().has_transaction_confirmation(PreparedEmail(subject, body))
 
     @staticmethod
     def categorize_receipt(email: Any) -> str:
@@ -706,72 +471,170 @@ class ReceiptDetector:
             getattr(email, "subject", None) or email.get("subject", "") or ""
         ).lower()
 
-        if "amazon" in sender or "aws" in sender:
-            return "amazon"
-        if "uber" in sender or "lyft" in sender:
-            return "transportation"
-        if any(s in sender for s in ["doordash", "grubhub", "ubereats"]):
-            return "food-delivery"
-        if any(s in sender for s in ["starbucks", "mcdonalds", "subway"]):
-            return "restaurants"
-        if any(s in sender for s in ["walmart", "target", "costco"]):
-            return "retail"
-        if any(s in sender for s in ["netflix", "spotify", "adobe"]):
-            return "subscriptions"
-        if any(s in sender for s in ["paypal", "venmo", "square"]):
-            return "payments"
-
-        if any(
-            s in sender for s in ["att", "verizon", "comcast", "xfinity", "spectrum"]
-        ):
-            return "utilities"
+        return get_engine().categorize(PreparedEmail(subject, "", sender))
 
-        if (
-            any(s in sender for s in ["cvs", "walgreens", "pharmacy"])
-            or "prescription" in subject
-            or "copay" in subject
-        ):
-            return "healthcare"
-
-        if (
-            any(s in sender for s in ["irs", "dmv", "gov"])
-            or "tax" in subject
-            or "license" in subject
-        ):
-            return "government"
+    @staticmethod
+    def get_detection_confidence(email: Any) -> int:
+        return ReceiptDetector._confidence(ReceiptDetector._prepare(email))
 
-        return "other"
+    @staticmethod
+    def get_detection_confidences(emails: Sequence[Any]) -> List[int]:
+        """
+        Confidences for many emails, scored as one batch: see
+        ConfidenceModel.score.
+        """
+        prepared = [ReceiptDetector._prepare(email) for email in emails]
+        return get_confidence_model().score(get_engine(), prepared)
 
     @staticmethod
-    def get_detection_confidence(email: Any) -> int:
-        subject = (
-            getattr(email, "subject", None) or email.get("subject", "") or ""
-        ).lower()
-        body = (getattr(email, "body", None) or email.get("body", "") or "").lower()
-        sender = (
+    def _confidence(prepared: PreparedEmail) -> int:
+        return get_confidence_model().score(get_engine(), [prepared])[0]
+
+
+def _detector_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("DETECTOR_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+
+def _cache_key(
+    prepared: PreparedEmail, rules: Optional[RulesSnapshot], session: Any
+) -> Optional[Tuple[str, ...]]:
+    """
+    Detection cache key: a hash of exactly what the detector reads plus the
+    fingerprints of the engine's patterns, the rules in effect, our own
+    addresses and the confidence model. None when the rules would be read per
+    email from 'session', so the result is not cached.
+    """
+    if rules is None and session:
+        return None
+    content = hashlib.sha256(
+        "\0".join((prepared.sender, prepared.subject, prepared.body)).encode(
+            "utf-8", "surrogatepass"
+        )
+    ).hexdigest()
+    return (
+        content,
+        get_engine().fingerprint,
+        rules.fingerprint if rules is not None else "",
+        get_identity_registry().fingerprint,
+        get_confidence_model().fingerprint,
+    )
+
+
+def _cache_hit(
+    cached: DetectionResult, prepared: PreparedEmail, elapsed: int
+) -> DetectionResult:
+    """Copy of a cached result, timed as a single cache lookup."""
+    print(
+        f"♻️ Cached detection ({cached.matched_by or 'No match'}): "
+        f"{ReceiptDetector._mask_text(prepared.subject)}"
+    )
+    return replace(
+        cached,
+        matched_ids=list(cached.matched_ids),
+        timings_ns={"cache": elapsed},
+        steps=[dict(step) for step in cached.steps],
+        cached=True,
+    )
+
+
+def _slim_email(email: Any) -> Dict[str, str]:
+    """Only the fields the detector reads, as plain strings."""
+    return {
+        "subject": getattr(email, "subject", None) or email.get("subject", "") or "",
+        "body": getattr(email, "body", None) or email.get("body", "") or "",
+        "sender": (
             getattr(email, "sender", None)
             or getattr(email, "from", None)
             or email.get("sender", "")
             or email.get("from", "")
             or ""
-        ).lower()
-
-        if ReceiptDetector.is_promotional_email(subject, body, sender):
-            return 0
-
-        confidence = 0
-        if ReceiptDetector.has_strong_receipt_indicators(subject, body):
-            confidence += 40
-
-        transaction_score = ReceiptDetector.calculate_transactional_score(
-            subject, body, sender
-        )
-        confidence += transaction_score * 10
-
-        if ReceiptDetector.is_known_receipt_sender(sender):
-            confidence += 20
-
-        if ReceiptDetector.has_transaction_confirmation(subject, body):
-            confidence += 10
-
-        return min(confidence, 100)
+        ),
+    }
+
+
+def _classify_chunk(
+    emails: List[Dict[str, str]], rules: Optional[RulesSnapshot]
+) -> List[DetectionResult]:
+    # Runs in a worker process; the parent handles caching
+    return [
+        ReceiptDetector._evaluate(email, None, rules, None, full=True)
+        for email in emails
+    ]
+
+
+# Worker processes are started once and reused across batches. "spawn" keeps
+# children from inheriting the scheduler's threads and open connections.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_batch_pool() -> None:
+    """Stops the classification worker processes, if any were started."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+def _classify_in_pool(
+    emails: Sequence[Any], rules: Optional[RulesSnapshot], session: Any, workers: int
+) -> List[DetectionResult]:
+    results: List[Optional[DetectionResult]] = [None] * len(emails)
+    misses = []
+    for i, email in enumerate(emails):
+        prepared = ReceiptDetector._prepare(email)
+        started = time.perf_counter_ns()
+        key = _cache_key(prepared, rules, session)
+        cached = detection_cache.get(key) if key else None
+        if cached is not None:
+            elapsed = time.perf_counter_ns() - started
+            results[i] = _cache_hit(cached, prepared, elapsed)
+        else:
+            misses.append((i, key, prepared))
+    if not misses:
+        return _filled(results)
+
+    # The windowed view, not the raw body: far less to pickle per email, and
+    # preparing it again in the worker gives the same text
+    slim = [
+        {"subject": p.subject, "body": p.body, "sender": p.sender} for _, _, p in misses
+    ]
+    # A few chunks per worker evens out uneven body sizes
+    size = max(1, math.ceil(len(slim) / (workers * 4)))
+    pool = _get_pool(workers)
+    futures = [
+        pool.submit(_classify_chunk, slim[i : i + size], rules)
+        for i in range(0, len(slim), size)
+    ]
+    evaluated: List[DetectionResult] = []
+    for future in futures:
+        evaluated.extend(future.result())
+    for (i, key, _), result in zip(misses, evaluated):
+        if key:
+            detection_cache.put(key, result)
+        results[i] = result
+    return _filled(results)
+
+
+def _filled(results: List[Optional[DetectionResult]]) -> List[DetectionResult]:
+    assert all(result is not None for result in results)
+    return cast(List[DetectionResult], results)
@@ -1,11 +1,49 @@
 import email
-import imaplib
 import json
 import logging
 import os
+import re
+from collections import deque
 from datetime import datetime, timedelta
 from email.header import decode_header
-from typing import Optional
+from typing import Callable, Deque, Dict, List, Optional
+
+from backend.services.imap_bodystructure import (
+    decode_section,
+    iter_section_response,
+    parse_bodystructures,
+    plan_text_sections,
+)
+from backend.services.imap_pool import imap_pool
+from backend.services.search_profile import compile_search_profile
+
+# Header fields needed to dedupe a message before downloading its body
+DEDUPE_HEADER_FIELDS = "MESSAGE-ID FROM SUBJECT DATE"
+
+# Header fields needed to build an email dict without downloading BODY[]
+MESSAGE_HEADER_FIELDS = "MESSAGE-ID REPLY-TO FROM SUBJECT DATE"
+
+# Messages requested per UID FETCH round trip (override with IMAP_FETCH_CHUNK_SIZE)
+DEFAULT_FETCH_CHUNK_SIZE = 50
+
+_UID_RE = re.compile(rb"UID (\d+)")
+
+
+def _positive_int_env(name: str, default: int) -> int:
+    """Reads a positive integer from the environment, falling back on bad values."""
+    raw_value = os.environ.get(name)
+    if raw_value is None:
+        return default
+    try:
+        value = int(raw_value)
+        if value <= 0:
+            raise ValueError(f"{name} must be a positive integer")
+        return value
+    except (ValueError, TypeError):
+        logging.warning(
+            "Invalid %s value %r; falling back to %d", name, raw_value, default
+        )
+        return default
 
 
 class EmailService:
@@ -38,6 +76,7 @@ class EmailService:
                                     "imap_server": acc.get(
                                         "imap_server", "imap.gmail.com"
                                     ),
+                                    "search_profile": acc.get("search_profile"),
                                 }
                             )
             except Exception as e:
@@ -98,25 +137,391 @@ class EmailService:
             return {"success": False, "error": "Credentials missing"}
 
         try:
-            mail = imaplib.IMAP4_SSL(imap_server)
-            mail.login(email_user, email_pass)
-            mail.logout()
+            with imap_pool.connection(email_user, email_pass, imap_server):
+                pass
             return {"success": True, "error": None}
         except Exception:
             logging.exception("Error when testing email connection")
             return {"success": False, "error": "Unable to connect to email server"}
 
     @staticmethod
-    def fetch_recent_emails(
+    def _get_uidvalidity(mail) -> Optional[int]:
+        """
+        Reads the UIDVALIDITY untagged response left behind by SELECT.
+        Returns None if the server did not report one.
+        """
+        try:
+            _, data = mail.response("UIDVALIDITY")
+            if data and data[0] is not None:
+                return int(data[0])
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def _is_gmail(mail, imap_server) -> bool:
+        """Gmail advertises X-GM-EXT-1; fall back to the hostname."""
+        try:
+            if "X-GM-EXT-1" in mail.capabilities:
+                return True
+        except TypeError:
+            pass
+        return (imap_server or "").lower() in ("imap.gmail.com", "imap.googlemail.com")
+
+    @staticmethod
+    def _search_uids(mail, search_criterion, profile_filter=None):
+        """
+        UID SEARCH for the window, narrowed by the profile filter when given.
+        A server that rejects the filter gets the plain window search instead.
+        """
+        if profile_filter:
+            criterion = f"{search_criterion} {profile_filter}"
+            print(f"🔍 IMAP Search: {criterion}")
+            try:
+                status, messages = mail.uid("SEARCH", criterion)
+                if status == "OK":
+                    return status, messages
+            except Exception as e:
+                print(f"⚠️ Search profile rejected ({type(e).__name__})")
+            print("⚠️ Search profile not applied, searching without it.")
+        else:
+            print(f"🔍 IMAP Search: {search_criterion}")
+        return mail.uid("SEARCH", search_criterion)
+
+    @staticmethod
+    def _decode_subject(raw_subject):
+        """Decodes an RFC 2047 encoded Subject header."""
+        subject, encoding = decode_header(raw_subject)[0]
+        if isinstance(subject, bytes):
+            subject = subject.decode(encoding or "utf-8", errors="ignore")
+        return subject
+
+    @staticmethod
+    def _format_uid_set(uids) -> str:
+        """
+        Formats UIDs as an IMAP sequence set, collapsing runs into ranges.
+        e.g. [1, 2, 3, 7, 9, 10] -> "1:3,7,9:10"
+        """
+        ordered = sorted({int(u) for u in uids})
+        ranges: List[List[int]] = []
+        for uid in ordered:
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            else:
+                ranges.append([uid, uid])
+        return ",".join(
+            str(start) if start == end else f"{start}:{end}" for start, end in ranges
+        )
+
+    @staticmethod
+    def _chunk_uids(uids, chunk_size=None):
+        """Splits UIDs into UID FETCH batches of IMAP_FETCH_CHUNK_SIZE."""
+        if chunk_size is None:
+            chunk_size = _positive_int_env(
+                "IMAP_FETCH_CHUNK_SIZE", DEFAULT_FETCH_CHUNK_SIZE
+            )
+        for i in range(0, len(uids), chunk_size):
+            yield uids[i : i + chunk_size]
+
+    @staticmethod
+    def _iter_fetch_response(data):
+        """
+        Walks a multi-message FETCH response, yielding (uid, literal) pairs.
+        The UID item may come before the literal (in the tuple header) or after it
+        (in the trailing bytes element), depending on the server.
+        """
+        pending = None
+        for response_part in data:
+            if isinstance(response_part, tuple):
+                if pending is not None:
+                    yield pending
+                uid_match = _UID_RE.search(response_part[0])
+                uid = int(uid_match.group(1)) if uid_match else None
+                pending = (uid, response_part[1])
+            elif pending is not None:
+                if pending[0] is None and isinstance(response_part, bytes):
+                    uid_match = _UID_RE.search(response_part)
+                    if uid_match:
+                        pending = (int(uid_match.group(1)), pending[1])
+                yield pending
+                pending = None
+        if pending is not None:
+            yield pending
+
+    @staticmethod
+    def _fetch_headers(mail, uids) -> dict:
+        """
+        Fetches dedupe headers for a set of UIDs, one UID FETCH per chunk.
+        Uses BODY.PEEK so the messages are not marked as seen.
+        Returns {uid: {"message_id", "from", "subject", "date"}}.
+        """
+        headers = {}
+        for chunk in EmailService._chunk_uids(uids):
+            typ, data = mail.uid(
+                "FETCH",
+                EmailService._format_uid_set(chunk),
+                f"(UID BODY.PEEK[HEADER.FIELDS ({DEDUPE_HEADER_FIELDS})])",
+            )
+            if typ != "OK":
+                continue
+
+            for uid, raw_headers in EmailService._iter_fetch_response(data):
+                if uid is None:
+                    continue
+                msg = email.message_from_bytes(raw_headers)
+                headers[uid] = {
+                    "message_id": msg.get("Message-ID"),
+                    "from": msg.get("From"),
+                    "subject": EmailService._decode_subject(msg["Subject"]),
+                    "date": msg.get("Date"),
+                }
+        return headers
+
+    @staticmethod
+    def _fetch_bodies(mail, uids):
+        """
+        Downloads full messages in pipelined UID FETCH chunks.
+        If a chunk fails (e.g. one malformed message), its UIDs are retried one
+        at a time so a single bad message does not drop the whole chunk.
+        Yields (uid, raw_bytes) pairs.
+        """
+        for chunk in EmailService._chunk_uids(uids):
+            try:
+                _, msg_data = mail.uid(
+                    "FETCH", EmailService._format_uid_set(chunk), "(UID BODY[])"
+                )
+            except Exception as e:
+                if len(chunk) == 1:
+                    print(f"❌ Error fetching email {chunk[0]}: {e}")
+                    continue
+                print(f"⚠️ Chunk fetch failed ({type(e).__name__}), retrying singly")
+                yield from EmailService._fetch_bodies_singly(mail, chunk)
+                continue
+
+            for uid, raw_email in EmailService._iter_fetch_response(msg_data):
+                if uid is None and len(chunk) == 1:
+                    uid = int(chunk[0])
+                yield uid, raw_email
+
+    @staticmethod
+    def _fetch_bodies_singly(mail, uids):
+        """Fallback path for _fetch_bodies: one UID FETCH per message."""
+        for e_id in uids:
+            try:
+                _, msg_data = mail.uid("FETCH", e_id, "(UID BODY[])")
+                for _, raw_email in EmailService._iter_fetch_response(msg_data):
+                    yield int(e_id), raw_email
+            except Exception as e:
+                print(f"❌ Error fetching email {e_id}: {e}")
+
+    @staticmethod
+    def _parse_message(raw_email: bytes) -> dict:
+        """
+        Parses raw RFC 822 bytes into the dictionary shape used by the scheduler.
+        """
+        msg = email.message_from_bytes(raw_email)
+
+        # Extract body (plain text & HTML)
+        body = ""
+        html_body = ""
+
+        if msg.is_multipart():
+            for part in msg.walk():
+                content_type = part.get_content_type()
+                content_disposition = str(part.get("Content-Disposition"))
+
+                if "attachment" in content_disposition:
+                    continue
+
+                try:
+                    decoded = EmailService._decode_payload(part)
+                    if content_type == "text/plain":
+                        body += decoded
+                    elif content_type == "text/html":
+                        html_body += decoded
+                except Exception:
+                    continue
+        else:
+            # Not multipart
+            try:
+                decoded = EmailService._decode_payload(msg)
+                if decoded:
+                    if msg.get_content_type() == "text/html":
+                        html_body = decoded
+                    else:
+                        body = decoded
+            except Exception:
+                logging.exception("Failed to decode non-multipart email payload")
+
+        return EmailService._message_dict(msg, body, html_body)
+
+    @staticmethod
+    def _decode_payload(part, errors: str = "ignore") -> str:
+        """
+        Decoded text of a MIME part. Parts without a byte payload (e.g. a
+        malformed multipart) give "".
+        """
+        payload = part.get_payload(decode=True)
+        if not isinstance(payload, bytes):
+            return ""
+        return payload.decode("utf-8", errors=errors)
+
+    @staticmethod
+    def _message_dict(msg, body: str, html_body: str) -> dict:
+        """
+        Builds the email dictionary from parsed headers and decoded text parts.
+        `msg` only needs the headers, so partial fetches can share this.
+        """
+        # Fallback: If no plain text body, use HTML strip or just raw HTML (simplified)
+        if not body and html_body:
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(html_body, "html.parser")
+            body = soup.get_text(separator=" ", strip=True)
+
+        return {
+            "message_id": msg.get("Message-ID"),
+            "reply_to": msg.get("Reply-To"),
+            "from": msg.get("From"),
+            "subject": EmailService._decode_subject(msg["Subject"]),
+            "body": body,
+            "html_body": html_body,
+            "date": msg.get("Date"),
+        }
+
+    @staticmethod
+    def _fetch_text_parts(mail, uids) -> dict:
+        """
+        Partial fetch for one chunk: reads BODYSTRUCTURE, then downloads only
+        the headers and the text/plain and text/html sections, so attachments
+        never cross the wire. IMAP_BODY_BYTE_CAP (default: off) truncates each
+        section with BODY.PEEK[n]<0.N>.
+        Returns {uid: email_data}; UIDs missing from it need a full fetch.
+        """
+        try:
+            typ, data = mail.uid(
+                "FETCH", EmailService._format_uid_set(uids), "(UID BODYSTRUCTURE)"
+            )
+        except Exception as e:
+            print(f"⚠️ BODYSTRUCTURE fetch failed ({type(e).__name__}), using BODY[]")
+            return {}
+        if typ != "OK":
+            return {}
+
+        wanted = {int(uid) for uid in uids}
+        groups: Dict[tuple, List[int]] = {}
+        for uid, structure in parse_bodystructures(data).items():
+            plan = plan_text_sections(structure)
+            if uid in wanted and plan is not None:
+                groups.setdefault(tuple(plan), []).append(uid)
+
+        try:
+            byte_cap = max(int(os.environ.get("IMAP_BODY_BYTE_CAP", 0)), 0)
+        except (TypeError, ValueError):
+            byte_cap = 0
+        partial = f"<0.{byte_cap}>" if byte_cap else ""
+
+        parsed = {}
+        # Messages with the same layout share one UID FETCH
+        for layout, plan_uids in groups.items():
+            items = ["UID", f"BODY.PEEK[HEADER.FIELDS ({MESSAGE_HEADER_FIELDS})]"]
+            items += [f"BODY.PEEK[{section}]{partial}" for section, _, _ in layout]
+            try:
+                typ, data = mail.uid(
+                    "FETCH",
+                    EmailService._format_uid_set(plan_uids),
+                    f"({' '.join(items)})",
+                )
+            except Exception as e:
+                print(f"⚠️ Partial fetch failed ({type(e).__name__}), using BODY[]")
+                continue
+            if typ != "OK":
+                continue
+
+            for uid, sections in iter_section_response(data):
+                header = next(
+                    (v for k, v in sections.items() if k.startswith("HEADER")), None
+                )
+                if uid not in wanted or header is None:
+                    continue
+                if any(section not in sections for section, _, _ in layout):
+                    continue
+                try:
+                    body = ""
+                    html_body = ""
+                    for section, subtype, encoding in layout:
+                        payload = decode_section(sections[section], encoding)
+                        if not payload:
+                            continue
+                        decoded = payload.decode("utf-8", errors="ignore")
+                        if subtype == "html":
+                            html_body += decoded
+                        else:
+                            body += decoded
+                    parsed[uid] = EmailService._message_dict(
+                        email.message_from_bytes(header), body, html_body
+                    )
+                except Exception:
+                    continue  # Retried with a full download
+        return parsed
+
+    @staticmethod
+    def _fetch_messages(mail, uids):
+        """
+        Yields (uid, email_data) in UID order, one chunk at a time.
+        With IMAP_PARTIAL_FETCH (default: on) only text sections are downloaded;
+        anything the partial path cannot handle falls back to the full BODY[].
+        A UID that could not be fetched or parsed is yielded with None, so the
+        caller can keep its sync cursor below it.
+        """
+        partial_fetch = os.environ.get("IMAP_PARTIAL_FETCH", "true").lower() not in (
+            "0",
+            "false",
+            "no",
+        )
+        for chunk in EmailService._chunk_uids(uids):
+            parsed = (
+                EmailService._fetch_text_parts(mail, chunk) if partial_fetch else {}
+            )
+            missing = [e_id for e_id in chunk if int(e_id) not in parsed]
+            for uid, raw_email in EmailService._fetch_bodies(mail, missing):
+                try:
+                    parsed[uid] = EmailService._parse_message(raw_email)
+                except Exception as e:
+                    print(f"❌ Error parsing email {uid}: {e}")
+            for e_id in chunk:
+                yield int(e_id), parsed.pop(int(e_id), None)
+
+    @staticmethod
+    def fetch_recent_emails(*args, **kwargs) -> list:
+        """
+        List form of iter_recent_emails (same arguments). Prefer the iterator
+        for large batches; this holds every decoded body at once. Entries for
+        messages that could not be fetched are left out.
+        """
+        return [
+            email_data
+            for email_data in EmailService.iter_recent_emails(*args, **kwargs)
+            if not email_data.get("fetch_failed")
+        ]
+
+    @staticmethod
+    def iter_recent_emails(
         username,
         password,
         imap_server="imap.gmail.com",
         imap_port=993,
         search_criterion=None,
         lookback_days=None,
+        sync_state=None,
+        folder="inbox",
+        processed_filter: Optional[Callable[[list], set]] = None,
+        timeout=None,
+        search_profile: Optional[dict] = None,
     ):
         """
-        Fetch recent emails from an IMAP server.
+        Yield recent emails from an IMAP server one parsed message at a time,
+        so callers never hold a whole batch of bodies in memory.
 
         Args:
             username: Email address to authenticate with
@@ -127,16 +532,37 @@ class EmailService:
             lookback_days: Optional integer number of days to look back.
                           If None, defaults to emails from the last N days,
                           where N is set by EMAIL_LOOKBACK_DAYS env var (default: 3)
-
-        Returns:
-            List of email dictionaries containing message_id, subject, body,
-            html_body, from, date, reply_to, and account_email fields.
-            Returns empty list on error or if no credentials provided.
+            sync_state: Optional dict with "uidvalidity" and "last_uid" from a
+                        previous poll. When the mailbox UIDVALIDITY still matches,
+                        only UIDs above last_uid are searched; otherwise the
+                        date window is used.
+            folder: Mailbox to select (default: "inbox")
+            processed_filter: Optional callable that receives a list of Message-IDs
+                              and returns the subset already processed. When set,
+                              headers are fetched first and bodies are downloaded
+                              only for unseen messages; seen ones come back as
+                              header-only entries flagged "already_processed".
+            timeout: Optional socket timeout in seconds for the IMAP connection.
+            search_profile: Optional server-side filter (see search_profile.py),
+                            ANDed with the UID or date window. Gmail servers get
+                            an X-GM-RAW query, others standard SEARCH keys.
+                            Ignored when search_criterion is given.
+
+        Yields:
+            Email dictionaries containing message_id, subject, body, html_body,
+            from, date, reply_to, account_email, uid, uidvalidity and folder
+            fields, in ascending UID order. A message that could not be
+            fetched or parsed comes back as a location-only entry flagged
+            "fetch_failed", so it is retried instead of skipped by the sync
+            cursor. Yields nothing if no credentials are provided; on an IMAP
+            error the stream simply ends early.
         Environment Variables:
             EMAIL_LOOKBACK_DAYS: Number of days to look back for emails (default: 3).
                                Must be a positive integer.
             EMAIL_BATCH_LIMIT: Maximum number of emails to fetch (default: 100).
                              Prevents timeouts with large inboxes.
+            IMAP_FETCH_CHUNK_SIZE: Messages requested per UID FETCH round trip
+                                 (default: 50).
         """
         print("🔌 Connecting to IMAP server...")
 
@@ -163,253 +589,324 @@ class EmailService:
 
         if not username or not password:
             print("❌ IMAP Credentials missing")
-            return []
+            return
 
         try:
-            # Connect to the server
-            mail = imaplib.IMAP4_SSL(imap_server, imap_port)
-            mail.login(username, password)
-            mail.select("inbox")
-
-            if search_criterion is None:
-                # Default to last N days
-                since_date = (datetime.now() - timedelta(days=lookback_days)).strftime(
-                    "%d-%b-%Y"
+            # Borrow a pooled session; it stays logged in for the next poll
+            with imap_pool.connection(
+                username, password, imap_server, imap_port, timeout=timeout
+            ) as mail:
+                mail.select(folder)
+
+                uidvalidity = EmailService._get_uidvalidity(mail)
+                custom_criterion = search_criterion is not None
+                last_uid = 0
+
+                if not custom_criterion and sync_state:
+                    stored_validity = sync_state.get("uidvalidity")
+                    if (
+                        uidvalidity is not None
+                        and stored_validity == uidvalidity
+                        and sync_state.get("last_uid")
+                    ):
+                        # Incremental sync: only UIDs we have not handled yet
+                        last_uid = int(sync_state["last_uid"])
+                        search_criterion = f"UID {last_uid + 1}:*"
+                    elif stored_validity is not None:
+                        print("♻️ UIDVALIDITY changed, falling back to date window.")
+
+                if search_criterion is None:
+                    # Default to last N days
+                    since_date = (
+                        datetime.now() - timedelta(days=lookback_days)
+                    ).strftime("%d-%b-%Y")
+                    search_criterion = f'(SINCE "{since_date}")'
+
+                profile_filter = None
+                if search_profile and not custom_criterion:
+                    profile_filter = compile_search_profile(
+                        search_profile, EmailService._is_gmail(mail, imap_server)
+                    )
+
+                status, messages = EmailService._search_uids(
+                    mail, search_criterion, profile_filter
                 )
-                search_criterion = f'(SINCE "{since_date}")'
 
-            print(f"🔍 IMAP Search: {search_criterion}")
-            status, messages = mail.search(None, search_criterion)
+                if status != "OK":
+                    print("❌ No messages found!")
+                    return
 
-            if status != "OK":
-                print("❌ No messages found!")
-                return []
+                email_ids = messages[0].split()
+                if last_uid:
+                    # "UID n:*" always matches the newest message, even if its UID < n
+                    email_ids = [e_id for e_id in email_ids if int(e_id) > last_uid]
+                total_emails = len(email_ids)
 
-            email_ids = messages[0].split()
-            total_emails = len(email_ids)
-
-            # Apply batch limit to prevent timeouts with validation
-            default_batch_limit = 100
-            raw_batch_limit = os.environ.get("EMAIL_BATCH_LIMIT")
-            try:
-                if raw_batch_limit is None:
+                # Apply batch limit to prevent timeouts with validation
+                default_batch_limit = 100
+                raw_batch_limit = os.environ.get("EMAIL_BATCH_LIMIT")
+                try:
+                    if raw_batch_limit is None:
+                        batch_limit = default_batch_limit
+                    else:
+                        batch_limit = int(raw_batch_limit)
+                        if batch_limit <= 0:
+                            raise ValueError(
+                                "EMAIL_BATCH_LIMIT must be a positive integer"
+                            )
+                except (ValueError, TypeError):
+                    logging.warning(
+                        "Invalid EMAIL_BATCH_LIMIT value %r; falling back to %d",
+                        raw_batch_limit,
+                        default_batch_limit,
+                    )
                     batch_limit = default_batch_limit
+
+                if total_emails > batch_limit:
+                    if last_uid:
+                        print(
+                            f"⚠️ Limiting fetched emails to the oldest {batch_limit} out of {total_emails} "
+                            f"new messages; the rest will be picked up next poll."
+                        )
+                        # Incremental sync catches up in UID order so no message is skipped
+                        email_ids = email_ids[:batch_limit]
+                    else:
+                        print(
+                            f"⚠️ Limiting fetched emails to the last {batch_limit} out of {total_emails} "
+                            f"matching messages to avoid timeouts."
+                        )
+                        # Keep only the most recent emails (higher UIDs are newer in IMAP)
+                        email_ids = email_ids[-batch_limit:]
+
+                # Log appropriately based on which search was used
+                if last_uid:
+                    print(f"📬 New emails since last sync: {len(email_ids)}")
+                elif not custom_criterion:
+                    print(
+                        f"📬 Recent emails found (last {lookback_days} days): {len(email_ids)}"
+                    )
                 else:
-                    batch_limit = int(raw_batch_limit)
-                    if batch_limit <= 0:
-                        raise ValueError("EMAIL_BATCH_LIMIT must be a positive integer")
-            except (ValueError, TypeError):
-                logging.warning(
-                    "Invalid EMAIL_BATCH_LIMIT value %r; falling back to %d",
-                    raw_batch_limit,
-                    default_batch_limit,
-                )
-                batch_limit = default_batch_limit
+                    print(f"📬 Emails matching search criterion: {len(email_ids)}")
+
+                # Header-only entries for mail that is already in the database
+                skipped: Deque[dict] = deque()
+
+                if processed_filter is not None and email_ids:
+                    # Phase one: headers only, then a single DB lookup for the batch
+                    headers = EmailService._fetch_headers(mail, email_ids)
+                    seen_ids = processed_filter(
+                        [h["message_id"] for h in headers.values() if h["message_id"]]
+                    )
+                    if seen_ids:
+                        remaining_ids = []
+                        for e_id in email_ids:
+                            header = headers.get(int(e_id))
+                            if header and header["message_id"] in seen_ids:
+                                skipped.append(
+                                    {
+                                        **header,
+                                        "reply_to": None,
+                                        "body": "",
+                                        "html_body": "",
+                                        "account_email": username,
+                                        "uid": int(e_id),
+                                        "uidvalidity": uidvalidity,
+                                        "folder": folder,
+                                        "already_processed": True,
+                                    }
+                                )
+                            else:
+                                remaining_ids.append(e_id)
+                        print(
+                            f"⏭️ Skipping body download for {len(email_ids) - len(remaining_ids)} already processed emails."
+                        )
+                        email_ids = remaining_ids
+
+                # Phase two: text parts (or full bodies), pipelined in chunks
+                for uid, email_data in EmailService._fetch_messages(mail, email_ids):
+                    # Keep UID order so a stream cut short never skips unread mail
+                    while skipped and skipped[0]["uid"] < uid:
+                        yield skipped.popleft()
+                    if email_data is None:
+                        email_data = {
+                            "message_id": None,
+                            "subject": None,
+                            "from": None,
+                            "body": "",
+                            "html_body": "",
+                            "fetch_failed": True,
+                        }
+                    email_data.update(
+                        {
+                            "account_email": username,
+                            "uid": uid,
+                            "uidvalidity": uidvalidity,
+                            "folder": folder,
+                        }
+                    )
+                    yield email_data
+
+                yield from skipped
 
-            if total_emails > batch_limit:
-                print(
-                    f"⚠️ Limiting fetched emails to the last {batch_limit} out of {total_emails} "
-                    f"matching messages to avoid timeouts."
-                )
-                # Keep only the most recent emails (higher IDs are newer in IMAP)
-                email_ids = email_ids[-batch_limit:]
+        except Exception as e:
+            print(f"❌ IMAP Connection Error: {type(e).__name__}")
 
-            # Log appropriately based on whether custom criterion was used
-            if search_criterion is None:
-                print(
-                    f"📬 Recent emails found (last {lookback_days} days): {len(email_ids)}"
-                )
-            else:
-                print(f"📬 Emails matching search criterion: {len(email_ids)}")
+    @staticmethod
+    def get_message_location(processed_email) -> Optional[dict]:
+        """
+        Returns the IMAP location recorded for a ProcessedEmail at poll time,
+        or None for rows saved before locations were tracked.
+        """
+        if getattr(processed_email, "imap_uid", None) is None:
+            return None
+        return {
+            "folder": processed_email.imap_folder or "inbox",
+            "uidvalidity": processed_email.imap_uidvalidity,
+            "uid": processed_email.imap_uid,
+        }
 
-            fetched_emails = []
+    @staticmethod
+    def _fetch_by_location(mail, location: dict) -> Optional[bytes]:
+        """
+        Reads a message straight from its recorded UID. Returns None when the
+        location is no longer valid (UIDVALIDITY changed or message gone).
+        """
+        if location.get("uid") is None or location.get("uidvalidity") is None:
+            return None
 
-            for e_id in email_ids:
-                try:
-                    # Fetch the email body (BODY[])
-                    _, msg_data = mail.fetch(e_id, "(BODY[])")
-                    for response_part in msg_data:
-                        if isinstance(response_part, tuple):
-                            msg = email.message_from_bytes(response_part[1])
-
-                            # Parse subject
-                            subject, encoding = decode_header(msg["Subject"])[0]
-                            if isinstance(subject, bytes):
-                                subject = subject.decode(
-                                    encoding or "utf-8", errors="ignore"
-                                )
+        status, _ = mail.select(location.get("folder") or "inbox")
+        if status != "OK":
+            return None
+        if EmailService._get_uidvalidity(mail) != location["uidvalidity"]:
+            return None
 
-                            # Extract body (plain text & HTML)
-                            body = ""
-                            html_body = ""
-
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    content_type = part.get_content_type()
-                                    content_disposition = str(
-                                        part.get("Content-Disposition")
-                                    )
-
-                                    if "attachment" in content_disposition:
-                                        continue
-
-                                    try:
-                                        payload = part.get_payload(decode=True)
-                                        if payload:
-                                            decoded = payload.decode(
-                                                "utf-8", errors="ignore"
-                                            )
-                                            if content_type == "text/plain":
-                                                body += decoded
-                                            elif content_type == "text/html":
-                                                html_body += decoded
-                                    except Exception:
-                                        continue
-                            else:
-                                # Not multipart
-                                try:
-                                    payload = msg.get_payload(decode=True)
-                                    if payload:
-                                        decoded = payload.decode(
-                                            "utf-8", errors="ignore"
-                                        )
-                                        if msg.get_content_type() == "text/html":
-                                            html_body = decoded
-                                        else:
-                                            body = decoded
-                                except Exception:
-                                    logging.exception(
-                                        "Failed to decode non-multipart email payload"
-                                    )
-
-                            # Fallback: If no plain text body, use HTML strip or just raw HTML (simplified)
-                            if not body and html_body:
-                                from bs4 import BeautifulSoup
-
-                                soup = BeautifulSoup(html_body, "html.parser")
-                                body = soup.get_text(separator=" ", strip=True)
-
-                            fetched_emails.append(
-                                {
-                                    "message_id": msg.get("Message-ID"),
-                                    "reply_to": msg.get("Reply-To"),
-                                    "from": msg.get("From"),
-                                    "subject": subject,
-                                    "body": body,
-                                    "html_body": html_body,
-                                    "date": msg.get("Date"),
-                                    "account_email": username,  # Fixed: was email_user
-                                }
-                            )
-                except Exception as e:
-                    print(f"❌ Error fetching email {e_id}: {e}")
+        uid = int(location["uid"])
+        typ, data = mail.uid("FETCH", str(uid), "(UID BODY[])")
+        if typ != "OK":
+            return None
+        for fetched_uid, raw_email in EmailService._iter_fetch_response(data):
+            if fetched_uid == uid:
+                return raw_email
+        return None
+
+    @staticmethod
+    def _parse_original(raw_email: bytes) -> dict:
+        """
+        Parses a re-fetched original into the shape used by reprocess and
+        toggle-ignored (subject, body, html_body, raw).
+        """
+        msg = email.message_from_bytes(raw_email)
+
+        # Extract body (similar logic to fetch_recent_emails)
+        body = ""
+        html_body = ""
+
+        if msg.is_multipart():
+            for part in msg.walk():
+                content_type = part.get_content_type()
+                content_disposition = str(part.get("Content-Disposition"))
+                if "attachment" in content_disposition:
                     continue
+                if content_type == "text/plain":
+                    try:
+                        body = EmailService._decode_payload(part, errors="strict")
+                    except Exception:
+                        pass
+                elif content_type == "text/html":
+                    try:
+                        html_body = EmailService._decode_payload(part, errors="strict")
+                    except Exception:
+                        pass
+        else:
+            payload = EmailService._decode_payload(msg, errors="strict")
+            if msg.get_content_type() == "text/html":
+                html_body = payload
+            else:
+                body = payload
 
-            mail.close()
-            mail.logout()
-            return fetched_emails
+        # Fallback to HTML if needed
+        if not body and html_body:
+            from bs4 import BeautifulSoup
 
-        except Exception as e:
-            print(f"❌ IMAP Connection Error: {type(e).__name__}")
-            return []
+            soup = BeautifulSoup(html_body, "html.parser")
+            body = soup.get_text(separator=" ", strip=True)
+
+        # Return dictionary with body and raw content (if needed for forwarding as attachment/original)
+        return {
+            "subject": msg.get("Subject"),  # Should decode? Caller usually has subject.
+            "body": body,
+            "html_body": html_body,
+            "raw": raw_email,
+        }
 
     @staticmethod
     def fetch_email_by_id(
-        email_user, email_pass, message_id, imap_server="imap.gmail.com"
+        email_user,
+        email_pass,
+        message_id,
+        imap_server="imap.gmail.com",
+        location: Optional[dict] = None,
     ):
         """
         Fetch a single email by its Message-ID header.
+
+        `location` is the {"folder", "uidvalidity", "uid"} recorded when the
+        message was polled (see get_message_location). While it is still valid
+        the message is read with a direct UID FETCH; the server-side
+        HEADER Message-ID search is only used as a fallback.
         """
         if not email_user or not email_pass or not message_id:
             return None
 
         try:
-            mail = imaplib.IMAP4_SSL(imap_server)
-            mail.login(email_user, email_pass)
-            mail.select("inbox")
-
-            # Search by Message-ID
-            # Message-ID usually contains <...>, verify if stored ID has them or not.
-            # Stored ID usually is the raw header value.
-            # IMAP search uses "HEADER Message-ID <val>"
-
-            # Escape quotes in message_id just in case
-            safe_id = message_id.replace('"', '\\"')
-            search_criterion = f'(HEADER Message-ID "{safe_id}")'
-
-            status, messages = mail.search(None, search_criterion)
-
-            if status != "OK" or not messages[0]:
-                # Try without surrounding brackets if the stored ID has/hasn't them
-                # (Some servers are picky or ID format varies)
-                logging.info(
-                    f"Email not found by exact ID: {message_id}, trying loose search"
-                )
-                return None
-
-            email_ids = messages[0].split()
-            # Fetch the most recent match (should be unique usually)
-            latest_email_id = email_ids[-1]
+            with imap_pool.connection(email_user, email_pass, imap_server) as mail:
+                if location:
+                    raw_email = EmailService._fetch_by_location(mail, location)
+                    if raw_email:
+                        return EmailService._parse_original(raw_email)
+                    logging.info(
+                        f"Stored location for {message_id} is stale, searching by ID"
+                    )
+
+                mail.select("inbox")
+
+                # Search by Message-ID
+                # Message-ID usually contains <...>, verify if stored ID has them or not.
+                # Stored ID usually is the raw header value.
+                # IMAP search uses "HEADER Message-ID <val>"
+
+                # Escape quotes in message_id just in case
+                safe_id = message_id.replace('"', '\\"')
+                search_criterion = f'(HEADER Message-ID "{safe_id}")'
+
+                status, messages = mail.search(None, search_criterion)
+
+                if status != "OK" or not messages[0]:
+                    # Try without surrounding brackets if the stored ID has/hasn't them
+                    # (Some servers are picky or ID format varies)
+                    logging.info(
+                        f"Email not found by exact ID: {message_id}, trying loose search"
+                    )
+                    return None
+
+                email_ids = messages[0].split()
+                # Fetch the most recent match (should be unique usually)
+                latest_email_id = email_ids[-1]
+
+                typ, data = mail.fetch(latest_email_id, "(BODY[])")
+                if typ != "OK":
+                    return None
+
+                raw_email = None
+                for response_part in data:
+                    if isinstance(response_part, tuple):
+                        raw_email = response_part[1]
+                        break
+
+                if raw_email:
+                    return EmailService._parse_original(raw_email)
 
-            typ, data = mail.fetch(latest_email_id, "(BODY[])")
-            if typ != "OK":
                 return None
-
-            raw_email = None
-            for response_part in data:
-                if isinstance(response_part, tuple):
-                    raw_email = response_part[1]
-                    break
-
-            if raw_email:
-                msg = email.message_from_bytes(raw_email)
-
-                # Extract body (similar logic to fetch_recent_emails)
-                body = ""
-                html_body = ""
-
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        content_disposition = str(part.get("Content-Disposition"))
-                        if "attachment" in content_disposition:
-                            continue
-                        if content_type == "text/plain":
-                            try:
-                                body = part.get_payload(decode=True).decode()
-                            except Exception:
-                                pass
-                        elif content_type == "text/html":
-                            try:
-                                html_body = part.get_payload(decode=True).decode()
-                            except Exception:
-                                pass
-                else:
-                    payload = msg.get_payload(decode=True).decode()
-                    if msg.get_content_type() == "text/html":
-                        html_body = payload
-                    else:
-                        body = payload
-
-                # Fallback to HTML if needed
-                if not body and html_body:
-                    from bs4 import BeautifulSoup
-
-                    soup = BeautifulSoup(html_body, "html.parser")
-                    body = soup.get_text(separator=" ", strip=True)
-
-                # Return dictionary with body and raw content (if needed for forwarding as attachment/original)
-                return {
-                    "subject": msg.get(
-                        "Subject"
-                    ),  # Should decode? Caller usually has subject.
-                    "body": body,
-                    "html_body": html_body,
-                    "raw": raw_email,
-                }
-
-            mail.logout()
-            return None
         except Exception as e:
             logging.error(f"Error fetching email by ID {message_id}: {e}")
             return None
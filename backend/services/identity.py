@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from typing import FrozenSet, Iterable, Optional
+
+from backend.services.email_service import EmailService
+
+# Recipient of forwarded receipts when WIFE_EMAIL is not configured
+DEFAULT_WIFE_EMAIL = "your-wife@email.com"
+
+
+def normalize_address(address: str) -> str:
+    """
+    Bare, lowercased address from a sender header or config value:
+    "Me <Me+Shop@x.com>" -> "me@x.com". Sub-address tags are dropped so
+    plus-aliases of an account count as the account itself.
+    """
+    address = (address or "").strip().lower()
+    start = address.rfind("<")
+    if start != -1:
+        end = address.find(">", start)
+        address = address[start + 1 : end if end != -1 else None].strip()
+    local, at, domain = address.partition("@")
+    if at and "+" in local:
+        address = f"{local.split('+', 1)[0]}@{domain}"
+    return address
+
+
+class IdentityRegistry:
+    """
+    The household's own addresses: mail from them is never a receipt to
+    forward. Built once from configuration, so checking a sender is one
+    parse and one set lookup rather than re-reading EMAIL_ACCOUNTS per email.
+
+    Configuration (environment):
+        WIFE_EMAIL: Recipient of forwarded receipts (default: your-wife@email.com)
+        GMAIL_EMAIL, ICLOUD_EMAIL, SENDER_EMAIL: Own addresses
+        EMAIL_ACCOUNTS: Every configured account address is included
+        EMAIL_ALIASES: Extra own addresses, comma separated (optional)
+    """
+
+    def __init__(self, addresses: Iterable[str]):
+        self.addresses: FrozenSet[str] = frozenset(
+            address for address in map(normalize_address, addresses) if address
+        )
+        self.fingerprint = hashlib.sha256(
+            "\0".join(sorted(self.addresses)).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @classmethod
+    def from_env(cls) -> "IdentityRegistry":
+        addresses = [
+            os.environ.get("WIFE_EMAIL") or DEFAULT_WIFE_EMAIL,
+            os.environ.get("GMAIL_EMAIL"),
+            os.environ.get("ICLOUD_EMAIL"),
+            os.environ.get("SENDER_EMAIL"),
+        ]
+        addresses.extend(acc.get("email") for acc in EmailService.get_all_accounts())
+        addresses.extend((os.environ.get("EMAIL_ALIASES") or "").split(","))
+        return cls(address for address in addresses if address)
+
+    def is_own(self, sender: str) -> bool:
+        """True when the sender's address is one of ours."""
+        return normalize_address(sender) in self.addresses
+
+
+_registry: Optional[IdentityRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_identity_registry() -> IdentityRegistry:
+    """The shared registry, built from configuration on first use."""
+    global _registry
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = IdentityRegistry.from_env()
+            registry = _registry
+    return registry
+
+
+def reload_identity_registry() -> IdentityRegistry:
+    """Rebuilds the registry, e.g. after the account configuration changed."""
+    global _registry
+    registry = IdentityRegistry.from_env()
+    with _registry_lock:
+        _registry = registry
+    print(f"🪪 Identity registry loaded: {len(registry.addresses)} own addresses")
+    return registry
@@ -0,0 +1,222 @@
+import imaplib
+import os
+import random
+import select
+import threading
+from typing import Callable, Optional
+
+# RFC 2177 asks clients to re-issue IDLE at least every 29 minutes
+DEFAULT_IDLE_TIMEOUT = 600
+IDLE_BACKOFF_INITIAL = 5
+IDLE_BACKOFF_MAX = 300
+
+_watchers: list = []
+
+
+def idle_enabled() -> bool:
+    """IMAP IDLE push mode is opt-in via IMAP_IDLE_ENABLED."""
+    return os.environ.get("IMAP_IDLE_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+class IdleNotSupported(Exception):
+    """Raised when the server does not advertise the IDLE capability."""
+
+
+class IdleWatcher(threading.Thread):
+    """
+    Holds one long-lived IMAP connection for an account in IDLE (RFC 2177) and
+    calls on_new_mail(account) whenever the server reports new messages.
+
+    Dropped connections are re-established with exponential backoff. Interval
+    polling keeps running alongside, so a dead watcher only costs latency.
+    """
+
+    def __init__(
+        self,
+        account: dict,
+        on_new_mail: Callable[[dict], None],
+        folder: str = "inbox",
+        idle_timeout: Optional[float] = None,
+    ):
+        super().__init__(daemon=True, name="imap-idle")
+        self.account = account
+        self.on_new_mail = on_new_mail
+        self.folder = folder
+        if idle_timeout is None:
+            try:
+                idle_timeout = float(
+                    os.environ.get("IMAP_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)
+                )
+            except (TypeError, ValueError):
+                idle_timeout = DEFAULT_IDLE_TIMEOUT
+        self.idle_timeout = idle_timeout
+        self._stop_event = threading.Event()
+        self._mail = None
+        self._buffer = b""
+        self._tag_counter = 0
+        self._backoff = IDLE_BACKOFF_INITIAL
+
+    def stop(self):
+        """Signals the watcher to exit and unblocks any pending socket read."""
+        self._stop_event.set()
+        mail = self._mail
+        if mail is not None:
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def run(self):
+        while not self.stopped:
+            try:
+                self._connect()
+                # Mail that arrived while disconnected is never pushed
+                self._catch_up()
+                while not self.stopped:
+                    if self._wait_for_new_mail():
+                        self._catch_up()
+            except IdleNotSupported:
+                print("⚠️ Server does not support IDLE. Using interval polling only.")
+                return
+            except Exception as e:
+                if self.stopped:
+                    break
+                print(
+                    f"⚠️ IDLE connection lost ({type(e).__name__}). "
+                    f"Reconnecting in {self._backoff}s..."
+                )
+            finally:
+                self._disconnect()
+
+            # Jitter keeps several accounts from reconnecting in lockstep
+            self._stop_event.wait(self._backoff + random.uniform(0, 1))
+            self._backoff = min(self._backoff * 2, IDLE_BACKOFF_MAX)
+
+    def _connect(self):
+        mail = imaplib.IMAP4_SSL(self.account.get("imap_server", "imap.gmail.com"))
+        self._mail = mail
+        self._buffer = b""
+        mail.login(self.account["email"], self.account["password"])
+        if "IDLE" not in mail.capabilities:
+            raise IdleNotSupported()
+        mail.select(self.folder, readonly=True)
+        mail.response("EXISTS")  # Discard the SELECT count; only changes matter
+
+    def _catch_up(self):
+        self._notify()
+        # Mail that landed while we were processing shows up on NOOP
+        while not self.stopped and self._has_pending_mail():
+            self._notify()
+
+    def _has_pending_mail(self) -> bool:
+        mail = self._mail
+        assert mail is not None
+        mail.noop()
+        _, data = mail.response("EXISTS")
+        return bool(data and data[-1] is not None)
+
+    def _disconnect(self):
+        mail, self._mail = self._mail, None
+        if mail is None:
+            return
+        try:
+            mail.logout()
+        except Exception:
+            pass
+
+    def _notify(self):
+        try:
+            self.on_new_mail(self.account)
+        except Exception as e:
+            print(f"❌ Error processing pushed emails: {type(e).__name__}")
+
+    def _next_tag(self) -> bytes:
+        self._tag_counter += 1
+        return f"IDLE{self._tag_counter}".encode()
+
+    def _read_line(self, timeout: Optional[float]) -> Optional[bytes]:
+        """
+        Reads one CRLF-terminated line from the raw socket.
+        Returns None if nothing arrives within `timeout` seconds.
+        """
+        mail = self._mail
+        assert mail is not None
+        while b"\r\n" not in self._buffer:
+            sock = mail.sock
+            # SSL sockets can hold decrypted bytes that select() cannot see
+            pending = sock.pending() if hasattr(sock, "pending") else 0
+            if not pending:
+                ready, _, _ = select.select([sock], [], [], timeout)
+                if not ready:
+                    return None
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\r\n", 1)
+        return line
+
+    def _wait_for_new_mail(self) -> bool:
+        """
+        Runs one IDLE cycle. Returns True if the server reported new messages,
+        False if the cycle ended on the refresh timeout.
+        """
+        mail = self._mail
+        assert mail is not None
+        tag = self._next_tag()
+        mail.send(tag + b" IDLE\r\n")
+
+        new_mail = False
+        # Untagged responses may arrive before the continuation (RFC 2177)
+        while True:
+            line = self._read_line(self.idle_timeout)
+            if line is None or not line.startswith((b"+", b"*")):
+                raise imaplib.IMAP4.error("IDLE rejected by server")
+            if line.startswith(b"+"):
+                break
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort("server closed IDLE session")
+            if line.endswith(b"EXISTS"):
+                new_mail = True
+        # A healthy IDLE session resets the reconnect backoff
+        self._backoff = IDLE_BACKOFF_INITIAL
+
+        while not new_mail:
+            line = self._read_line(self.idle_timeout)
+            if line is None:
+                break  # Refresh the IDLE before the server drops us
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort("server closed IDLE session")
+            if line.startswith(b"*") and line.endswith(b"EXISTS"):
+                new_mail = True
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = self._read_line(self.idle_timeout)
+            if line is None:
+                raise imaplib.IMAP4.abort("no response to IDLE DONE")
+            if line.startswith(tag):
+                return new_mail
+            if line.startswith(b"*") and line.endswith(b"EXISTS"):
+                new_mail = True
+
+
+def start_idle_watchers(accounts: list, on_new_mail: Callable[[dict], None]):
+    """Starts one IdleWatcher per configured account."""
+    for acc in accounts:
+        if acc.get("email") and acc.get("password"):
+            watcher = IdleWatcher(acc, on_new_mail)
+            watcher.start()
+            _watchers.append(watcher)
+    if _watchers:
+        print(f"📡 IMAP IDLE push enabled for {len(_watchers)} accounts.")
+
+
+def stop_idle_watchers():
+    """Stops every running IdleWatcher."""
+    while _watchers:
+        _watchers.pop().stop()
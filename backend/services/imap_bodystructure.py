@@ -0,0 +1,198 @@
+import email.message
+import re
+from typing import List, Optional, Tuple
+
+_TOKEN_RE = re.compile(rb'\s*(\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}$|[^\s()"]+)')
+_SECTION_RE = re.compile(rb"BODY\[([0-9.]*|HEADER[^\]]*)\](?:<\d+>)? \{\d+\}$")
+_MESSAGE_START_RE = re.compile(rb"^\d+ \(")
+_UID_RE = re.compile(rb"UID (\d+)")
+
+# (section, subtype, transfer encoding) for each text part to download
+SectionPlan = List[Tuple[str, str, str]]
+
+
+def _tokenize(data) -> list:
+    """
+    Flattens an imaplib FETCH response into tokens. Literals arrive as
+    (header ending in {n}, bytes) tuples and become plain string tokens.
+    """
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item
+            for token in _scan(head):
+                if token.startswith(b"{") and token.endswith(b"}"):
+                    tokens.append(("str", literal))
+                else:
+                    tokens.append(_classify(token))
+        elif isinstance(item, bytes):
+            tokens.extend(_classify(token) for token in _scan(item))
+    return tokens
+
+
+def _scan(chunk: bytes):
+    position = 0
+    chunk = chunk.rstrip()
+    while position < len(chunk):
+        match = _TOKEN_RE.match(chunk, position)
+        if not match:
+            break
+        yield match.group(1)
+        position = match.end()
+
+
+def _classify(token: bytes):
+    if token in (b"(", b")"):
+        return ("punct", token)
+    if token.startswith(b'"'):
+        return ("str", re.sub(rb"\\(.)", rb"\1", token[1:-1]))
+    if token.upper() == b"NIL":
+        return ("str", None)
+    return ("atom", token)
+
+
+def _parse_list(tokens, position):
+    """Parses a parenthesized list starting after its "(" token."""
+    items = []
+    while position < len(tokens):
+        kind, value = tokens[position]
+        if kind == "punct" and value == b"(":
+            sublist, position = _parse_list(tokens, position + 1)
+            items.append(sublist)
+        elif kind == "punct" and value == b")":
+            return items, position + 1
+        else:
+            items.append(
+                value.decode("utf-8", "replace") if value is not None else None
+            )
+            position += 1
+    raise ValueError("unbalanced BODYSTRUCTURE response")
+
+
+def parse_bodystructures(data) -> dict:
+    """
+    Parses a `UID FETCH ... (UID BODYSTRUCTURE)` response into
+    {uid: nested list}. Messages that cannot be parsed are left out.
+    """
+    tokens = _tokenize(data)
+    structures = {}
+    position = 0
+    while position < len(tokens):
+        kind, value = tokens[position]
+        if kind != "punct" or value != b"(":
+            position += 1
+            continue
+        try:
+            items, position = _parse_list(tokens, position + 1)
+        except ValueError:
+            break
+        fields = {}
+        for i in range(0, len(items) - 1, 2):
+            if isinstance(items[i], str):
+                fields[items[i].upper()] = items[i + 1]
+        uid, structure = fields.get("UID"), fields.get("BODYSTRUCTURE")
+        if uid and str(uid).isdigit() and isinstance(structure, list):
+            structures[int(uid)] = structure
+    return structures
+
+
+def _disposition(part: list, index: int) -> str:
+    if len(part) > index and isinstance(part[index], list) and part[index]:
+        return (part[index][0] or "").lower()
+    return ""
+
+
+def _walk(part: list, section: str, plan: SectionPlan):
+    """Mirrors msg.walk() + the attachment filter in EmailService._parse_message."""
+    if part and isinstance(part[0], list):
+        # Multipart: child parts first, then the subtype and extension data
+        children = []
+        for child in part:
+            if not isinstance(child, list):
+                break
+            children.append(child)
+        prefix = f"{section}." if section else ""
+        for number, child in enumerate(children, start=1):
+            _walk(child, f"{prefix}{number}", plan)
+        return
+
+    if len(part) < 7:
+        raise ValueError("truncated body part")
+    main_type = (part[0] or "").lower()
+    subtype = (part[1] or "").lower()
+    encoding = (part[5] or "7bit").lower()
+
+    if main_type == "message" and subtype == "rfc822" and len(part) > 8:
+        # walk() descends into attached messages, whatever their disposition
+        inner = part[8]
+        if isinstance(inner, list) and inner and isinstance(inner[0], list):
+            _walk(inner, section, plan)
+        elif isinstance(inner, list):
+            _walk(inner, f"{section}.1", plan)
+        return
+
+    disposition_index = 9 if main_type == "text" else 8
+    if "attachment" in _disposition(part, disposition_index):
+        return
+    if main_type == "text" and subtype in ("plain", "html"):
+        plan.append((section, subtype, encoding))
+
+
+def plan_text_sections(structure: list) -> Optional[SectionPlan]:
+    """
+    Lists the section numbers worth downloading: every text/plain and
+    text/html leaf that is not an attachment, in walk() order.
+
+    A non-multipart message is always fetched whole as section 1, because
+    _parse_message treats any single-part payload as the body.
+    Returns None if the structure is not understood.
+    """
+    try:
+        if structure and isinstance(structure[0], list):
+            plan: SectionPlan = []
+            _walk(structure, "", plan)
+            return plan
+        if len(structure) < 7:
+            return None
+        subtype = (structure[1] or "").lower()
+        main_type = (structure[0] or "").lower()
+        kind = "html" if (main_type, subtype) == ("text", "html") else "plain"
+        return [("1", kind, (structure[5] or "7bit").lower())]
+    except (IndexError, TypeError, ValueError, AttributeError):
+        return None
+
+
+def iter_section_response(data):
+    """
+    Walks a multi-section FETCH response, yielding (uid, {section: bytes}).
+    Header sections are keyed by their full name (e.g. "HEADER.FIELDS (...)").
+    """
+    uid, sections = None, {}
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item
+            if _MESSAGE_START_RE.match(head):
+                if sections:
+                    yield uid, sections
+                uid, sections = None, {}
+            uid_match = _UID_RE.search(head)
+            if uid_match:
+                uid = int(uid_match.group(1))
+            section_match = _SECTION_RE.search(head)
+            if section_match:
+                sections[section_match.group(1).decode()] = literal
+        elif isinstance(item, bytes) and uid is None:
+            uid_match = _UID_RE.search(item)
+            if uid_match:
+                uid = int(uid_match.group(1))
+    if sections:
+        yield uid, sections
+
+
+def decode_section(raw: bytes, encoding: str) -> bytes:
+    """Undoes a Content-Transfer-Encoding exactly as get_payload(decode=True) does."""
+    part = email.message.Message()
+    part["Content-Transfer-Encoding"] = encoding
+    part.set_payload(raw.decode("ascii", "surrogateescape"))
+    payload = part.get_payload(decode=True)
+    return payload if isinstance(payload, bytes) else b""
@@ -0,0 +1,316 @@
+import hashlib
+import imaplib
+import logging
+import os
+import select
+import threading
+import time
+from contextlib import contextmanager
+
+# Gmail allows 15 simultaneous IMAP sessions per account, iCloud far fewer
+DEFAULT_MAX_PER_SERVER = 4
+# Idle sessions older than this are NOOP-checked before being handed out
+DEFAULT_KEEPALIVE_INTERVAL = 60
+# Idle sessions unused for this long are logged out by keepalive()
+DEFAULT_MAX_IDLE = 600
+# How long a caller waits for a free slot when its server is at the cap
+DEFAULT_WAIT_TIMEOUT = 30
+
+
+def _env_seconds(name: str, default: float) -> float:
+    raw_value = os.environ.get(name)
+    if raw_value is None:
+        return default
+    try:
+        value = float(raw_value)
+        if value <= 0:
+            raise ValueError(f"{name} must be positive")
+        return value
+    except (TypeError, ValueError):
+        logging.warning(
+            "Invalid %s value %r; falling back to %s", name, raw_value, default
+        )
+        return default
+
+
+class ImapPoolExhausted(Exception):
+    """Raised when no connection slot frees up for a server within the wait timeout."""
+
+
+class ImapConnectionPool:
+    """
+    Keeps authenticated IMAP sessions open between callers, keyed by
+    (server, port, account, password hash), so a changed or wrong password
+    never gets a session authenticated with another one. A session is
+    borrowed by one thread at a time via `connection()` and returned
+    afterwards; sessions that raised are dropped.
+
+    Configuration (environment):
+        IMAP_POOL_MAX_PER_SERVER: Open sessions allowed per server (default: 4)
+        IMAP_POOL_KEEPALIVE: Seconds before an idle session is NOOP-checked (default: 60)
+        IMAP_POOL_MAX_IDLE: Seconds an unused session is kept open (default: 600)
+        IMAP_POOL_WAIT_TIMEOUT: Seconds to wait for a free slot (default: 30)
+    """
+
+    def __init__(
+        self,
+        max_per_server=None,
+        keepalive_interval=None,
+        max_idle=None,
+        wait_timeout=None,
+    ):
+        self.max_per_server = int(
+            max_per_server
+            or _env_seconds("IMAP_POOL_MAX_PER_SERVER", DEFAULT_MAX_PER_SERVER)
+        )
+        self.keepalive_interval = keepalive_interval or _env_seconds(
+            "IMAP_POOL_KEEPALIVE", DEFAULT_KEEPALIVE_INTERVAL
+        )
+        self.max_idle = max_idle or _env_seconds("IMAP_POOL_MAX_IDLE", DEFAULT_MAX_IDLE)
+        self.wait_timeout = wait_timeout or _env_seconds(
+            "IMAP_POOL_WAIT_TIMEOUT", DEFAULT_WAIT_TIMEOUT
+        )
+        self._cond = threading.Condition()
+        # key -> [(mail, last_used, last_checked)], most recently returned last
+        self._idle = {}
+        # (server, port) -> sessions open, idle or borrowed
+        self._open = {}
+        self._metrics = {
+            "created": 0,
+            "reused": 0,
+            "stale": 0,
+            "discarded": 0,
+            "evicted": 0,
+            "waits": 0,
+            "keepalive_noops": 0,
+        }
+
+    @staticmethod
+    def _make_key(username, password, imap_server, imap_port):
+        return (
+            (imap_server or "").lower(),
+            int(imap_port),
+            (username or "").lower(),
+            hashlib.sha256((password or "").encode()).hexdigest(),
+        )
+
+    @contextmanager
+    def connection(
+        self,
+        username,
+        password,
+        imap_server="imap.gmail.com",
+        imap_port=993,
+        timeout=None,
+    ):
+        """
+        Borrows an authenticated session for `username`, logging in if none is
+        pooled. The session goes back to the pool unless the block raised.
+        """
+        key = self._make_key(username, password, imap_server, imap_port)
+        mail = self._acquire(key, username, password, imap_server, imap_port, timeout)
+        try:
+            yield mail
+        except GeneratorExit:
+            # A streaming consumer stopped between whole responses; still usable
+            self._release(key, mail)
+            raise
+        except BaseException:
+            self._discard(key, mail)
+            raise
+        else:
+            self._release(key, mail)
+
+    def _acquire(self, key, username, password, imap_server, imap_port, timeout):
+        server = key[:2]
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            entry = None
+            victim = None
+            with self._cond:
+                idle = self._idle.get(key)
+                if idle:
+                    entry = idle.pop()
+                elif self._open.get(server, 0) < self.max_per_server:
+                    self._open[server] = self._open.get(server, 0) + 1
+                else:
+                    # At the cap: free a slot held by another account's idle session
+                    victim = self._pop_idle_for_server(server)
+                    if victim is None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise ImapPoolExhausted(
+                                f"No IMAP connection slot free for {server[0]}"
+                            )
+                        self._metrics["waits"] += 1
+                        self._cond.wait(remaining)
+                        continue
+
+            if victim is not None:
+                self._count("evicted")
+                self._close(victim, graceful=True)
+                self._forget(server)
+                continue
+
+            if entry is not None:
+                mail, _, last_checked = entry
+                if self._is_stale(mail, last_checked):
+                    self._count("stale")
+                    self._close(mail, graceful=False)
+                    self._forget(server)
+                    continue
+                if timeout is not None and getattr(mail, "sock", None) is not None:
+                    mail.sock.settimeout(timeout)
+                self._count("reused")
+                return mail
+
+            try:
+                mail = imaplib.IMAP4_SSL(imap_server, imap_port, timeout=timeout)
+            except Exception:
+                self._forget(server)
+                raise
+            try:
+                mail.login(username, password)
+            except Exception:
+                self._close(mail, graceful=False)
+                self._forget(server)
+                raise
+            self._count("created")
+            return mail
+
+    def _count(self, metric):
+        with self._cond:
+            self._metrics[metric] += 1
+
+    def _pop_idle_for_server(self, server):
+        """Removes the least recently used idle session on `server`. Caller holds the lock."""
+        oldest_key, oldest_used = None, None
+        for key, entries in self._idle.items():
+            if (
+                key[:2] == server
+                and entries
+                and (oldest_used is None or entries[0][1] < oldest_used)
+            ):
+                oldest_key, oldest_used = key, entries[0][1]
+        if oldest_key is None:
+            return None
+        return self._idle[oldest_key].pop(0)[0]
+
+    def _is_stale(self, mail, last_checked) -> bool:
+        """
+        A session is checked with NOOP when it sat idle past the keepalive
+        interval or when its socket is readable (the server sent BYE or closed).
+        """
+        if time.monotonic() - last_checked < self.keepalive_interval:
+            if not self._socket_readable(mail):
+                return False
+        return not self._noop(mail)
+
+    @staticmethod
+    def _socket_readable(mail) -> bool:
+        try:
+            sock = mail.socket()
+            ready, _, _ = select.select([sock], [], [], 0)
+            return bool(ready)
+        except Exception:
+            return False
+
+    def _noop(self, mail) -> bool:
+        self._count("keepalive_noops")
+        try:
+            typ, _ = mail.noop()
+            return typ == "OK"
+        except Exception:
+            return False
+
+    def _release(self, key, mail):
+        if getattr(mail, "state", None) == "LOGOUT":
+            self._discard(key, mail)
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(key, []).append((mail, now, now))
+            self._cond.notify()
+
+    def _discard(self, key, mail):
+        self._count("discarded")
+        self._close(mail, graceful=False)
+        self._forget(key[:2])
+
+    def _forget(self, server):
+        with self._cond:
+            self._open[server] = max(self._open.get(server, 0) - 1, 0)
+            self._cond.notify()
+
+    @staticmethod
+    def _close(mail, graceful):
+        try:
+            if graceful:
+                mail.logout()
+            else:
+                mail.shutdown()
+        except Exception:
+            pass
+
+    def keepalive(self):
+        """
+        NOOPs idle sessions so servers do not drop them, and logs out sessions
+        unused for longer than max_idle.
+        """
+        with self._cond:
+            entries = [
+                (key, entry) for key, idle in self._idle.items() for entry in idle
+            ]
+            self._idle = {}
+
+        now = time.monotonic()
+        for key, (mail, last_used, last_checked) in entries:
+            if now - last_used > self.max_idle:
+                self._count("evicted")
+                self._close(mail, graceful=True)
+                self._forget(key[:2])
+            elif self._noop(mail):
+                with self._cond:
+                    self._idle.setdefault(key, []).append(
+                        (mail, last_used, time.monotonic())
+                    )
+                    self._cond.notify()
+            else:
+                self._count("stale")
+                self._close(mail, graceful=False)
+                self._forget(key[:2])
+
+    def close_all(self):
+        """Logs out every idle session (used on shutdown)."""
+        with self._cond:
+            entries = [
+                (key, entry) for key, idle in self._idle.items() for entry in idle
+            ]
+            self._idle = {}
+        for key, (mail, _, _) in entries:
+            self._close(mail, graceful=True)
+            self._forget(key[:2])
+
+    def stats(self) -> dict:
+        """Pool counters plus open/idle/in-use sessions per server (no account names)."""
+        with self._cond:
+            servers = {}
+            for (host, port), open_count in self._open.items():
+                idle_count = sum(
+                    len(entries)
+                    for key, entries in self._idle.items()
+                    if key[:2] == (host, port)
+                )
+                servers[f"{host}:{port}"] = {
+                    "open": open_count,
+                    "idle": idle_count,
+                    "in_use": open_count - idle_count,
+                }
+            return {
+                **self._metrics,
+                "max_per_server": self.max_per_server,
+                "servers": servers,
+            }
+
+
+imap_pool = ImapConnectionPool()
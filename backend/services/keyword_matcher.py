@@ -0,0 +1,100 @@
+import logging
+import os
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Set
+
+try:  # C extension from requirements.txt; substring matching without it
+    import ahocorasick  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    ahocorasick = None
+
+
+class KeywordHits:
+    """
+    Keyword hits for one text, grouped by category. Substring semantics are
+    the same as `keyword in text`: matching is case-sensitive and a keyword
+    may match inside a longer word.
+    """
+
+    def __init__(self, matcher: "KeywordMatcher", text: str, found=None):
+        self._matcher = matcher
+        self._text = text
+        # category -> keywords found; filled eagerly by the automaton backend,
+        # lazily (one category at a time) by the substring fallback
+        self._found: Dict[str, Set[str]] = found if found is not None else {}
+        self._complete = found is not None
+
+    def has(self, category: str) -> bool:
+        """True if any keyword of `category` occurs in the text."""
+        if self._complete:
+            return category in self._found
+        if category not in self._found:
+            keywords = self._matcher.categories.get(category, ())
+            # any() stops at the first hit, which is all most checks need
+            hit = next((k for k in keywords if k in self._text), None)
+            self._found[category] = {hit} if hit is not None else set()
+        return bool(self._found[category])
+
+    def keywords(self, category: str) -> Set[str]:
+        """Every keyword of `category` that occurs in the text."""
+        if self._complete:
+            return set(self._found.get(category, ()))
+        keywords = self._matcher.categories.get(category, ())
+        found = {k for k in keywords if k in self._text}
+        self._found[category] = found
+        return set(found)
+
+
+class KeywordMatcher:
+    """
+    One automaton over several named keyword lists. With `pyahocorasick`
+    (in requirements.txt) a text is scanned once (Aho-Corasick) and every
+    category's hits come back together; where it cannot be installed each
+    category falls back to C-level substring checks evaluated on demand.
+
+    A pure-Python Aho-Corasick loop was measured slower than the substring
+    fallback in CPython, so it is not offered as a backend.
+
+    Set DETECTOR_KEYWORD_BACKEND=substring to force the fallback.
+    """
+
+    def __init__(
+        self,
+        categories: Mapping[str, Iterable[str]],
+        backend: Optional[str] = None,
+    ):
+        self.categories: Dict[str, tuple] = {
+            name: tuple(dict.fromkeys(k for k in keywords if k))
+            for name, keywords in categories.items()
+        }
+        backend = backend or os.environ.get("DETECTOR_KEYWORD_BACKEND")
+        if backend is None:
+            backend = "ahocorasick" if ahocorasick is not None else "substring"
+        if backend == "ahocorasick" and ahocorasick is None:
+            logging.warning("pyahocorasick is not installed; using substring matching")
+            backend = "substring"
+        self.backend = backend
+
+        self._automaton = None
+        if backend == "ahocorasick":
+            owners: Dict[str, Set[str]] = {}
+            for name, keywords in self.categories.items():
+                for keyword in keywords:
+                    owners.setdefault(keyword, set()).add(name)
+            automaton = ahocorasick.Automaton()
+            for keyword, names in owners.items():
+                automaton.add_word(keyword, (keyword, frozenset(names)))
+            if owners:
+                automaton.make_automaton()
+                self._automaton = automaton
+
+    def scan(self, text: str) -> KeywordHits:
+        """Finds keyword hits for every category in `text`."""
+        if self.backend != "ahocorasick":
+            return KeywordHits(self, text)
+        found: Dict[str, Set[str]] = {}
+        if self._automaton is not None and text:
+            names: FrozenSet[str]
+            for _, (keyword, names) in self._automaton.iter(text):
+                for name in names:
+                    found.setdefault(name, set()).add(keyword)
+        return KeywordHits(self, text, found)
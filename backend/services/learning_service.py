@@ -1,10 +1,12 @@
-import fnmatch
 import os
 import re
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
 from backend.models import ManualRule, ProcessedEmail
-from sqlmodel import Session, select
+from backend.services.rules_snapshot import RulesSnapshot, bump_rules_version
+from sqlalchemy import case, literal, update
+from sqlmodel import Session, col, select
 
 
 class LearningService:
@@ -63,38 +65,43 @@ class LearningService:
         return suggested_rule
 
     @staticmethod
-    def run_shadow_mode(session: Session, email_data: Dict[str, Any]):
+    def count_shadow_matches(
+        emails: List[Dict[str, Any]], rules: RulesSnapshot
+    ) -> Counter:
         """
-        Tests 'shadow mode' rules against an email.
-        If a rule matches, increment its match_count and confidence.
+        Tests 'shadow mode' rules against a batch of emails with the compiled
+        rules snapshot, without touching the database.
+        Returns {rule id: matches}, to be saved with apply_shadow_matches.
         """
-        subject = email_data.get("subject", "").lower()
-        sender = email_data.get("from", "").lower()
-
-        shadow_rules = session.exec(
-            select(ManualRule).where(ManualRule.is_shadow_mode)
-        ).all()
-
-        for rule in shadow_rules:
-            matches = True
-            if rule.email_pattern and not fnmatch.fnmatch(
-                sender, rule.email_pattern.lower()
-            ):
-                matches = False
-            if (
-                matches
-                and rule.subject_pattern
-                and not fnmatch.fnmatch(subject, rule.subject_pattern.lower())
-            ):
-                matches = False
-
-            if matches:
-                rule.match_count += 1
-                # Slowly increase confidence with each successful match
-                rule.confidence = min(1.0, rule.confidence + 0.05)
-                session.add(rule)
+        counts: Counter = Counter()
+        for email_data in emails:
+            counts.update(
+                rules.match_shadow_rules(
+                    (email_data.get("subject") or "").lower(),
+                    (email_data.get("from") or "").lower(),
+                )
+            )
+        return counts
 
-        session.commit()
+    @staticmethod
+    def apply_shadow_matches(session: Session, counts: Dict[int, int]):
+        """
+        Saves accumulated shadow matches with one UPDATE per rule: match_count
+        grows by the matches and confidence by 0.05 for each, up to 1.0.
+        The caller commits.
+        """
+        for rule_id, matches in counts.items():
+            # Slowly increase confidence with each successful match
+            confidence = col(ManualRule.confidence) + 0.05 * matches
+            session.execute(
+                update(ManualRule)
+                .where(col(ManualRule.id) == rule_id)
+                .where(col(ManualRule.is_shadow_mode))
+                .values(
+                    match_count=ManualRule.match_count + matches,
+                    confidence=case((confidence > 1.0, literal(1.0)), else_=confidence),
+                )
+            )
 
     @staticmethod
     def auto_promote_rules(session: Session):
@@ -120,6 +127,8 @@ class LearningService:
             print(
                 f"🚀 Auto-promoted rule: {rule.email_pattern} | {rule.subject_pattern}"
             )
+        if candidates:
+            bump_rules_version(session)
 
         session.commit()
 
@@ -192,10 +201,9 @@ class LearningService:
 
                 print(f"   > Account {account_label}: Fetched {len(fetched)} emails.")
 
+                new_emails = []
                 for email_data in fetched:
                     msg_id = email_data.get("message_id")
-                    subject = email_data.get("subject", "")
-                    body = email_data.get("body", "")
                     sender = email_data.get("from", "")
 
                     # Check if already processed
@@ -208,15 +216,23 @@ class LearningService:
 
                     # Not in DB? Check if it looks like a receipt
                     # Construct minimal email dict for detector
-                    email_obj = {
-                        "subject": subject,
-                        "body": body,
-                        "sender": sender,
-                        "from": sender,
-                    }
-                    is_receipt = ReceiptDetector.is_receipt(email_obj)
-
-                    if is_receipt:
+                    new_emails.append(
+                        {
+                            "subject": email_data.get("subject", ""),
+                            "body": email_data.get("body", ""),
+                            "sender": sender,
+                            "from": sender,
+                        }
+                    )
+
+                results = ReceiptDetector.classify_batch(new_emails)
+
+                for email_obj, result in zip(new_emails, results):
+                    subject = email_obj["subject"]
+                    body = email_obj["body"]
+                    sender = email_obj["sender"]
+
+                    if result.is_receipt:
                         # FOUND ONE!
                         # Check if we already have a candidate for this pattern
                         # Deduplication strategy: Group by Sender + Subject (simplified)
@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional, Sequence
+
+# Items buffered between two stages before the upstream one blocks
+DEFAULT_QUEUE_SIZE = 50
+
+_CLOSE = object()
+
+
+class StageStats:
+    """
+    Throughput and queue metrics for one pipeline stage, stored per stage on
+    ProcessingRun.pipeline_stats. `wait_ms` is the time producers spent
+    blocked on this stage's full queue (backpressure); for the fetch stage it
+    is the time the pipeline spent waiting on IMAP.
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+        self.items = 0
+        self.busy_ns = 0
+        self.wait_ns = 0
+        self.max_queue = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def queued(self, depth: int, waited_ns: int = 0) -> None:
+        """Records the queue depth seen by a producer and how long it blocked."""
+        with self._lock:
+            self.max_queue = max(self.max_queue, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+            self.wait_ns += waited_ns
+
+    def handled(self, count: int, busy_ns: int) -> None:
+        """Records `count` items finished after `busy_ns` of work."""
+        now = time.monotonic()
+        with self._lock:
+            self.items += count
+            self.busy_ns += busy_ns
+            if self._first is None:
+                self._first = now - busy_ns / 1e9
+            self._last = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        active = 0.0
+        if self._first is not None and self._last is not None:
+            active = self._last - self._first
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_ms": round(self.busy_ns / 1e6, 3),
+            "wait_ms": round(self.wait_ns / 1e6, 3),
+            "per_sec": round(self.items / active, 1) if active > 0 else None,
+            "max_queue": self.max_queue,
+            "avg_queue": (
+                round(self._depth_total / self._depth_samples, 2)
+                if self._depth_samples
+                else 0.0
+            ),
+        }
+
+
+class Stage:
+    """
+    A pipeline step: `workers` threads take items from a bounded queue and
+    pass them to `handler` one at a time. A full queue blocks put(), so a
+    slow stage holds back the ones feeding it instead of buffering without
+    limit. Stages fed whole batches give `item_size` (e.g. len) so their
+    stats count emails rather than batches.
+
+    An exception from the handler is passed to `on_error` with the item,
+    and the stage carries on with the next one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], None],
+        workers: int = 1,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+        item_size: Optional[Callable[[Any], int]] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.item_size = item_size
+        self.stats = StageStats(max(1, workers))
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i + 1}", daemon=True)
+            for i in range(self.stats.workers)
+        ]
+
+    def start(self) -> "Stage":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, item: Any) -> None:
+        """Queues an item, blocking while the queue is full."""
+        depth = self._queue.qsize()
+        started = time.perf_counter_ns()
+        self._queue.put(item)
+        self.stats.queued(depth, time.perf_counter_ns() - started)
+
+    def close(self) -> None:
+        """Lets the workers finish what is queued, then waits for them."""
+        for _ in self._threads:
+            self._queue.put(_CLOSE)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE:
+                return
+            started = time.perf_counter_ns()
+            try:
+                self.handler(item)
+            except Exception as e:
+                if self.on_error:
+                    try:
+                        self.on_error(item, e)
+                    except Exception:
+                        traceback.print_exc()
+            self.stats.handled(
+                self.item_size(item) if self.item_size else 1,
+                time.perf_counter_ns() - started,
+            )
+
+
+class Pipeline:
+    """
+    Stages started together and closed in order, so each one has drained
+    everything its upstream stage produced before it is told to stop.
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.stages = list(stages)
+
+    def __enter__(self) -> "Pipeline":
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        for stage in self.stages:
+            stage.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.stats.to_dict() for stage in self.stages}
@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend.models import ProcessedEmail
+from sqlmodel import Session
+
+# Rows inserted per transaction. A crash loses at most this many uncommitted
+# rows, whose emails are then fetched and handled again on the next run.
+DEFAULT_CHUNK_SIZE = 50
+
+
+class ProcessedEmailWriter:
+    """
+    Unit of work for a processing run: ProcessedEmail rows are buffered in
+    memory and written in chunks, one bulk insert and one commit per chunk,
+    instead of a commit per email.
+
+    Nothing is written between flushes, so the run holds no write lock while
+    it classifies and forwards. Rows added inside email() are dropped
+    together if it raises. When a chunk's bulk insert fails, its rows are
+    inserted again one savepoint each and only the rows that still fail are
+    dropped and passed to `on_error` with the source they were added with.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+    ):
+        self.session = session
+        self.chunk_size = max(1, chunk_size)
+        self.on_error = on_error
+        self._buffer: List[Tuple[ProcessedEmail, Any]] = []
+        self._depth = 0
+        self._metrics = {"saved": 0, "failed": 0, "commits": 0, "db_ns": 0}
+
+    @contextmanager
+    def email(self) -> Iterator[None]:
+        """Groups one email's rows: if the block raises, they are discarded."""
+        rows = len(self._buffer)
+        self._depth += 1
+        try:
+            yield
+        except Exception:
+            del self._buffer[rows:]
+            raise
+        finally:
+            self._depth -= 1
+        if not self._depth and len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def add(self, record: ProcessedEmail, source: Any = None) -> None:
+        """Buffers a row; `source` is what on_error receives if it fails."""
+        self._buffer.append((record, source))
+        if not self._depth and len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered rows in one transaction."""
+        records, self._buffer = self._buffer, []
+        if not records:
+            return
+        failed: List[Tuple[Any, Exception]] = []
+        started = time.perf_counter_ns()
+        try:
+            try:
+                self.session.add_all([record for record, _ in records])
+                self.session.flush()
+            except Exception:
+                # Keep the good rows: find the bad ones one savepoint at a time
+                self.session.rollback()
+                for record, source in records:
+                    try:
+                        with self.session.begin_nested():
+                            self.session.add(record)
+                    except Exception as e:
+                        failed.append((source, e))
+            self.session.commit()
+            self._metrics["commits"] += 1
+        except Exception as e:
+            self.session.rollback()
+            failed = [(source, e) for _, source in records]
+        finally:
+            self._metrics["db_ns"] += time.perf_counter_ns() - started
+
+        self._metrics["saved"] += len(records) - len(failed)
+        self._metrics["failed"] += len(failed)
+        for source, err in failed:
+            if self.on_error:
+                self.on_error(source, err)
+
+    def stats(self) -> Dict[str, Any]:
+        """Rows saved and failed, commits, and time spent writing them."""
+        return {
+            "saved": self._metrics["saved"],
+            "failed": self._metrics["failed"],
+            "commits": self._metrics["commits"],
+            "db_ms": round(self._metrics["db_ns"] / 1e6, 3),
+        }
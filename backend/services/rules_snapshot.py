@@ -0,0 +1,244 @@
+import fnmatch
+import hashlib
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, String, cast, update
+from sqlmodel import col, select
+
+from ..models import GlobalSettings, ManualRule, Preference
+from .keyword_matcher import KeywordMatcher
+
+# GlobalSettings key holding a counter bumped on every rule/preference change
+RULES_VERSION_KEY = "rules_version"
+
+ALWAYS_FORWARD = "Always Forward"
+BLOCKED_TYPES = ("Blocked Sender", "Blocked Category")
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def get_rules_version(session: Any) -> int:
+    """Current rules version; 0 until the first change is recorded."""
+    setting = session.exec(
+        select(GlobalSettings).where(GlobalSettings.key == RULES_VERSION_KEY)
+    ).first()
+    try:
+        return int(setting.value) if setting else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def bump_rules_version(session: Any) -> None:
+    """
+    Records that ManualRule or Preference rows changed, so cached snapshots
+    are rebuilt. Call before the caller's commit; the increment is a single
+    UPDATE so concurrent writers never lose a bump.
+    """
+    result = session.exec(
+        update(GlobalSettings)
+        .where(col(GlobalSettings.key) == RULES_VERSION_KEY)
+        .values(value=cast(cast(GlobalSettings.value, Integer) + 1, String))
+    )
+    if not result.rowcount:
+        session.add(
+            GlobalSettings(
+                key=RULES_VERSION_KEY,
+                value="1",
+                description="Bumped whenever manual rules or preferences change",
+            )
+        )
+
+
+def _glob(pattern: Optional[str]):
+    """Compiled matcher equivalent to fnmatch.fnmatch(text, pattern.lower())."""
+    if not pattern:
+        return None
+    return re.compile(fnmatch.translate(pattern.lower())).match
+
+
+class _CompiledRule:
+    __slots__ = ("order", "rule", "email_match", "subject_match")
+
+    def __init__(self, order: int, rule: ManualRule):
+        self.order = order
+        self.rule = rule
+        self.email_match = _glob(rule.email_pattern)
+        self.subject_match = _glob(rule.subject_pattern)
+
+    def matches(self, subject: str, sender: str) -> bool:
+        if self.email_match and not self.email_match(sender):
+            return False
+        if self.subject_match and not self.subject_match(subject):
+            return False
+        return True
+
+
+class RulesSnapshot:
+    """
+    Manual rules and preferences loaded once and compiled for matching.
+
+    Rules keep their priority order. Email patterns without wildcards are
+    indexed by exact sender and "*@domain" patterns by domain, so only the
+    remaining wildcard rules are scanned linearly. Preference items share one
+    KeywordMatcher, matched with the same `item in text` semantics as before.
+    """
+
+    def __init__(
+        self,
+        rules: List[ManualRule],
+        always_forward: List[Preference],
+        blocked: List[Preference],
+        version: Optional[int] = None,
+    ):
+        self.version = version
+        self._by_sender: Dict[str, List[_CompiledRule]] = {}
+        self._by_domain: Dict[str, List[_CompiledRule]] = {}
+        self._scanned: List[_CompiledRule] = []
+        # Shadow-mode rules, evaluated separately for LearningService
+        self._shadow: List[_CompiledRule] = []
+        for order, rule in enumerate(rules):
+            compiled = _CompiledRule(order, rule)
+            if rule.is_shadow_mode:
+                self._shadow.append(compiled)
+            pattern = (rule.email_pattern or "").lower()
+            domain = pattern[2:]
+            if pattern and not _GLOB_CHARS.search(pattern):
+                self._by_sender.setdefault(pattern, []).append(compiled)
+            elif (
+                pattern.startswith("*@")
+                and domain
+                and "@" not in domain
+                and not _GLOB_CHARS.search(domain)
+            ):
+                self._by_domain.setdefault(domain, []).append(compiled)
+            else:
+                self._scanned.append(compiled)
+        self.rule_count = len(rules)
+
+        # What the rules decide, independent of the version counter: a change
+        # that leaves every rule and preference as it was (or only touches
+        # bookkeeping such as match_count) keeps the same fingerprint
+        decisive = (
+            [
+                (r.id, r.email_pattern, r.subject_pattern, r.purpose, r.confidence)
+                for r in rules
+            ],
+            [(p.id, p.item) for p in always_forward],
+            [(p.id, p.item) for p in blocked],
+        )
+        self.fingerprint = hashlib.sha256(repr(decisive).encode()).hexdigest()[:16]
+
+        # (lowercased item, original preference) in query order
+        self._preferences: Dict[str, List[Tuple[str, Preference]]] = {
+            ALWAYS_FORWARD: [(p.item.lower(), p) for p in always_forward],
+            "blocked": [(p.item.lower(), p) for p in blocked],
+        }
+        self._matcher = KeywordMatcher(
+            {
+                name: [item for item, _ in items]
+                for name, items in self._preferences.items()
+            }
+        )
+
+    @classmethod
+    def load(cls, session: Any, version: Optional[int] = None) -> "RulesSnapshot":
+        """Reads every rule and preference (two queries) and compiles them."""
+        rules = session.exec(
+            select(ManualRule).order_by(
+                ManualRule.priority.desc(), ManualRule.id  # type: ignore
+            )
+        ).all()
+        preferences = session.exec(
+            select(Preference).where(
+                col(Preference.type).in_([ALWAYS_FORWARD, *BLOCKED_TYPES])
+            )
+        ).all()
+        # Detached copies: the snapshot outlives the session that loaded it
+        rules = [ManualRule.model_validate(rule) for rule in rules]
+        preferences = [Preference.model_validate(pref) for pref in preferences]
+        return cls(
+            rules,
+            [p for p in preferences if p.type == ALWAYS_FORWARD],
+            [p for p in preferences if p.type in BLOCKED_TYPES],
+            version=version,
+        )
+
+    def match_rule(self, subject: str, sender: str) -> Optional[ManualRule]:
+        """Highest-priority rule matching the lowercased subject and sender."""
+        best: Optional[_CompiledRule] = None
+        candidates = list(self._by_sender.get(sender, ()))
+        if "@" in sender:
+            candidates += self._by_domain.get(sender.rsplit("@", 1)[1], ())
+        for compiled in candidates:
+            if (best is None or compiled.order < best.order) and compiled.matches(
+                subject, sender
+            ):
+                best = compiled
+        for compiled in self._scanned:
+            if best is not None and compiled.order > best.order:
+                break
+            if compiled.matches(subject, sender):
+                best = compiled
+                break
+        return best.rule if best else None
+
+    def match_shadow_rules(self, subject: str, sender: str) -> List[int]:
+        """Ids of every shadow-mode rule matching the lowercased subject and sender."""
+        ids = []
+        for compiled in self._shadow:
+            if compiled.matches(subject, sender):
+                # Snapshot rules are loaded from the database, so always have one
+                assert compiled.rule.id is not None
+                ids.append(compiled.rule.id)
+        return ids
+
+    def _match_preference(
+        self, category: str, subject: str, sender: str
+    ) -> Optional[Preference]:
+        items = self._preferences[category]
+        if not items:
+            return None
+        hits = (self._matcher.scan(sender), self._matcher.scan(subject))
+        found = set()
+        if any(hit.has(category) for hit in hits):
+            found = hits[0].keywords(category) | hits[1].keywords(category)
+        for item, pref in items:
+            # An empty item matches everything, as `"" in text` does
+            if not item or item in found:
+                return pref
+        return None
+
+    def always_forward(self, subject: str, sender: str) -> Optional[Preference]:
+        """First "Always Forward" preference found in the sender or subject."""
+        return self._match_preference(ALWAYS_FORWARD, subject, sender)
+
+    def blocked(self, subject: str, sender: str) -> Optional[Preference]:
+        """First blocked sender/category preference found in the sender or subject."""
+        return self._match_preference("blocked", subject, sender)
+
+
+# One snapshot per database engine, replaced when the rules version changes
+_snapshots: "weakref.WeakKeyDictionary[Any, RulesSnapshot]" = (
+    weakref.WeakKeyDictionary()
+)
+_snapshots_lock = threading.Lock()
+
+
+def get_rules_snapshot(session: Any) -> RulesSnapshot:
+    """
+    Cached snapshot for the session's database. Costs one version query while
+    nothing has changed; rules are reloaded only after bump_rules_version.
+    """
+    version = get_rules_version(session)
+    bind = session.get_bind()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(bind)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    snapshot = RulesSnapshot.load(session, version=version)
+    with _snapshots_lock:
+        _snapshots[bind] = snapshot
+    return snapshot
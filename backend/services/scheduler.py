@@ -1,21 +1,55 @@
+import itertools
 import os
+import queue
+import threading
+import time
 import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 from apscheduler.schedulers.background import \
     BackgroundScheduler  # type: ignore
 from backend.database import engine
-from backend.models import ProcessedEmail, ProcessingRun
+from backend.models import MailboxSyncState, ProcessedEmail, ProcessingRun
 from backend.security import encrypt_content, get_email_content_hash
 from backend.services.command_service import CommandService
-from backend.services.detector import ReceiptDetector
+from backend.services.detector import (
+    DetectionStats,
+    ReceiptDetector,
+    shutdown_batch_pool,
+)
 from backend.services.email_service import EmailService
 from backend.services.forwarder import EmailForwarder
+from backend.services.idle_watcher import (
+    idle_enabled,
+    start_idle_watchers,
+    stop_idle_watchers,
+)
+from backend.services.imap_pool import imap_pool
 from backend.services.learning_service import LearningService
-from sqlmodel import Session, select
+from backend.services.pipeline import DEFAULT_QUEUE_SIZE, Pipeline, Stage, StageStats
+from backend.services.processed_writer import DEFAULT_CHUNK_SIZE, ProcessedEmailWriter
+from backend.services.rules_snapshot import RulesSnapshot, get_rules_snapshot
+from backend.services.search_profile import profile_for_account
+from sqlmodel import Session, col, select
 
 scheduler = BackgroundScheduler()
 
+# Interval polls, manual triggers and IDLE pushes must never overlap
+_run_lock = threading.Lock()
+
+# Account fetch concurrency and per-account time budget (seconds)
+DEFAULT_MAX_CONCURRENT_ACCOUNTS = 4
+DEFAULT_ACCOUNT_FETCH_TIMEOUT = 120
+# Parsed emails buffered between IMAP workers and the processing loop
+DEFAULT_STREAM_QUEUE_SIZE = 20
+# Message-IDs or content hashes per IN (...) lookup; stays well under the
+# bound-parameter limits of SQLite (999) and Postgres
+DEFAULT_DEDUPE_CHUNK_SIZE = 500
+# Concurrent SMTP sends per run
+DEFAULT_FORWARD_WORKERS = 2
+
 
 def redact_email(email):
     """
@@ -31,7 +65,296 @@ def redact_email(email):
     return f"{redacted}@{domain}"
 
 
-def process_emails():
+def get_sync_state(account_email, folder="inbox"):
+    """
+    Loads the incremental sync cursor for a mailbox as a plain dict.
+    Returns None when the mailbox has never been synced (or the lookup fails).
+    """
+    try:
+        with Session(engine) as session:
+            state = session.exec(
+                select(MailboxSyncState)
+                .where(MailboxSyncState.account_email == account_email)
+                .where(MailboxSyncState.folder == folder)
+            ).first()
+            if state:
+                return {"uidvalidity": state.uidvalidity, "last_uid": state.last_uid}
+    except Exception as e:
+        print(f"⚠️ Could not load sync state: {type(e).__name__}")
+    return None
+
+
+def filter_processed_message_ids(message_ids):
+    """
+    Returns the subset of Message-IDs that already have a ProcessedEmail row,
+    resolved with a single IN query so bodies are only downloaded for new mail.
+    """
+    if not message_ids:
+        return set()
+    with Session(engine) as session:
+        return _existing_values(session, ProcessedEmail.email_id, message_ids)
+
+
+def _existing_values(session, column, values):
+    """The given values already stored in `column`, looked up in chunked IN queries."""
+    chunk_size = _get_int_setting("DEDUPE_CHUNK_SIZE", DEFAULT_DEDUPE_CHUNK_SIZE)
+    values = list(dict.fromkeys(v for v in values if v))
+    found = set()
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start : start + chunk_size]
+        found.update(session.exec(select(column).where(col(column).in_(chunk))).all())
+    return found
+
+
+def find_processed_keys(session, keys):
+    """
+    Of the (message_id, content_hash) pairs of a batch, the Message-IDs and
+    content hashes that already have a ProcessedEmail row. Replaces two
+    SELECTs per email with a few IN queries per batch; hashes are only
+    looked up for emails whose Message-ID is not already known.
+    """
+    known = _existing_values(session, ProcessedEmail.email_id, [m for m, _ in keys])
+    hashes = [h for m, h in keys if not (m and m in known)]
+    return known | _existing_values(session, ProcessedEmail.content_hash, hashes)
+
+
+def compute_sync_cursors(emails, failed_uids):
+    """
+    Works out how far each mailbox cursor may advance after a run.
+    A cursor never moves past a UID that failed to download or process, so it is
+    retried next poll.
+    Returns {(account_email, folder): (uidvalidity, last_uid)}.
+    """
+    grouped = {}
+    for email_data in emails:
+        uid = email_data.get("uid")
+        uidvalidity = email_data.get("uidvalidity")
+        if uid is None or uidvalidity is None:
+            continue
+        key = (email_data.get("account_email"), email_data.get("folder", "inbox"))
+        grouped.setdefault(key, (uidvalidity, []))[1].append(uid)
+
+    cursors = {}
+    for key, (uidvalidity, uids) in grouped.items():
+        failed = failed_uids.get(key)
+        if failed:
+            uids = [uid for uid in uids if uid < min(failed)]
+        if uids:
+            cursors[key] = (uidvalidity, max(uids))
+    return cursors
+
+
+def save_sync_state(session, account_email, folder, uidvalidity, last_uid):
+    """Creates or advances the sync cursor for a mailbox (caller commits)."""
+    state = session.exec(
+        select(MailboxSyncState)
+        .where(MailboxSyncState.account_email == account_email)
+        .where(MailboxSyncState.folder == folder)
+    ).first()
+    if not state:
+        state = MailboxSyncState(account_email=account_email, folder=folder)
+    elif state.uidvalidity == uidvalidity and state.last_uid >= last_uid:
+        return
+    state.uidvalidity = uidvalidity
+    state.last_uid = last_uid
+    state.updated_at = datetime.now(timezone.utc)
+    session.add(state)
+
+
+def _get_int_setting(name, default):
+    """Reads a positive integer setting, falling back to the default on bad input."""
+    try:
+        value = int(os.environ.get(name, default))
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _load_rules_snapshot(session):
+    """Cached rules snapshot, or None so detection falls back to per-email queries."""
+    try:
+        return get_rules_snapshot(session)
+    except Exception as e:
+        print(f"⚠️ Error loading rules snapshot: {type(e).__name__}")
+        return None
+
+
+def _put_until_cancelled(stream_queue, item, cancelled):
+    """Blocks on a full queue but gives up once the consumer has gone away."""
+    while not cancelled.is_set():
+        try:
+            stream_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_all_accounts(accounts, account_timings, errors, stats=None):
+    """
+    Fetches every account concurrently on a bounded thread pool and yields
+    parsed emails as soon as any worker has one, so a poll never holds more
+    than STREAM_QUEUE_SIZE decoded messages per consumer at a time.
+
+    Each account gets its own failure isolation and time budget
+    (ACCOUNT_FETCH_TIMEOUT seconds, also used as the IMAP socket timeout),
+    counted from when that account starts, so a hung account never uses up
+    the time of the ones queued behind it. The budget is charged while the
+    consumer is waiting on the workers, so a slow consumer does not time
+    accounts out. Pool size comes from
+    MAX_CONCURRENT_ACCOUNTS.
+
+    `account_timings` and `errors` are filled in account order once the stream
+    is exhausted. A StageStats passed as `stats` records the emails yielded,
+    the time spent waiting on the workers and the depth of the queue.
+    """
+    max_workers = _get_int_setting(
+        "MAX_CONCURRENT_ACCOUNTS", DEFAULT_MAX_CONCURRENT_ACCOUNTS
+    )
+    account_timeout = _get_int_setting(
+        "ACCOUNT_FETCH_TIMEOUT", DEFAULT_ACCOUNT_FETCH_TIMEOUT
+    )
+    queue_size = _get_int_setting("STREAM_QUEUE_SIZE", DEFAULT_STREAM_QUEUE_SIZE)
+
+    jobs = []
+    for i, acc in enumerate(accounts):
+        user = acc.get("email")
+        pwd = acc.get("password")
+        if user and pwd:
+            # Sync state is loaded up front so worker threads only talk IMAP
+            jobs.append((i, acc, get_sync_state(user)))
+
+    if not jobs:
+        return
+
+    stream_queue = queue.Queue(maxsize=queue_size)
+    # Set when an account runs out of time or the consumer goes away
+    cancelled = {i: threading.Event() for i, _, _ in jobs}
+
+    def fetch_account(i, acc, sync_state):
+        user = acc.get("email")
+        print(f"   Scanning account #{i+1}...")
+        started = time.monotonic()
+        count = 0
+        error = None
+        try:
+            for email_data in EmailService.iter_recent_emails(
+                user,
+                acc.get("password"),
+                acc.get("imap_server", "imap.gmail.com"),
+                sync_state=sync_state,
+                processed_filter=filter_processed_message_ids,
+                timeout=account_timeout,
+                search_profile=profile_for_account(acc),
+            ):
+                # Tag each email with the source account
+                email_data["account_email"] = user
+                if not _put_until_cancelled(
+                    stream_queue, ("email", i, email_data), cancelled[i]
+                ):
+                    return
+                count += 1
+        except Exception as e:
+            error = e
+        _put_until_cancelled(
+            stream_queue,
+            ("done", i, (count, error, time.monotonic() - started)),
+            cancelled[i],
+        )
+
+    workers = min(max_workers, len(jobs))
+    if stats is not None:
+        stats.workers = workers
+    # A thread per account, but only `workers` fetching at once; an account
+    # that ran out of time frees its slot while its socket timeout unwinds it
+    executor = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="imap")
+    pending = list(jobs)
+    # Account -> consumer wait time charged to it since it started
+    running = {}
+    started_at = {}
+    timed_out = {}
+    results = {}
+    counts = {i: 0 for i, _, _ in jobs}
+
+    def start_accounts():
+        while pending and len(running) < workers:
+            job = pending.pop(0)
+            running[job[0]] = 0.0
+            started_at[job[0]] = time.monotonic()
+            executor.submit(fetch_account, *job)
+
+    try:
+        start_accounts()
+        while running:
+            wait_started = time.monotonic()
+            depth = stream_queue.qsize()
+            remaining = account_timeout - max(running.values())
+            try:
+                kind, i, payload = stream_queue.get(timeout=max(remaining, 0.001))
+            except queue.Empty:
+                kind = None
+            finally:
+                wait = time.monotonic() - wait_started
+                for j in running:
+                    running[j] += wait
+                if stats is not None:
+                    stats.queued(depth, int(wait * 1e9))
+            if kind == "done":
+                if i in running:
+                    del running[i]
+                    results[i] = payload
+            elif kind == "email":
+                counts[i] += 1
+                if stats is not None:
+                    stats.handled(1, 0)
+                yield payload
+            for j, charged in list(running.items()):
+                if charged >= account_timeout:
+                    del running[j]
+                    cancelled[j].set()
+                    timed_out[j] = time.monotonic() - started_at[j]
+            start_accounts()
+    finally:
+        for event in cancelled.values():
+            event.set()
+        # Never block the poll on a hung account; its socket timeout will unwind it
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for i, acc, _ in jobs:
+        timing = {"account": redact_email(acc.get("email")), "emails": counts[i]}
+        if i not in results:
+            print(f"⏱️ Account #{i+1} exceeded {account_timeout}s budget. Skipping.")
+            timing["status"] = "timeout"
+            timing["seconds"] = round(timed_out[i], 3) if i in timed_out else None
+            errors.append(f"Error scanning account #{i+1}: Timed out")
+        elif results[i][1] is not None:
+            e = results[i][1]
+            # CodeQL: Avoid logging full exception as it may contain credentials
+            print(
+                f"❌ Error fetching account #{i+1} "
+                f"({redact_email(acc.get('email'))}): {type(e).__name__}"
+            )
+            timing["status"] = "error"
+            timing["seconds"] = None
+            errors.append(
+                f"Error scanning account #{i+1}: Connection failed ({type(e).__name__})"
+            )
+        else:
+            timing["status"] = "ok"
+            timing["seconds"] = round(results[i][2], 3)
+        account_timings.append(timing)
+
+
+def process_emails(accounts=None):
+    """
+    Runs one processing pass. `accounts` limits the fetch to a subset of the
+    configured accounts (used by IDLE push); None scans all of them.
+    """
+    with _run_lock:
+        _process_emails(accounts)
+
+
+def _process_emails(accounts=None):
     # 0. Check for SECRET_KEY to ensure encryption services are available
     if not os.environ.get("SECRET_KEY"):
         print(
@@ -63,47 +386,48 @@ def process_emails():
         print(f"❌ Error creating processing run record: {type(e).__name__}")
         return
 
-    all_emails = []
+    account_timings = []
+    fetch_errors = []
+    # Only (account, folder, uidvalidity, uid) is kept per email for the sync cursor
+    seen_locations = []
+    emails_checked_count = 0
     emails_processed_count = 0
     emails_forwarded_count = 0
+    failed_uids = {}
+    # Emails whose download failed; their UIDs hold the sync cursor back
+    unfetched_count = 0
     error_occurred = False
     error_msg = None
+    # IMAP side of the pipeline, stored on the run with the other stages
+    fetch_stats = StageStats()
 
     try:
         # 1. Fetch from all configured accounts using centralized logic
-        accounts = EmailService.get_all_accounts()
+        if accounts is None:
+            accounts = EmailService.get_all_accounts()
         if accounts:
             print(f"👥 Processing {len(accounts)} accounts...")
-            for i, acc in enumerate(accounts):
-                user = acc.get("email")
-                pwd = acc.get("password")
-                server = acc.get("imap_server", "imap.gmail.com")
-
-                if user and pwd:
-                    print(f"   Scanning account #{i+1}...")
-                    try:
-                        fetched = EmailService.fetch_recent_emails(user, pwd, server)
-                        # Tag each email with the source account
-                        for email_data in fetched:
-                            email_data["account_email"] = user
-                        all_emails.extend(fetched)
-                    except Exception as e:
-                        # CodeQL: Avoid logging full exception as it may contain credentials
-                        print(f"❌ Error parsing EMAIL_ACCOUNTS: {type(e).__name__}")
-                        error_occurred = True
-                        error_msg = f"Error scanning account #{i+1}: Connection failed ({type(e).__name__})"
+            # Consumed one message at a time so memory stays flat per poll
+            email_stream = stream_all_accounts(
+                accounts, account_timings, fetch_errors, stats=fetch_stats
+            )
         else:
             print("⚠️ No email accounts configured.")
+            email_stream = iter(())
 
-        emails = all_emails
+        first_email = next(email_stream, None)
 
-        if not emails:
+        if first_email is None:
+            if fetch_errors:
+                error_occurred = True
+                error_msg = "; ".join(fetch_errors)
             print("📭 No new emails.")
             # Update the processing run with zero emails
             with Session(engine) as session:
                 run = session.get(ProcessingRun, run_id)
                 if run:
                     run.completed_at = datetime.now(timezone.utc)
+                    run.account_timings = account_timings
                     run.emails_checked = 0
                     run.emails_processed = 0
                     run.emails_forwarded = 0
@@ -114,118 +438,240 @@ def process_emails():
                     session.commit()
             return
 
-        with Session(engine) as session:
-            # Check target email (Wife)
-            target_email = os.environ.get("WIFE_EMAIL")
-            if not target_email:
-                print("❌ WIFE_EMAIL not set, cannot forward.")
-                error_msg = "WIFE_EMAIL not configured"
-                # Update run with error
+        # Check target email (Wife)
+        target_email = os.environ.get("WIFE_EMAIL")
+        if not target_email:
+            print("❌ WIFE_EMAIL not set, cannot forward.")
+            error_msg = "WIFE_EMAIL not configured"
+            # Drain the stream so the run still reports how much mail arrived
+            emails_checked = 1 + sum(1 for _ in email_stream)
+            # Update run with error
+            with Session(engine) as session:
                 run = session.get(ProcessingRun, run_id)
                 if run:
                     run.completed_at = datetime.now(timezone.utc)
-                    run.emails_checked = len(emails)
+                    run.account_timings = account_timings
+                    run.emails_checked = emails_checked
                     run.emails_processed = 0
                     run.emails_forwarded = 0
                     run.status = "error"
                     run.error_message = error_msg
                     session.add(run)
                     session.commit()
-                return
+            return
 
-            for email_data in emails:
-                try:
-                    # Check if already processed (deduplication by Message-ID OR Content Hash)
-                    msg_id = email_data.get("message_id")
-                    content_hash = get_email_content_hash(email_data)
+        with Session(engine) as session:
+            # Each stage talks to the database through its own session; `session`
+            # belongs to the persist stage and then records the run
+            dedupe_session = Session(engine)
+            classify_session = Session(engine)
+            # Rules and preferences are compiled once per run (and again only
+            # if a command email changes them) instead of queried per email
+            rules = None
+            rules_stale = True
+            # Fetched emails are checked for duplicates and classified in batches
+            batch_size = _get_int_setting("DETECTOR_BATCH_SIZE", 50)
+            queue_size = _get_int_setting("PIPELINE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)
+            # Message-IDs and content hashes admitted this run, so the same
+            # message seen in two accounts or folders is handled only once
+            seen_keys = set()
+            # Per-stage detection timings, stored on the run
+            detection_stats = DetectionStats()
+            # Shadow-rule matches of the whole run, saved just before promotion
+            shadow_counts = Counter()
+            # Counters and failures are updated from several stage threads
+            state_lock = threading.Lock()
+
+            def record_failure(email_data, e):
+                nonlocal error_occurred, error_msg
+                print(
+                    f"❌ Error processing individual email {email_data.get('subject', 'unknown')}: {e}"
+                )
+                traceback.print_exc()
+                with state_lock:
+                    if email_data.get("uid") is not None:
+                        failed_key = (
+                            email_data.get("account_email"),
+                            email_data.get("folder", "inbox"),
+                        )
+                        failed_uids.setdefault(failed_key, []).append(email_data["uid"])
+                    # Mark that an error occurred during this run and update error message
+                    error_occurred = True
+                    subject = email_data.get("subject", "unknown")
+                    if error_msg:
+                        error_msg += f"; error processing email '{subject}'"
+                    else:
+                        error_msg = f"Error processing email '{subject}'"
 
-                    existing = None
-                    if msg_id:
-                        existing = session.exec(
-                            select(ProcessedEmail).where(
-                                ProcessedEmail.email_id == msg_id
-                            )
-                        ).first()
+            # Processed rows and shadow-rule counts are committed in chunks
+            writer = ProcessedEmailWriter(
+                session,
+                _get_int_setting("PERSIST_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+                on_error=record_failure,
+            )
 
-                    if not existing:
-                        existing = session.exec(
-                            select(ProcessedEmail).where(
-                                ProcessedEmail.content_hash == content_hash
+            def check_duplicates(batch):
+                nonlocal emails_processed_count
+                keyed = []
+                for email_data in batch:
+                    try:
+                        keyed.append(
+                            (
+                                email_data,
+                                email_data.get("message_id"),
+                                get_email_content_hash(email_data),
                             )
-                        ).first()
+                        )
+                    except Exception as e:
+                        record_failure(email_data, e)
 
-                    if existing:
+                # Deduplication by Message-ID OR Content Hash, for the whole batch
+                try:
+                    known = find_processed_keys(
+                        dedupe_session, [(msg_id, h) for _, msg_id, h in keyed]
+                    )
+                except Exception as e:
+                    dedupe_session.rollback()
+                    # Nothing is forwarded unless it is known to be new
+                    for email_data, _, _ in keyed:
+                        record_failure(email_data, e)
+                    return
+
+                admitted = []
+                for entry in keyed:
+                    _, msg_id, content_hash = entry
+                    # Emails admitted earlier this run may not be in the DB yet
+                    if (
+                        content_hash in known
+                        or content_hash in seen_keys
+                        or (msg_id and (msg_id in known or msg_id in seen_keys))
+                    ):
                         print(
                             f"⚠️ Email {msg_id or content_hash[:8]} already processed. Skipping."
                         )
                         continue
 
                     # This is a new email to process
-                    emails_processed_count += 1
+                    seen_keys.add(content_hash)
+                    if msg_id:
+                        seen_keys.add(msg_id)
+                    admitted.append(entry)
+                emails_processed_count += len(admitted)
+                if admitted:
+                    classify.put(admitted)
+
+            def detect_receipts(entries):
+                nonlocal rules, rules_stale
+                if not entries:
+                    return
+
+                # Detect (rules snapshot, or the session for manual rules/preferences)
+                if rules_stale:
+                    rules = _load_rules_snapshot(classify_session)
+                    rules_stale = False
+                try:
+                    results = ReceiptDetector.classify_batch(
+                        [email_data for email_data, _, _ in entries],
+                        rules=rules,
+                        session=classify_session,
+                    )
+                except Exception as e:
+                    # Classify one by one so a bad email only fails itself
+                    print(f"⚠️ Batch classification failed: {type(e).__name__}")
+                    results = [None] * len(entries)
 
-                    # Get the account this email belongs to
-                    account_email = email_data.get("account_email", "unknown")
+                # Shadow rules are matched against the snapshot, once per batch
+                try:
+                    shadow_counts.update(
+                        LearningService.count_shadow_matches(
+                            [email_data for email_data, _, _ in entries],
+                            rules or RulesSnapshot.load(classify_session),
+                        )
+                    )
+                except Exception as e:
+                    print(f"⚠️ Shadow-mode evaluation failed: {type(e).__name__}")
+
+                for entry, result in zip(entries, results):
+                    email_data = entry[0]
+                    try:
+                        if result is None:
+                            result = ReceiptDetector.classify_batch(
+                                [email_data],
+                                rules=rules,
+                                session=classify_session,
+                                workers=1,
+                            )[0]
+                        detection_stats.add(result)
+
+                        print(
+                            f"   🔍 Analyzing: {email_data.get('subject')} | From: {email_data.get('from')}"
+                        )
+                        print(
+                            f"      -> Is Receipt: {result.is_receipt} | Category: {result.category}"
+                        )
 
-                    # Checks for Command (Reply from Wife)
+                        if result.is_receipt:
+                            forward.put((entry, result.category))
+                        else:
+                            persist.put(
+                                (entry, "ignored", result.category, "Not a receipt")
+                            )
+                    except Exception as e:
+                        record_failure(email_data, e)
 
-                    if CommandService.is_command_email(email_data):
+            def classify_emails(batch):
+                nonlocal rules_stale
+                entries = []
+                for entry in batch:
+                    email_data = entry[0]
+                    try:
+                        # Checks for Command (Reply from Wife)
+                        if not CommandService.is_command_email(email_data):
+                            entries.append(entry)
+                            continue
+
+                        # Earlier emails are classified before the command can change rules
+                        detect_receipts(entries)
+                        entries = []
                         print(
                             f"   💬 Detected command email from {email_data.get('from')}"
                         )
                         if CommandService.process_command(email_data):
                             status = "command_executed"
                             reason = "User command"
+                            rules_stale = True
                         else:
                             status = "ignored"
                             reason = "Command from wife (no action)"
-
-                        # Log it (with encryption and retention if needed, though commands usually don't need body retention)
-                        processed = ProcessedEmail(
-                            email_id=msg_id or "unknown",
-                            subject=email_data.get("subject", ""),
-                            sender=email_data.get("from", ""),
-                            received_at=datetime.now(timezone.utc),
-                            processed_at=datetime.now(timezone.utc),
-                            status=status,
-                            account_email=account_email,
-                            category="command",
-                            reason=reason,
-                            content_hash=content_hash,
-                            retention_expires_at=datetime.now(timezone.utc)
-                            + timedelta(hours=24),
-                            encrypted_body=encrypt_content(email_data.get("body", "")),
-                            encrypted_html=encrypt_content(
-                                email_data.get("html_body", "")
-                            ),
-                        )
-                        session.add(processed)
-                        session.commit()
+                        persist.put((entry, status, "command", reason))
                         print(f"✅ Command processed with status: {status}")
-                        continue
-
-                    # Detect (passing session for manual rules/preferences)
-                    is_receipt = ReceiptDetector.is_receipt(email_data, session=session)
-                    category = ReceiptDetector.categorize_receipt(email_data)
-
-                    LearningService.run_shadow_mode(session, email_data)
-
-                    print(
-                        f"   🔍 Analyzing: {email_data.get('subject')} | From: {email_data.get('from')}"
+                    except Exception as e:
+                        record_failure(email_data, e)
+                detect_receipts(entries)
+
+            def forward_receipt(item):
+                nonlocal emails_forwarded_count
+                entry, category = item
+                # Forward
+                print(f"      🚀 Forwarding to {target_email}...")
+                success = EmailForwarder.forward_email(entry[0], target_email)
+                if success:
+                    with state_lock:
+                        emails_forwarded_count += 1
+                persist.put(
+                    (
+                        entry,
+                        "forwarded" if success else "error",
+                        category,
+                        "Detected as receipt" if success else "SMTP Error",
                     )
-                    print(f"      -> Is Receipt: {is_receipt} | Category: {category}")
-
-                    status = "ignored"
-                    reason = "Not a receipt"
-
-                    if is_receipt:
-                        # Forward
-                        print(f"      🚀 Forwarding to {target_email}...")
-                        success = EmailForwarder.forward_email(email_data, target_email)
-                        status = "forwarded" if success else "error"
-                        reason = "Detected as receipt" if success else "SMTP Error"
-                        if success:
-                            emails_forwarded_count += 1
+                )
 
+            def persist_email(item):
+                entry, status, category, reason = item
+                email_data, msg_id, content_hash = entry
+                account_email = email_data.get("account_email", "unknown")
+                with writer.email():
                     # Save to DB
                     processed = ProcessedEmail(
                         email_id=msg_id or "unknown",
@@ -242,37 +688,134 @@ def process_emails():
                         + timedelta(hours=24),
                         encrypted_body=encrypt_content(email_data.get("body", "")),
                         encrypted_html=encrypt_content(email_data.get("html_body", "")),
+                        imap_folder=email_data.get("folder"),
+                        imap_uidvalidity=email_data.get("uidvalidity"),
+                        imap_uid=email_data.get("uid"),
                     )
-                    session.add(processed)
-                    session.commit()
-                    print(f"💾 Saved status: {status} (Account: {account_email})")
-
-                except Exception as e:
-                    print(
-                        f"❌ Error processing individual email {email_data.get('subject', 'unknown')}: {e}"
+                    writer.add(processed, email_data)
+                print(f"💾 Queued status: {status} (Account: {account_email})")
+
+            def fail_batch(batch, e):
+                # Dedupe batches hold emails, classify batches (email, id, hash) entries
+                for email_data in batch:
+                    record_failure(
+                        email_data if isinstance(email_data, dict) else email_data[0],
+                        e,
                     )
-                    traceback.print_exc()
-                    session.rollback()
-                    # Mark that an error occurred during this run and update error message
-                    error_occurred = True
-                    subject = email_data.get("subject", "unknown")
-                    if error_msg:
-                        error_msg += f"; error processing email '{subject}'"
-                    else:
-                        error_msg = f"Error processing email '{subject}'"
-                    # Continue to next email
+
+            # Batches of up to DETECTOR_BATCH_SIZE emails go through dedupe and
+            # classification; receipts are forwarded by FORWARD_WORKERS threads
+            # so a slow SMTP send does not hold up the next classification
+            batch_queue_size = max(1, queue_size // batch_size)
+            dedupe = Stage(
+                "dedupe",
+                check_duplicates,
+                queue_size=batch_queue_size,
+                on_error=fail_batch,
+                item_size=len,
+            )
+            classify = Stage(
+                "classify",
+                classify_emails,
+                queue_size=batch_queue_size,
+                on_error=fail_batch,
+                item_size=len,
+            )
+            forward = Stage(
+                "forward",
+                forward_receipt,
+                workers=_get_int_setting("FORWARD_WORKERS", DEFAULT_FORWARD_WORKERS),
+                queue_size=queue_size,
+                on_error=lambda item, e: record_failure(item[0][0], e),
+            )
+            persist = Stage(
+                "persist",
+                persist_email,
+                queue_size=queue_size,
+                on_error=lambda item, e: record_failure(item[0][0], e),
+            )
+
+            try:
+                with Pipeline([dedupe, classify, forward, persist]) as pipeline:
+                    incoming = []
+                    for email_data in itertools.chain([first_email], email_stream):
+                        emails_checked_count += 1
+                        seen_locations.append(
+                            {
+                                "account_email": email_data.get("account_email"),
+                                "folder": email_data.get("folder", "inbox"),
+                                "uidvalidity": email_data.get("uidvalidity"),
+                                "uid": email_data.get("uid"),
+                            }
+                        )
+                        # Not downloaded: keep the cursor below it so it is fetched again
+                        if email_data.get("fetch_failed"):
+                            unfetched_count += 1
+                            with state_lock:
+                                failed_uids.setdefault(
+                                    (
+                                        email_data.get("account_email"),
+                                        email_data.get("folder", "inbox"),
+                                    ),
+                                    [],
+                                ).append(email_data["uid"])
+                            continue
+                        # Header-only entries were already matched against the DB by Message-ID
+                        if email_data.get("already_processed"):
+                            print(
+                                f"⚠️ Email {email_data.get('message_id')} already processed. Skipping."
+                            )
+                            continue
+                        incoming.append(email_data)
+                        if len(incoming) >= batch_size:
+                            dedupe.put(incoming)
+                            incoming = []
+                    if incoming:
+                        dedupe.put(incoming)
+            finally:
+                # Rows must be committed before the sync cursors move past them,
+                # and emails already forwarded must be recorded even if the run fails
+                writer.flush()
+                dedupe_session.close()
+                classify_session.close()
+            persist_stats = writer.stats()
+            print(
+                f"💾 Saved {persist_stats['saved']} emails in "
+                f"{persist_stats['commits']} commits ({persist_stats['db_ms']} ms)"
+            )
+
+            if unfetched_count:
+                fetch_errors.append(
+                    f"{unfetched_count} emails could not be fetched and will be retried"
+                )
+            if fetch_errors:
+                error_occurred = True
+                error_msg = "; ".join(fetch_errors + ([error_msg] if error_msg else []))
+
+            # Advance incremental sync cursors past everything handled this run
+            for (acc_email, folder), (uidvalidity, last_uid) in compute_sync_cursors(
+                seen_locations, failed_uids
+            ).items():
+                save_sync_state(session, acc_email, folder, uidvalidity, last_uid)
 
             # Update the processing run with final counts
             run = session.get(ProcessingRun, run_id)
             if run:
                 run.completed_at = datetime.now(timezone.utc)
-                run.emails_checked = len(emails)
+                run.account_timings = account_timings
+                run.emails_checked = emails_checked_count
                 run.emails_processed = emails_processed_count
                 run.emails_forwarded = emails_forwarded_count
+                run.detection_stats = detection_stats.to_dict()
+                run.pipeline_stats = {
+                    "fetch": fetch_stats.to_dict(),
+                    **pipeline.stats(),
+                }
                 run.status = "error" if error_occurred else "completed"
                 run.error_message = error_msg
                 session.add(run)
 
+                LearningService.apply_shadow_matches(session, shadow_counts)
                 # Run rule promotion logic
                 LearningService.auto_promote_rules(session)
 
@@ -286,6 +829,7 @@ def process_emails():
                 run = session.get(ProcessingRun, run_id)
                 if run:
                     run.completed_at = datetime.now(timezone.utc)
+                    run.account_timings = account_timings
                     run.status = "error"
                     run.error_message = str(e)
                     session.add(run)
@@ -297,9 +841,20 @@ def start_scheduler():
     scheduler.add_job(process_emails, "interval", minutes=poll_interval)
     # Register the cleanup job
     scheduler.add_job(cleanup_expired_emails, "interval", hours=1)
+    # Keep pooled IMAP sessions alive between polls and drop long-unused ones
+    scheduler.add_job(
+        imap_pool.keepalive, "interval", seconds=imap_pool.keepalive_interval
+    )
     scheduler.start()
     print(f"⏰ Scheduler started. Polling every {poll_interval} minutes.")
 
+    # Interval polling stays on as the fallback when IDLE push is enabled
+    if idle_enabled():
+        start_idle_watchers(
+            EmailService.get_all_accounts(),
+            lambda account: process_emails(accounts=[account]),
+        )
+
 
 def cleanup_expired_emails():
     """Cleanup encrypted bodies and HTML for emails older than 24 hours."""
@@ -327,5 +882,8 @@ def cleanup_expired_emails():
 
 
 def stop_scheduler():
+    stop_idle_watchers()
     scheduler.shutdown()
+    imap_pool.close_all()
+    shutdown_batch_pool()
     print("🛑 Scheduler stopped.")
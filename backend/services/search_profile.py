@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import re
+from typing import Optional
+
+# Gmail's system categories (category:<name> in the web search box)
+GMAIL_CATEGORIES = {"primary", "social", "promotions", "updates", "forums"}
+
+# IMAP keywords are atoms: no spaces, quotes, parentheses or wildcards
+_KEYWORD_RE = re.compile(r"^[\w$.-]+$")
+
+# Keys understood in a search profile; anything else is ignored with a warning
+PROFILE_KEYS = {
+    "exclude_categories",
+    "exclude_labels",
+    "exclude_from",
+    "from",
+    "unseen_only",
+    "gmail_raw",
+    "imap_raw",
+}
+
+
+def _quote(value: str) -> str:
+    """Quotes a value as an IMAP string (RFC 3501 quoted-specials escaped)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _as_list(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value if v]
+
+
+def _gmail_term(value: str) -> str:
+    # Gmail search operators take bare words; anything with spaces needs quotes
+    return f'"{value}"' if any(c.isspace() for c in value) else value
+
+
+def parse_search_profile(raw) -> Optional[dict]:
+    """
+    Accepts a profile as a dict or JSON string (as found in EMAIL_ACCOUNTS or
+    IMAP_SEARCH_PROFILE). Returns None when there is nothing to apply.
+    """
+    if not raw:
+        return None
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            logging.warning("Ignoring search profile that is not valid JSON")
+            return None
+    if not isinstance(raw, dict):
+        logging.warning("Ignoring search profile that is not a JSON object")
+        return None
+    unknown = set(raw) - PROFILE_KEYS
+    if unknown:
+        logging.warning("Ignoring unknown search profile keys: %s", sorted(unknown))
+    profile = {key: raw[key] for key in PROFILE_KEYS if raw.get(key)}
+    return profile or None
+
+
+def profile_for_account(account: dict) -> Optional[dict]:
+    """
+    The account's own "search_profile", else the IMAP_SEARCH_PROFILE default.
+    """
+    if account.get("search_profile"):
+        return parse_search_profile(account["search_profile"])
+    return parse_search_profile(os.environ.get("IMAP_SEARCH_PROFILE"))
+
+
+def compile_gmail(profile: dict) -> Optional[str]:
+    """Compiles a profile into a single X-GM-RAW search key."""
+    terms = []
+    for category in _as_list(profile.get("exclude_categories")):
+        if category.lower() not in GMAIL_CATEGORIES:
+            logging.warning("Unknown Gmail category %r in search profile", category)
+            continue
+        terms.append(f"-category:{category.lower()}")
+    terms += [
+        f"-label:{_gmail_term(label)}"
+        for label in _as_list(profile.get("exclude_labels"))
+    ]
+    terms += [
+        f"-from:{_gmail_term(sender)}"
+        for sender in _as_list(profile.get("exclude_from"))
+    ]
+    senders = _as_list(profile.get("from"))
+    if senders:
+        terms.append(
+            "from:(" + " OR ".join(_gmail_term(sender) for sender in senders) + ")"
+        )
+    if profile.get("unseen_only"):
+        terms.append("is:unread")
+    if profile.get("gmail_raw"):
+        terms.append(str(profile["gmail_raw"]))
+    if not terms:
+        return None
+    return f"X-GM-RAW {_quote(' '.join(terms))}"
+
+
+def compile_imap(profile: dict) -> Optional[str]:
+    """
+    Compiles a profile into standard IMAP SEARCH keys (RFC 3501). Gmail
+    categories have no IMAP equivalent and are skipped; labels map to keywords.
+    """
+    keys = []
+    if profile.get("exclude_categories"):
+        logging.info("Search profile categories only apply to Gmail; skipping")
+    for label in _as_list(profile.get("exclude_labels")):
+        if _KEYWORD_RE.match(label):
+            keys.append(f"UNKEYWORD {label}")
+        else:
+            logging.warning("Label %r is not a valid IMAP keyword; skipping", label)
+    keys += [
+        f"NOT FROM {_quote(sender)}" for sender in _as_list(profile.get("exclude_from"))
+    ]
+    senders = _as_list(profile.get("from"))
+    if senders:
+        # OR takes exactly two keys, so n senders need n-1 nested ORs
+        senders_key = f"FROM {_quote(senders[-1])}"
+        for sender in reversed(senders[:-1]):
+            senders_key = f"OR FROM {_quote(sender)} {senders_key}"
+        keys.append(senders_key)
+    if profile.get("unseen_only"):
+        keys.append("UNSEEN")
+    if profile.get("imap_raw"):
+        keys.append(str(profile["imap_raw"]))
+    if not keys:
+        return None
+    return " ".join(keys)
+
+
+def compile_search_profile(profile: Optional[dict], gmail: bool) -> Optional[str]:
+    """
+    Returns search keys to AND with the UID/date window, or None.
+    `gmail` selects X-GM-RAW (servers advertising X-GM-EXT-1).
+    """
+    if not profile:
+        return None
+    return compile_gmail(profile) if gmail else compile_imap(profile)
@@ -1,6 +1,9 @@
 import os
 
 import pytest
+from backend.services.detection_cache import detection_cache
+from backend.services.identity import reload_identity_registry
+from backend.services.imap_pool import imap_pool
 
 
 # Set common environment variables for all backend tests
@@ -12,3 +15,24 @@ def test_env_setup():
     os.environ["GMAIL_EMAIL"] = "test@example.com"
     os.environ["GMAIL_PASSWORD"] = "password"
     yield
+
+
+# Pooled IMAP sessions must not leak mocks from one test into the next
+@pytest.fixture(autouse=True)
+def reset_imap_pool():
+    yield
+    imap_pool.close_all()
+
+
+# Cached detection results must not carry over between tests
+@pytest.fixture(autouse=True)
+def reset_detection_cache():
+    detection_cache.clear()
+    yield
+
+
+# Own addresses are read from the environment set up above
+@pytest.fixture(autouse=True)
+def reset_identity_registry(test_env_setup):
+    reload_identity_registry()
+    yield
@@ -305,6 +305,7 @@ class TestAccountSelection:
                         "user1pass",
                         sample_ignored_email.email_id,
                         "imap.test.com",
+                        location=None,
                     )
 
     def test_account_selection_fallback_to_all_accounts(
@@ -379,6 +380,7 @@ class TestAccountSelection:
                         "icloudpass",
                         sample_ignored_email.email_id,
                         "imap.mail.me.com",
+                        location=None,
                     )
 
     def test_account_selection_fallback_skips_already_tried(
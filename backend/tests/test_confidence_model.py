@@ -0,0 +1,207 @@
+import json
+
+import pytest
+from backend.models import ProcessedEmail
+from backend.security import encrypt_content
+from backend.services import confidence_model
+from backend.services.confidence_model import (
+    HAND_GATES,
+    HAND_WEIGHTS,
+    ConfidenceModel,
+    feedback_samples,
+    fit_confidence_model,
+    get_confidence_model,
+    load_confidence_model,
+    reload_confidence_model,
+    save_confidence_model,
+)
+from backend.services.detector_engine import FEATURES, PreparedEmail, get_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def reset_model(monkeypatch):
+    monkeypatch.delenv("DETECTOR_CONFIDENCE_MODEL", raising=False)
+    reload_confidence_model()
+    yield
+    monkeypatch.delenv("DETECTOR_CONFIDENCE_MODEL", raising=False)
+    reload_confidence_model()
+
+
+def row(**values):
+    return [float(values.get(name, 0)) for name in FEATURES]
+
+
+def test_hand_weights_reproduce_original_score():
+    """Test the default model keeps the hand-tuned integer score"""
+    model = ConfidenceModel(HAND_WEIGHTS, gates=HAND_GATES)
+    vectors = [
+        row(strong_indicators=1, transactional_score=2),
+        row(known_sender=1, transaction_confirmation=1),
+        row(strong_indicators=1, transactional_score=18, known_sender=1),
+        row(promotional=1, strong_indicators=1, transactional_score=18),
+        row(shipping=1, reply_subject=1),
+    ]
+
+    assert model.score_vectors(vectors) == [60, 30, 100, 0, 0]
+    assert "shipping" not in model.features
+    assert load_confidence_model().fingerprint == model.fingerprint
+
+
+def test_gates_skip_feature_extraction():
+    """Test a gated email scores 0 without extracting the weighted columns"""
+    model = ConfidenceModel(HAND_WEIGHTS, gates=HAND_GATES)
+    engine = get_engine()
+    promo = PreparedEmail("flash sale! 50% off", "shop now. unsubscribe", "a@b.com")
+    receipt = PreparedEmail("your receipt", "order #123456 total: $5.00", "a@b.com")
+
+    calls = []
+    features = engine.features
+
+    def spy(email, names):
+        calls.append(tuple(names))
+        return features(email, names)
+
+    engine.features = spy
+    try:
+        assert model.score(engine, [promo, receipt]) == [0, 90]
+    finally:
+        del engine.features
+    assert calls.count(model.features) == 1
+
+
+def test_score_rows_without_numpy(monkeypatch):
+    """Test the pure-Python path scores logistic models"""
+    model = ConfidenceModel(
+        {"strong_indicators": 2.5, "transactional_score": 0.4},
+        bias=-1.5,
+        kind="logistic",
+    )
+    rows = [[i % 2, i % 7] for i in range(40)]
+    monkeypatch.setattr(confidence_model, "np", None)
+    python_scores = model.score_rows(rows)
+
+    assert python_scores[:2] == [18, 80]
+    assert len(python_scores) == 40
+
+
+def test_score_rows_numpy_matches_python(monkeypatch):
+    """Test both paths agree on batches large enough for NumPy"""
+    assert confidence_model.np is not None
+    model = ConfidenceModel(
+        {"strong_indicators": 2.5, "transactional_score": 0.4},
+        bias=-1.5,
+        kind="logistic",
+    )
+    rows = [[i % 2, i % 7] for i in range(40)]
+    vectorized = model.score_rows(rows)
+    monkeypatch.setattr(confidence_model, "np", None)
+
+    assert model.score_rows(rows) == vectorized
+
+
+def test_model_rejects_unknown_features_and_kinds():
+    with pytest.raises(ValueError):
+        ConfidenceModel({"font_size": 1.0})
+    with pytest.raises(ValueError):
+        ConfidenceModel(HAND_WEIGHTS, kind="forest")
+    with pytest.raises(ValueError):
+        ConfidenceModel(HAND_WEIGHTS, gates=["spam_score"])
+
+
+def test_fit_separates_feedback(monkeypatch):
+    """Test a fitted model ranks receipts above non-receipts"""
+    monkeypatch.setattr(confidence_model, "np", None)
+    receipts = [row(strong_indicators=1, transactional_score=4)] * 6 + [
+        row(known_sender=1, transactional_score=2)
+    ] * 4
+    others = [row(promotional=1, transactional_score=1)] * 6 + [row(shipping=1)] * 4
+    model = fit_confidence_model(
+        receipts + others, [True] * 10 + [False] * 10, epochs=300
+    )
+
+    assert model.kind == "logistic"
+    # Never set in the samples, so never weighted or extracted
+    assert "reply_subject" not in model.features
+    assert model.metadata["trained_on"] == 20
+    assert model.metadata["receipts"] == 10
+    assert model.metadata["train_accuracy"] == 1.0
+
+    receipt_score, other_score = model.score_vectors([receipts[0], others[0]])
+    assert receipt_score > 80
+    assert other_score < 20
+
+
+def test_fit_requires_samples():
+    with pytest.raises(ValueError):
+        fit_confidence_model([], [])
+
+
+def test_save_and_load_round_trip(tmp_path, monkeypatch):
+    """Test a saved model is picked up through DETECTOR_CONFIDENCE_MODEL"""
+    model = ConfidenceModel(
+        {"known_sender": 3.0}, bias=-1.0, kind="logistic", metadata={"trained_on": 5}
+    )
+    path = tmp_path / "model.json"
+    save_confidence_model(model, str(path))
+
+    monkeypatch.setenv("DETECTOR_CONFIDENCE_MODEL", str(path))
+    loaded = reload_confidence_model()
+    assert get_confidence_model() is loaded
+    assert loaded.fingerprint == model.fingerprint
+    assert loaded.metadata == {"trained_on": 5}
+    assert loaded.fingerprint != load_confidence_model("").fingerprint
+
+
+def test_invalid_model_falls_back_to_hand_weights(tmp_path):
+    path = tmp_path / "model.json"
+    path.write_text(json.dumps({"weights": {"nope": 1}}))
+
+    default = ConfidenceModel(HAND_WEIGHTS, gates=HAND_GATES).fingerprint
+    assert load_confidence_model(str(path)).fingerprint == default
+    assert load_confidence_model(str(tmp_path / "missing.json")).fingerprint == default
+
+
+def test_feedback_samples(session):
+    """Test labels come from the latest feedback and bodies are used if kept"""
+    session.add(
+        ProcessedEmail(
+            email_id="1",
+            subject="Your receipt",
+            sender="orders@amazon.com",
+            reason="User Feedback: Should be receipt=True. Ignored",
+            encrypted_body=encrypt_content("Order #123456. Total: $5.00"),
+        )
+    )
+    session.add(
+        ProcessedEmail(
+            email_id="2",
+            subject="Weekly deals",
+            sender="news@shop.com",
+            reason=(
+                "User Feedback: Should be receipt=False. "
+                "User Feedback: Should be receipt=True. "
+            ),
+        )
+    )
+    session.add(ProcessedEmail(email_id="3", subject="x", reason="Forwarded"))
+    session.commit()
+
+    rows, labels = feedback_samples(session, get_engine())
+    assert labels == [True, False]
+    first = dict(zip(FEATURES, rows[0]))
+    assert first["transactional_score"] == 4.0
+    assert first["known_sender"] == 1.0
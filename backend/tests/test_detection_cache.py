@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from backend.services.detection_cache import DetectionCache
+
+
+def test_get_and_put_count_hits_and_misses():
+    cache = DetectionCache(max_size=10, ttl=60)
+
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["size"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DetectionCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evicted"] == 1
+
+
+def test_expired_entry_is_dropped():
+    cache = DetectionCache(max_size=10, ttl=60)
+    with patch("backend.services.detection_cache.time.monotonic", return_value=0):
+        cache.put("a", 1)
+    with patch("backend.services.detection_cache.time.monotonic", return_value=61):
+        assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["expired"] == 1
+    assert stats["size"] == 0
+
+
+def test_size_zero_disables_cache():
+    cache = DetectionCache(max_size=0, ttl=60)
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_env_configuration(monkeypatch):
+    monkeypatch.setenv("DETECTION_CACHE_SIZE", "5")
+    monkeypatch.setenv("DETECTION_CACHE_TTL", "bogus")
+
+    cache = DetectionCache()
+
+    assert cache.max_size == 5
+    assert cache.ttl == 3600
+
+
+def test_clear_resets_entries_and_counters():
+    cache = DetectionCache(max_size=10, ttl=60)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["hits"] == 0
@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 from backend.models import ManualRule, Preference
 from backend.services.detector import ReceiptDetector
+from backend.services.identity import reload_identity_registry
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
@@ -276,6 +277,23 @@ def test_get_detection_confidence_low():
     assert confidence == 0
 
 
+def test_get_detection_confidences_scores_batch():
+    """Test batch scoring agrees with scoring each email alone"""
+    emails = [
+        MockEmail(subject="Sale! 50% off", body="Shop now", sender="a@shop.com"),
+        MockEmail(
+            subject="Receipt for your order",
+            body="Order #123456. Total: $50.00",
+            sender="auto-confirm@amazon.com",
+        ),
+        MockEmail(subject="Hello", body="Just saying hi", sender="friend@example.com"),
+    ]
+    assert ReceiptDetector.get_detection_confidences(emails) == [
+        ReceiptDetector.get_detection_confidence(email) for email in emails
+    ]
+    assert ReceiptDetector.get_detection_confidences([]) == []
+
+
 def test_is_known_receipt_sender():
     assert ReceiptDetector.is_known_receipt_sender("auto-confirm@amazon.com")
     assert ReceiptDetector.is_known_receipt_sender("service@paypal.com")
@@ -517,6 +535,27 @@ def test_preference_blocked_category(session):
     assert ReceiptDetector.is_receipt(email, session) is False
 
 
+def test_preloaded_rules_snapshot_skips_queries(session):
+    """A preloaded snapshot is used instead of querying the session per email"""
+    from backend.services.rules_snapshot import RulesSnapshot
+
+    session.add(ManualRule(email_pattern="*@test.com", purpose="Snapshot Rule"))
+    session.add(Preference(item="marketing", type="Blocked Sender"))
+    session.commit()
+    rules = RulesSnapshot.load(session)
+
+    mock_session = MagicMock()
+    forwarded = MockEmail(subject="Hello", body="Content", sender="info@test.com")
+    blocked = MockEmail(
+        subject="Order Confirmation",
+        body="Order #123456 Total: $50.00",
+        sender="marketing@shop.com",
+    )
+    assert ReceiptDetector.is_receipt(forwarded, mock_session, rules=rules) is True
+    assert ReceiptDetector.is_receipt(blocked, mock_session, rules=rules) is False
+    mock_session.exec.assert_not_called()
+
+
 def test_database_exception_handling():
     """Test that exceptions in database checks are handled gracefully"""
     # Create a mock session that raises an exception
@@ -667,6 +706,7 @@ def test_check_manual_rules_no_rules(session):
 def test_is_reply_or_forward_wife_email():
     """Test detection of wife's email"""
     with patch.dict(os.environ, {"WIFE_EMAIL": "spouse@example.com"}):
+        reload_identity_registry()
         assert ReceiptDetector.is_reply_or_forward(
             "Order Confirmation", "spouse@example.com"
         )
@@ -682,6 +722,7 @@ def test_is_reply_or_forward_personal_emails():
             "SENDER_EMAIL": "personal@work.com",
         },
     ):
+        reload_identity_registry()
         # Gmail
         assert ReceiptDetector.is_reply_or_forward("Order", "personal@gmail.com")
         # iCloud
@@ -690,7 +731,7 @@ def test_is_reply_or_forward_personal_emails():
         assert ReceiptDetector.is_reply_or_forward("Order", "personal@work.com")
 
 
-@patch("backend.services.detector.EmailService.get_all_accounts")
+@patch("backend.services.identity.EmailService.get_all_accounts")
 def test_is_reply_or_forward_from_email_service_accounts(mock_get_accounts):
     """Test detection of emails from EmailService accounts"""
     mock_get_accounts.return_value = [
@@ -698,6 +739,7 @@ def test_is_reply_or_forward_from_email_service_accounts(mock_get_accounts):
         {"email": "account2@example.com"},
         {"email": None},  # Account without email
     ]
+    reload_identity_registry()
 
     assert ReceiptDetector.is_reply_or_forward("Order", "account1@example.com")
     assert ReceiptDetector.is_reply_or_forward("Order", "account2@example.com")
@@ -813,3 +855,303 @@ def test_transactional_score_triggers_receipt():
     assert score >= 3, f"Expected score >= 3, got {score}"
     # This should be detected as receipt via transactional score path (lines 104-105)
     assert ReceiptDetector.is_receipt(email) is True
+
+
+# ============================================================================
+# classify_batch Tests
+# ============================================================================
+
+
+def test_classify_batch_returns_results_in_order(session):
+    """Test classify_batch returns a DetectionResult per email, in order"""
+    session.add(ManualRule(email_pattern="*@friend.com", purpose="Forward all"))
+    session.commit()
+    emails = [
+        {
+            "subject": "Your Order Confirmation",
+            "body": "Order #123456. Total: $50.00",
+            "from": "orders@amazon.com",
+        },
+        {"subject": "Lunch?", "body": "See you at noon", "from": "pal@friend.com"},
+        {"subject": "Weekly digest", "body": "Read more", "from": "news@media.com"},
+    ]
+
+    results = ReceiptDetector.classify_batch(emails, session=session, workers=1)
+
+    assert [r.is_receipt for r in results] == [True, True, False]
+    assert [r.stage for r in results] == [
+        "strong_indicators",
+        "manual_rule",
+        "promotional",
+    ]
+    assert results[0].category == ReceiptDetector.categorize_receipt(emails[0])
+    assert results[0].confidence == ReceiptDetector.get_detection_confidence(emails[0])
+    assert ReceiptDetector.classify_batch([], session=session) == []
+
+
+def test_classify_batch_falls_back_to_serial_when_pool_fails():
+    """Test that a broken process pool does not fail the batch"""
+    emails = [
+        MockEmail(
+            subject="Order Confirmation",
+            body="Order #123456 Total: $50.00",
+            sender="shop@example.com",
+        ),
+        MockEmail(subject="Hello", body="Just saying hi", sender="pal@example.com"),
+    ]
+    with patch(
+        "backend.services.detector._classify_in_pool",
+        side_effect=RuntimeError("pool broken"),
+    ) as mock_pool:
+        results = ReceiptDetector.classify_batch(emails, workers=2)
+
+    mock_pool.assert_called_once()
+    assert [r.is_receipt for r in results] == [True, False]
+
+
+def test_classify_batch_process_pool_matches_serial():
+    """Test that chunked process-pool classification matches the serial path"""
+    from backend.services.detection_cache import detection_cache
+    from backend.services.detector import shutdown_batch_pool
+    from backend.services.rules_snapshot import RulesSnapshot
+
+    rules = RulesSnapshot(
+        [ManualRule(id=1, email_pattern="*@friend.com", purpose="Forward all")],
+        [],
+        [Preference(item="spam", type="Blocked Sender")],
+    )
+    emails = [
+        {"subject": "Order Confirmation", "body": "Total: $5.00", "from": "a@shop.com"},
+        {"subject": "Lunch?", "body": "noon", "from": "pal@friend.com"},
+        {"subject": "Receipt", "body": "Order #1 Total: $9", "from": "spam@x.com"},
+        {"subject": "Flash Sale!", "body": "Unsubscribe", "from": "deals@shop.com"},
+    ] * 3
+
+    try:
+        parallel = ReceiptDetector.classify_batch(emails, rules=rules, workers=2)
+    finally:
+        shutdown_batch_pool()
+
+    # Evaluate again rather than serving the results cached by the pool run
+    detection_cache.clear()
+    serial = ReceiptDetector.classify_batch(emails, rules=rules, workers=1)
+
+    def without_timings(results):
+        return [
+            {**r.to_dict(), "timings_ns": None, "total_ns": None, "cached": None}
+            for r in results
+        ]
+
+    assert without_timings(parallel) == without_timings(serial)
+
+
+# ============================================================================
+# DetectionResult / DetectionStats Tests
+# ============================================================================
+
+
+def test_detect_returns_stage_ids_and_timings(session):
+    """Test detect records the deciding stage, matched IDs and per-stage timings"""
+    email = MockEmail(
+        subject="Your Order Confirmation",
+        body="Thank you for your order. Order #123456. Total: $50.00",
+        sender="orders@shop.com",
+    )
+    result = ReceiptDetector.detect(email, session)
+
+    assert result.is_receipt is True
+    assert result.stage == "strong_indicators"
+    assert result.matched_by == "Strong Receipt Indicators"
+    assert result.matched_ids and all(":" in i for i in result.matched_ids)
+    assert result.category == ReceiptDetector.categorize_receipt(email)
+    assert result.confidence == ReceiptDetector.get_detection_confidence(email)
+    assert list(result.timings_ns)[:5] == [
+        "load_rules",
+        "manual_rule",
+        "always_forward",
+        "blocked",
+        "reply_or_forward",
+    ]
+    assert all(isinstance(ns, int) and ns >= 0 for ns in result.timings_ns.values())
+    assert result.total_ns == sum(result.timings_ns.values())
+    assert [s["step"] for s in result.steps][-1] == "Strong Receipt Indicators"
+
+
+def test_detect_manual_rule_reports_rule_id(session):
+    """Test a manual rule decision carries the rule ID and its confidence"""
+    rule = ManualRule(email_pattern="*@shop.com", purpose="Shop", confidence=0.8)
+    session.add(rule)
+    session.commit()
+
+    result = ReceiptDetector.detect(
+        MockEmail(subject="Hi", body="Hello", sender="a@shop.com"), session
+    )
+
+    assert result.stage == "manual_rule"
+    assert result.matched_ids == [f"rule:{rule.id}"]
+    assert result.confidence == 80
+
+
+def test_is_receipt_skips_detect_only_work():
+    """Test is_receipt does not compute IDs, category or confidence"""
+    with patch.object(ReceiptDetector, "_confidence") as mock_confidence:
+        assert ReceiptDetector.is_receipt(
+            MockEmail(subject="Receipt", body="Total: $5.00", sender="a@b.com")
+        )
+    mock_confidence.assert_not_called()
+
+
+def test_detection_stats_aggregates_stages():
+    """Test DetectionStats sums stage timings and counts deciding stages"""
+    from backend.services.detector import DetectionResult, DetectionStats
+
+    stats = DetectionStats()
+    assert stats.to_dict() is None
+
+    stats.add(
+        DetectionResult(
+            is_receipt=True,
+            stage="strong_indicators",
+            timings_ns={"reply_or_forward": 1_000_000, "strong_indicators": 3_000_000},
+        )
+    )
+    stats.add(
+        DetectionResult(
+            is_receipt=False,
+            stage="reply_or_forward",
+            timings_ns={"reply_or_forward": 1_000_000},
+        )
+    )
+    summary = stats.to_dict()
+
+    assert summary["emails"] == 2
+    assert summary["receipts"] == 1
+    assert summary["decided_by"] == {"strong_indicators": 1, "reply_or_forward": 1}
+    assert summary["total_ms"] == 5.0
+    assert summary["slowest_stage"] == "strong_indicators"
+    assert summary["stages"]["reply_or_forward"] == {
+        "calls": 2,
+        "total_ms": 2.0,
+        "share": 0.4,
+    }
+
+
+# ============================================================================
+# Detection Cache Tests
+# ============================================================================
+
+
+def test_detect_serves_repeat_emails_from_cache(session):
+    """Test an unchanged email under unchanged rules is evaluated only once"""
+    from backend.services.detection_cache import detection_cache
+    from backend.services.rules_snapshot import get_rules_snapshot
+
+    email = {"subject": "Receipt", "body": "Total: $5.00", "from": "a@shop.com"}
+    rules = get_rules_snapshot(session)
+
+    first = ReceiptDetector.detect(email, rules=rules)
+    with patch.object(ReceiptDetector, "_evaluate") as mock_evaluate:
+        second = ReceiptDetector.detect(email, rules=rules)
+        results = ReceiptDetector.classify_batch([email, email], session=session)
+    mock_evaluate.assert_not_called()
+
+    assert first.cached is False
+    assert second.cached is True
+    assert list(second.timings_ns) == ["cache"]
+
+    def comparable(result):
+        return {**result.to_dict(), "timings_ns": None, "total_ns": None, "cached": 0}
+
+    assert comparable(second) == comparable(first)
+    assert all(r.cached for r in results)
+    assert detection_cache.stats()["hits"] == 3
+    assert detection_cache.stats()["misses"] == 1
+
+
+def test_detection_cache_follows_rule_content(session):
+    """Test rule edits miss the cache while a no-op change still hits it"""
+    from backend.services.rules_snapshot import bump_rules_version, get_rules_snapshot
+
+    email = {"subject": "Hello", "body": "Hello", "from": "pal@friend.com"}
+    first = ReceiptDetector.detect(email, rules=get_rules_snapshot(session))
+    assert first.stage == "no_match"
+
+    # Version bumped but rules unchanged: still served from the cache
+    bump_rules_version(session)
+    session.commit()
+    assert ReceiptDetector.detect(email, rules=get_rules_snapshot(session)).cached
+
+    session.add(ManualRule(email_pattern="*@friend.com", purpose="Friends"))
+    bump_rules_version(session)
+    session.commit()
+    result = ReceiptDetector.detect(email, rules=get_rules_snapshot(session))
+    assert result.cached is False
+    assert result.stage == "manual_rule"
+
+
+def test_detect_with_session_only_bypasses_cache(session):
+    """Test rules read fresh from the session are never cached"""
+    from backend.services.detection_cache import detection_cache
+
+    email = {"subject": "Receipt", "body": "Total: $5.00", "from": "a@shop.com"}
+    ReceiptDetector.detect(email, session)
+    assert ReceiptDetector.detect(email, session).cached is False
+    assert detection_cache.stats()["size"] == 0
+
+
+def test_detection_cache_follows_own_addresses(session):
+    """Test adding an alias misses results cached before it was ours"""
+    from backend.services.rules_snapshot import get_rules_snapshot
+
+    email = {"subject": "Receipt", "body": "Total: $5.00", "from": "me@shop.com"}
+    rules = get_rules_snapshot(session)
+    assert ReceiptDetector.detect(email, rules=rules).stage != "reply_or_forward"
+
+    with patch.dict(os.environ, {"EMAIL_ALIASES": "me@shop.com"}):
+        reload_identity_registry()
+    result = ReceiptDetector.detect(email, rules=rules)
+    assert result.cached is False
+    assert result.stage == "reply_or_forward"
+
+
+def test_detection_cache_follows_confidence_model(session, tmp_path, monkeypatch):
+    """Test a retrained confidence model misses results cached before it"""
+    from backend.services.confidence_model import ConfidenceModel
+    from backend.services.confidence_model import reload_confidence_model as reload
+    from backend.services.confidence_model import save_confidence_model
+    from backend.services.rules_snapshot import get_rules_snapshot
+
+    email = {"subject": "Receipt", "body": "Total: $5.00", "from": "a@shop.com"}
+    rules = get_rules_snapshot(session)
+    ReceiptDetector.detect(email, rules=rules)
+
+    path = tmp_path / "model.json"
+    save_confidence_model(ConfidenceModel({"strong_indicators": 1.0}, bias=-1.0), path)
+    monkeypatch.setenv("DETECTOR_CONFIDENCE_MODEL", str(path))
+    reload()
+    try:
+        result = ReceiptDetector.detect(email, rules=rules)
+    finally:
+        monkeypatch.delenv("DETECTOR_CONFIDENCE_MODEL")
+        reload()
+    assert result.cached is False
+    assert result.confidence == 0
+
+
+def test_long_bodies_are_scanned_in_head_and_tail_windows():
+    """Test only the head and tail of a long body reach the detector stages"""
+    from backend.services.detector_engine import get_engine
+
+    engine = get_engine()
+    body = (
+        "Thank you for your order. Order #123456. Total: $50.00 "
+        + "legal notice " * 5000
+        + "flash sale "
+        + "legal notice " * 5000
+    )
+    email = {"subject": "Your receipt", "body": body, "from": "orders@shop.com"}
+
+    prepared = ReceiptDetector._prepare(email)
+    assert len(prepared.body) == engine.body_head + 1 + engine.body_tail
+    assert "flash sale" not in prepared.body
+    assert ReceiptDetector.is_receipt(email) is True
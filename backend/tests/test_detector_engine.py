@@ -0,0 +1,158 @@
+import re
+
+from backend.services.detector_engine import (
+    FEATURES,
+    SHIPPING_PATTERNS,
+    SUPPORTING_EVIDENCE_PATTERNS,
+    DetectorEngine,
+    PatternSet,
+    PreparedEmail,
+    collapse_whitespace,
+    fold_case,
+    get_engine,
+    normalize_body,
+)
+
+
+def test_fold_case_matches_ignorecase():
+    """A plain search on folded text agrees with re.IGNORECASE on the original"""
+    samples = [
+        "ORDER #ABC-123456 Total $12.00",
+        "İnvoice ınvoice ſale",
+        "Your Package Has SHIPPED",
+        "KELVIN K sign",
+    ]
+    for pattern in SHIPPING_PATTERNS + SUPPORTING_EVIDENCE_PATTERNS + ("invoice",):
+        for text in samples:
+            expected = bool(re.search(pattern, text, re.IGNORECASE))
+            assert bool(re.search(pattern, fold_case(text))) == expected
+
+
+def test_fold_case_keeps_length():
+    text = "İstanbul receipt"
+    assert len(fold_case(text)) == len(text)
+
+
+def test_pattern_set():
+    patterns = PatternSet("test", [r"re:\s*", r"order\s*#"])
+
+    assert patterns.search("nothing", "an order #1")
+    assert not patterns.search("nothing here")
+    assert patterns.match("re: hello")
+    assert not patterns.match("hello re: there")
+    assert patterns.matching("re: order #5") == [r"re:\s*", r"order\s*#"]
+
+
+def test_prepared_email_computes_texts_once():
+    email = PreparedEmail("Subject", "Body", "Sender")
+
+    assert email.all_folded == "subject body sender"
+    assert email.all_folded is email.all_folded
+    assert email.subject_body_lower == "subject body"
+
+    matcher = get_engine().keywords
+    assert email.keyword_hits(matcher, "on sale") is email.keyword_hits(
+        matcher, "on sale"
+    )
+
+
+def test_engine_checks():
+    engine = get_engine()
+    receipt = PreparedEmail(
+        "Your Order Confirmation",
+        "Order #123456. Total: $50.00",
+        "orders@shop.com",
+    )
+    shipping = PreparedEmail("Your package has shipped", "On the way", "x@shop.com")
+
+    assert engine.has_strong_receipt_indicators(receipt)
+    assert engine.calculate_transactional_score(receipt) == 4
+    assert engine.is_shipping_notification(shipping)
+    assert not engine.is_shipping_notification(receipt)
+    assert engine.is_reply_subject(PreparedEmail("FWD: receipt", ""))
+
+
+def test_engine_features():
+    engine = get_engine()
+    receipt = PreparedEmail(
+        "your order confirmation",
+        "order #123456. total: $50.00",
+        "orders@amazon.com",
+    )
+
+    row = engine.features(receipt)
+    assert len(row) == len(FEATURES)
+    values = dict(zip(FEATURES, row))
+    assert values["strong_indicators"] == 1.0
+    assert values["transactional_score"] == 4.0
+    assert values["known_sender"] == 1.0
+    assert values["promotional"] == 0.0
+    assert engine.features(receipt, ["transactional_score", "promotional"]) == [
+        4.0,
+        0.0,
+    ]
+
+
+def test_engine_categorize_keeps_first_matching_category():
+    engine = get_engine()
+
+    # "ubereats" also contains "uber"; transportation is checked first
+    assert engine.categorize(PreparedEmail("", "", "ubereats.com")) == "transportation"
+    assert engine.categorize(PreparedEmail("your copay", "", "x.com")) == "healthcare"
+    assert engine.categorize(PreparedEmail("hello", "", "x.com")) == "other"
+
+
+def test_collapse_whitespace_keeps_line_breaks():
+    assert collapse_whitespace("  a \t b\xa0c ") == "a b c"
+    assert collapse_whitespace("total\r\n\n  $5 \n") == "total\n$5"
+    assert collapse_whitespace("a\n b") == "a\nb"
+    already = "order #1\ntotal $5"
+    assert collapse_whitespace(already) is already
+
+
+def test_normalize_body_windows():
+    body = "Order #123 " + "filler " * 1000 + "UNSUBSCRIBE"
+
+    assert normalize_body(body, 0, 0) == collapse_whitespace(body.lower())
+    assert normalize_body("Short  Body", 100, 10) == "short body"
+
+    windowed = normalize_body(body, 100, 20)
+    head, tail = windowed.split("\n")
+    assert head == collapse_whitespace(body.lower())[:100]
+    assert tail.endswith("unsubscribe") and len(tail) == 20
+    assert normalize_body(windowed, 100, 20) == windowed
+    assert normalize_body(body, 100, 0) == head
+
+
+def test_normalize_body_slices_long_bodies_first():
+    body = "receipt   " * 10000
+    assert normalize_body(body, 50, 10) == (
+        collapse_whitespace(body.lower())[:50]
+        + "\n"
+        + collapse_whitespace(body.lower())[-10:]
+    )
+
+
+def test_engine_prepare_uses_configured_windows(monkeypatch):
+    monkeypatch.setenv("DETECTOR_BODY_HEAD", "10")
+    monkeypatch.setenv("DETECTOR_BODY_TAIL", "bad")
+    engine = DetectorEngine()
+
+    assert (engine.body_head, engine.body_tail) == (10, 2048)
+    email = engine.prepare("Your RECEIPT", "Total  $5.00 " + "x" * 3000, "A@Shop.com")
+    assert email.subject == "your receipt"
+    assert email.sender == "a@shop.com"
+    assert email.body.startswith("total $5.0\n")
+
+
+def test_prepare_collapsed_whitespace_matches_spaced_patterns():
+    """Runs of spaces or tabs no longer hide phrases such as "view your order"."""
+    engine = get_engine()
+    body = "Arriving\ttomorrow.  View   your  order for details."
+    email = engine.prepare("Ordered: Widget 19", body, "auto-confirm@amazon.com")
+
+    assert email.body == "arriving tomorrow. view your order for details."
+    assert engine.has_strong_receipt_indicators(email)
+    # The same text without collapsing misses, as the detector did before
+    raw = PreparedEmail("ordered: widget 19", body.lower(), "auto-confirm@amazon.com")
+    assert not engine.has_strong_receipt_indicators(raw)
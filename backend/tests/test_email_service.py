@@ -1,8 +1,10 @@
+import imaplib
 import os
 from email.mime.text import MIMEText
 from unittest.mock import Mock, patch
 
 from backend.services.email_service import EmailService
+from backend.services.imap_pool import imap_pool
 
 
 class TestEmailService:
@@ -14,14 +16,44 @@ class TestEmailService:
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [search_result])
+        self._route_uid_commands(mock_mail)
         return mock_mail
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    def _route_uid_commands(self, mock_mail):
+        """Route UID SEARCH/FETCH calls through the plain search/fetch mocks"""
+
+        def uid(command, *args):
+            if command.upper() == "SEARCH":
+                # UID SEARCH takes the criteria only; search() has a charset first
+                return mock_mail.search(None, *args)
+            return mock_mail.fetch(*args)
+
+        mock_mail.uid.side_effect = uid
+        mock_mail.response.return_value = ("UIDVALIDITY", [None])
+
+    def _multi_fetch(self, raw_message):
+        """Build a FETCH side effect answering every UID in the requested set"""
+
+        def fetch(message_set, spec):
+            if isinstance(message_set, bytes):
+                message_set = message_set.decode()
+            data = []
+            for item in message_set.split(","):
+                start, _, end = item.partition(":")
+                for uid in range(int(start), int(end or start) + 1):
+                    header = f"{uid} (UID {uid} BODY[] {{{len(raw_message)}}}"
+                    data.extend([(header.encode(), raw_message), b")"])
+            return ("OK", data)
+
+        return fetch
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_recent_emails_success(self, mock_imap):
         """Test successful email fetching"""
         # Setup mock
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1 2 3"])
@@ -33,7 +65,7 @@ class TestEmailService:
         msg["Date"] = "Mon, 01 Jan 2024 12:00:00 +0000"
         msg["Message-ID"] = "<test123@example.com>"
 
-        mock_mail.fetch.return_value = ("OK", [(b"1 (RFC822 {1234}", msg.as_bytes())])
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
 
         # Execute
         emails = EmailService.fetch_recent_emails(
@@ -48,8 +80,39 @@ class TestEmailService:
         assert emails[0]["account_email"] == "test@example.com"
         mock_mail.login.assert_called_once_with("test@example.com", "password123")
         mock_mail.select.assert_called_once_with("inbox")
-        mock_mail.close.assert_called_once()
-        mock_mail.logout.assert_called_once()
+        # The session stays logged in and goes back to the pool
+        mock_mail.logout.assert_not_called()
+        assert imap_pool.stats()["servers"]["imap.gmail.com:993"]["idle"] == 1
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_calls_share_pooled_session(self, mock_imap):
+        """Test that polling, by-ID fetches and connection tests reuse one login"""
+        mock_mail = Mock()
+        mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
+        mock_mail.select.return_value = ("OK", [])
+        mock_mail.search.return_value = ("OK", [b""])
+
+        EmailService.fetch_recent_emails("test@example.com", "pw", "imap.gmail.com")
+        EmailService.fetch_email_by_id("test@example.com", "pw", "<a@b>")
+        result = EmailService.test_connection("test@example.com", "pw")
+
+        assert result["success"] is True
+        mock_imap.assert_called_once()
+        mock_mail.login.assert_called_once_with("test@example.com", "pw")
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_connection_checks_new_password(self, mock_imap):
+        """Test a wrong password fails even while a session is pooled"""
+        good, bad = Mock(), Mock()
+        bad.login.side_effect = imaplib.IMAP4.error("AUTHENTICATIONFAILED")
+        mock_imap.side_effect = [good, bad]
+
+        assert EmailService.test_connection("test@example.com", "pw")["success"]
+        result = EmailService.test_connection("test@example.com", "wrong")
+
+        assert result["success"] is False
+        bad.login.assert_called_once_with("test@example.com", "wrong")
 
     def test_fetch_recent_emails_missing_credentials(self):
         """Test that missing credentials returns empty list"""
@@ -62,11 +125,12 @@ class TestEmailService:
         emails = EmailService.fetch_recent_emails(None, "password")
         assert emails == []
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_recent_emails_login_failure(self, mock_imap):
         """Test handling of login failure"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.side_effect = Exception("Authentication failed")
 
         emails = EmailService.fetch_recent_emails(
@@ -75,11 +139,12 @@ class TestEmailService:
 
         assert emails == []
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_recent_emails_search_failure(self, mock_imap):
         """Test handling when search returns non-OK status"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("NO", [])
@@ -90,11 +155,13 @@ class TestEmailService:
 
         assert emails == []
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch.dict(os.environ, {"IMAP_PARTIAL_FETCH": "false"})
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_recent_emails_with_limit(self, mock_imap):
         """Test that limit parameter works correctly"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         # Simulate 100 emails, but we only want last 5
@@ -107,7 +174,7 @@ class TestEmailService:
         msg["Date"] = "Mon, 01 Jan 2024 12:00:00 +0000"
         msg["Message-ID"] = "<test@example.com>"
 
-        mock_mail.fetch.return_value = ("OK", [(b"", msg.as_bytes())])
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
 
         emails = EmailService.fetch_recent_emails(
             "test@example.com", "password123", "imap.gmail.com"
@@ -115,14 +182,15 @@ class TestEmailService:
 
         # Should fetch all 100 emails since batch limit is 100 by default
         assert len(emails) == 100
-        assert mock_mail.fetch.call_count == 100
+        assert mock_mail.fetch.call_count == 2  # Two UID FETCH chunks of 50
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     @patch("bs4.BeautifulSoup")
     def test_fetch_emails_with_html_content(self, mock_bs, mock_imap):
         """Test parsing emails with HTML content"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -155,11 +223,12 @@ class TestEmailService:
         assert emails[0]["subject"] == "HTML Email"
         mock_bs.assert_called_once()
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_multipart_mixed(self, mock_imap):
         """Test parsing multipart emails with attachments"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -191,11 +260,12 @@ class TestEmailService:
         assert len(emails) == 1
         assert emails[0]["body"] == "Plain text content"
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_encoded_subject(self, mock_imap):
         """Test handling of encoded email subjects"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -217,7 +287,7 @@ class TestEmailService:
         # The subject should be decoded
         assert emails[0]["subject"] == "Test Subject"
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_success(self, mock_imap):
         """Test successful fetching of a single email by ID"""
         mock_mail = Mock()
@@ -247,7 +317,7 @@ class TestEmailService:
         assert EmailService.fetch_email_by_id("user", None, "id") is None
         assert EmailService.fetch_email_by_id("user", "pass", None) is None
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_connection_success(self, mock_imap):
         """Test successful email connection test"""
         mock_mail = Mock()
@@ -258,7 +328,7 @@ class TestEmailService:
         assert result["success"] is True
         assert result["error"] is None
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_connection_failure(self, mock_imap):
         """Test failed email connection test"""
         mock_mail = Mock()
@@ -269,7 +339,7 @@ class TestEmailService:
         assert result["success"] is False
         assert "Unable to connect to email server" == result["error"]
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_multipart_html(self, mock_imap):
         """Test fetching a multipart email with HTML content by ID"""
         mock_mail = Mock()
@@ -372,7 +442,7 @@ class TestEmailService:
         assert result["error"] == "Credentials missing"
 
     @patch.dict(os.environ, {"EMAIL_LOOKBACK_DAYS": "invalid"}, clear=True)
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_invalid_lookback_days(self, mock_imap):
         """Test fetch_recent_emails with invalid EMAIL_LOOKBACK_DAYS"""
         mock_mail = self._setup_mock_imap(mock_imap)
@@ -389,7 +459,7 @@ class TestEmailService:
         assert len(emails) == 1
 
     @patch.dict(os.environ, {"EMAIL_LOOKBACK_DAYS": "-5"}, clear=True)
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_negative_lookback_days(self, mock_imap):
         """Test fetch_recent_emails with negative EMAIL_LOOKBACK_DAYS"""
         mock_mail = self._setup_mock_imap(mock_imap)
@@ -406,7 +476,7 @@ class TestEmailService:
         assert len(emails) == 1
 
     @patch.dict(os.environ, {"EMAIL_BATCH_LIMIT": "invalid"}, clear=True)
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_invalid_batch_limit(self, mock_imap):
         """Test fetch_recent_emails with invalid EMAIL_BATCH_LIMIT"""
         # Create 50 email IDs
@@ -418,14 +488,14 @@ class TestEmailService:
         msg["From"] = "test@test.com"
         msg["Date"] = "Mon, 01 Jan 2024 12:00:00 +0000"
         msg["Message-ID"] = "<test@test.com>"
-        mock_mail.fetch.return_value = ("OK", [(b"", msg.as_bytes())])
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
 
         emails = EmailService.fetch_recent_emails("user@test.com", "pass")
         # Should use default batch limit of 100
         assert len(emails) == 50
 
     @patch.dict(os.environ, {"EMAIL_BATCH_LIMIT": "-10"}, clear=True)
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_negative_batch_limit(self, mock_imap):
         """Test fetch_recent_emails with negative EMAIL_BATCH_LIMIT"""
         mock_mail = self._setup_mock_imap(mock_imap)
@@ -441,7 +511,7 @@ class TestEmailService:
         # Should use default batch limit of 100
         assert len(emails) == 1
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_payload_decode_exception(self, mock_imap):
         """Test fetch_recent_emails with exception during payload decoding"""
         mock_mail = self._setup_mock_imap(mock_imap)
@@ -468,11 +538,12 @@ class TestEmailService:
         # Should handle the exception and still return the email
         assert len(emails) == 1
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_non_multipart_html(self, mock_imap):
         """Test fetch_recent_emails with non-multipart HTML email"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -490,11 +561,13 @@ class TestEmailService:
         assert emails[0]["html_body"]
         assert "HTML" in emails[0]["body"]  # Should extract text from HTML
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch.dict(os.environ, {"IMAP_PARTIAL_FETCH": "false"})
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_fetch_exception(self, mock_imap):
         """Test fetch_recent_emails with exception during individual email fetch"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1 2"])
@@ -515,7 +588,7 @@ class TestEmailService:
         # Should handle exception and continue with next email
         assert len(emails) == 1
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_search_not_ok(self, mock_imap):
         """Test fetch_email_by_id when search returns non-OK status"""
         mock_mail = Mock()
@@ -527,7 +600,7 @@ class TestEmailService:
         result = EmailService.fetch_email_by_id("user", "pass", "<test@test.com>")
         assert result is None
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_no_messages(self, mock_imap):
         """Test fetch_email_by_id when search returns no messages"""
         mock_mail = Mock()
@@ -539,7 +612,7 @@ class TestEmailService:
         result = EmailService.fetch_email_by_id("user", "pass", "<test@test.com>")
         assert result is None
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_fetch_not_ok(self, mock_imap):
         """Test fetch_email_by_id when fetch returns non-OK status"""
         mock_mail = Mock()
@@ -552,7 +625,7 @@ class TestEmailService:
         result = EmailService.fetch_email_by_id("user", "pass", "<test@test.com>")
         assert result is None
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_exception(self, mock_imap):
         """Test fetch_email_by_id with exception during processing"""
         mock_mail = Mock()
@@ -562,6 +635,68 @@ class TestEmailService:
         result = EmailService.fetch_email_by_id("user", "pass", "<test@test.com>")
         assert result is None
 
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_email_by_id_uses_stored_location(self, mock_imap):
+        """Test that a valid recorded location is read with UID FETCH, no search"""
+        mock_mail = Mock()
+        mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
+        mock_mail.select.return_value = ("OK", [b"3"])
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"7"])
+        msg = MIMEText("Located body")
+        msg["Subject"] = "Located"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        result = EmailService.fetch_email_by_id(
+            "user",
+            "pass",
+            "<located@test.com>",
+            location={"folder": "[Gmail]/All Mail", "uidvalidity": 7, "uid": 42},
+        )
+
+        assert result["body"] == "Located body"
+        mock_mail.select.assert_called_once_with("[Gmail]/All Mail")
+        assert mock_mail.fetch.call_args[0][0] == "42"
+        mock_mail.search.assert_not_called()
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_email_by_id_stale_location_falls_back_to_search(self, mock_imap):
+        """Test that a UIDVALIDITY change falls back to the Message-ID search"""
+        mock_mail = Mock()
+        mock_imap.return_value = mock_mail
+        mock_mail.select.return_value = ("OK", [b"3"])
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"8"])
+        mock_mail.search.return_value = ("OK", [b"5"])
+        msg = MIMEText("Searched body")
+        mock_mail.fetch.return_value = ("OK", [(b"5 (BODY[] {10}", msg.as_bytes())])
+
+        result = EmailService.fetch_email_by_id(
+            "user",
+            "pass",
+            "<moved@test.com>",
+            location={"folder": "inbox", "uidvalidity": 7, "uid": 42},
+        )
+
+        assert result["body"] == "Searched body"
+        mock_mail.uid.assert_not_called()
+        mock_mail.search.assert_called_once()
+
+    def test_get_message_location(self):
+        """Test that locations are only built for rows with a recorded UID"""
+        from backend.models import ProcessedEmail
+
+        legacy = ProcessedEmail(email_id="<old@test.com>")
+        assert EmailService.get_message_location(legacy) is None
+
+        located = ProcessedEmail(
+            email_id="<new@test.com>", imap_uidvalidity=7, imap_uid=42
+        )
+        assert EmailService.get_message_location(located) == {
+            "folder": "inbox",
+            "uidvalidity": 7,
+            "uid": 42,
+        }
+
     @patch.dict(
         os.environ,
         {"EMAIL_ACCOUNTS": "[{'email':'test@test.com','password':'pass'}]"},
@@ -581,11 +716,12 @@ class TestEmailService:
         # Should not crash, returns whatever is available from other sources
         assert isinstance(accounts, list)
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_custom_search_criterion(self, mock_imap):
         """Test fetch_recent_emails with custom search criterion"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -603,11 +739,12 @@ class TestEmailService:
         )
         assert len(emails) == 1
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_non_multipart_decode_exception(self, mock_imap):
         """Test fetch_recent_emails with exception in non-multipart decode"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         mock_mail.search.return_value = ("OK", [b"1"])
@@ -647,7 +784,7 @@ class TestEmailService:
         assert emails[0]["from"] == "test@test.com"
         assert emails[0]["body"] == ""
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_multipart_decode_exceptions(self, mock_imap):
         """Test fetch_email_by_id with exceptions during multipart decoding"""
         mock_mail = Mock()
@@ -686,11 +823,12 @@ class TestEmailService:
         assert "Good text body" in result.get("body", "")
 
     @patch.dict(os.environ, {"EMAIL_BATCH_LIMIT": "5"}, clear=True)
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_emails_with_custom_criterion_and_batch_limit(self, mock_imap):
         """Test fetch with custom search criterion AND batch limiting"""
         mock_mail = Mock()
         mock_imap.return_value = mock_mail
+        self._route_uid_commands(mock_mail)
         mock_mail.login.return_value = ("OK", [])
         mock_mail.select.return_value = ("OK", [])
         # Create 10 emails to exceed batch limit of 5
@@ -702,7 +840,7 @@ class TestEmailService:
         msg["From"] = "test@test.com"
         msg["Date"] = "Mon, 01 Jan 2024 12:00:00 +0000"
         msg["Message-ID"] = "<test@test.com>"
-        mock_mail.fetch.return_value = ("OK", [(b"", msg.as_bytes())])
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
 
         # Use custom search criterion with batch limit
         emails = EmailService.fetch_recent_emails(
@@ -711,7 +849,7 @@ class TestEmailService:
         # Should limit to 5 emails
         assert len(emails) == 5
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_non_multipart_html(self, mock_imap):
         """Test fetch_email_by_id with non-multipart HTML email"""
         mock_mail = Mock()
@@ -730,7 +868,7 @@ class TestEmailService:
         assert result is not None
         assert result["html_body"]
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_no_raw_email_data(self, mock_imap):
         """Test fetch_email_by_id when no raw email data is returned"""
         mock_mail = Mock()
@@ -742,11 +880,12 @@ class TestEmailService:
         mock_mail.fetch.return_value = ("OK", ["not a tuple"])
 
         result = EmailService.fetch_email_by_id("user", "pass", "<test@test.com>")
-        # Should logout and return None
+        # Should return None and hand the session back to the pool
         assert result is None
-        mock_mail.logout.assert_called_once()
+        mock_mail.logout.assert_not_called()
+        assert imap_pool.stats()["servers"]["imap.gmail.com:993"]["idle"] == 1
 
-    @patch("backend.services.email_service.imaplib.IMAP4_SSL")
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
     def test_fetch_email_by_id_with_attachment(self, mock_imap):
         """Test fetch_email_by_id skips attachments in multipart email"""
         mock_mail = Mock()
@@ -776,3 +915,431 @@ class TestEmailService:
         result = EmailService.fetch_email_by_id("user", "pass", "<attach@test.com>")
         assert result is not None
         assert result["body"] == "Text content"
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_incremental_uid_search(self, mock_imap):
+        """Test that a matching sync state searches only UIDs above last_uid"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"41 42 43")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"777"])
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        msg["From"] = "test@test.com"
+        msg["Message-ID"] = "<test@test.com>"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        emails = EmailService.fetch_recent_emails(
+            "user@test.com",
+            "pass",
+            sync_state={"uidvalidity": 777, "last_uid": 41},
+        )
+
+        mock_mail.search.assert_called_once_with(None, "UID 42:*")
+        # UID 41 is echoed back by "n:*" semantics and must be dropped
+        assert [e["uid"] for e in emails] == [42, 43]
+        assert all(e["uidvalidity"] == 777 for e in emails)
+        assert all(e["folder"] == "inbox" for e in emails)
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_uidvalidity_changed_uses_date_window(self, mock_imap):
+        """Test that a stale UIDVALIDITY falls back to the SINCE search"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"900"])
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        msg["Message-ID"] = "<test@test.com>"
+        mock_mail.fetch.return_value = ("OK", [(b"", msg.as_bytes())])
+
+        emails = EmailService.fetch_recent_emails(
+            "user@test.com",
+            "pass",
+            sync_state={"uidvalidity": 777, "last_uid": 41},
+        )
+
+        criterion = mock_mail.search.call_args[0][1]
+        assert criterion.startswith("(SINCE")
+        assert emails[0]["uid"] == 1
+        assert emails[0]["uidvalidity"] == 900
+
+    @patch.dict(os.environ, {"EMAIL_BATCH_LIMIT": "2"}, clear=True)
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_incremental_batch_limit_keeps_oldest(self, mock_imap):
+        """Test that incremental sync catches up in UID order"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"11 12 13 14")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"5"])
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        emails = EmailService.fetch_recent_emails(
+            "user@test.com", "pass", sync_state={"uidvalidity": 5, "last_uid": 10}
+        )
+
+        assert [e["uid"] for e in emails] == [11, 12]
+
+    @patch.dict(os.environ, {"IMAP_PARTIAL_FETCH": "false"})
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_header_first_skips_processed_bodies(self, mock_imap):
+        """Test that bodies are only downloaded for Message-IDs not yet processed"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1 2")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"3"])
+
+        header_data = [
+            (
+                b"1 (UID 1 BODY[HEADER.FIELDS (MESSAGE-ID FROM SUBJECT DATE)] {60}",
+                b"Message-ID: <old@test.com>\r\nSubject: Old\r\nFrom: a@test.com\r\n\r\n",
+            ),
+            b")",
+            (
+                b"2 (UID 2 BODY[HEADER.FIELDS (MESSAGE-ID FROM SUBJECT DATE)] {60}",
+                b"Message-ID: <new@test.com>\r\nSubject: New\r\nFrom: b@test.com\r\n\r\n",
+            ),
+            b")",
+        ]
+        msg = MIMEText("New body")
+        msg["Subject"] = "New"
+        msg["Message-ID"] = "<new@test.com>"
+
+        def fetch(message_set, spec):
+            if "HEADER.FIELDS" in spec:
+                return ("OK", header_data)
+            return ("OK", [(b"2 (UID 2 BODY[] {10}", msg.as_bytes())])
+
+        mock_mail.fetch.side_effect = fetch
+        processed_filter = Mock(return_value={"<old@test.com>"})
+
+        emails = EmailService.fetch_recent_emails(
+            "user@test.com", "pass", processed_filter=processed_filter
+        )
+
+        processed_filter.assert_called_once_with(["<old@test.com>", "<new@test.com>"])
+        body_fetches = [
+            c for c in mock_mail.fetch.call_args_list if "HEADER" not in c[0][1]
+        ]
+        assert [c[0][0] for c in body_fetches] == ["2"]
+
+        by_id = {e["message_id"]: e for e in emails}
+        assert by_id["<old@test.com>"]["already_processed"] is True
+        assert by_id["<old@test.com>"]["uid"] == 1
+        assert by_id["<old@test.com>"]["body"] == ""
+        assert by_id["<new@test.com>"]["body"] == "New body"
+        assert "already_processed" not in by_id["<new@test.com>"]
+        # Header-only entries are interleaved in UID order
+        assert [e["uid"] for e in emails] == [1, 2]
+
+    @patch.dict(
+        os.environ, {"IMAP_FETCH_CHUNK_SIZE": "1", "IMAP_PARTIAL_FETCH": "false"}
+    )
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_iter_recent_emails_is_lazy(self, mock_imap):
+        """Test that messages are yielded before later chunks are downloaded"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1 2 3")
+        msg = MIMEText("Body")
+        msg["Subject"] = "Streamed"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        stream = EmailService.iter_recent_emails("user@test.com", "pass")
+        first = next(stream)
+
+        assert first["uid"] == 1
+        assert mock_mail.fetch.call_count == 1
+        assert [e["uid"] for e in stream] == [2, 3]
+        assert mock_mail.fetch.call_count == 3
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_iter_recent_emails_closed_early_returns_session(self, mock_imap):
+        """Test that abandoning the stream hands the session back to the pool"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1 2")
+        msg = MIMEText("Body")
+        msg["Subject"] = "Streamed"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        stream = EmailService.iter_recent_emails("user@test.com", "pass")
+        next(stream)
+        stream.close()
+
+        mock_mail.shutdown.assert_not_called()
+        assert imap_pool.stats()["servers"]["imap.gmail.com:993"]["idle"] == 1
+
+    def test_format_uid_set_collapses_ranges(self):
+        """Test that contiguous UIDs are sent as ranges"""
+        assert EmailService._format_uid_set([b"9", b"1", b"2", b"3", b"7", b"10"]) == (
+            "1:3,7,9:10"
+        )
+
+    def test_iter_fetch_response_uid_after_literal(self):
+        """Test that a UID reported after the literal is still matched"""
+        data = [
+            (b"1 (BODY[] {3}", b"one"),
+            b" UID 11)",
+            (b"2 (UID 12 BODY[] {3}", b"two"),
+            b")",
+        ]
+        assert list(EmailService._iter_fetch_response(data)) == [
+            (11, b"one"),
+            (12, b"two"),
+        ]
+
+    @patch.dict(
+        os.environ,
+        {"IMAP_FETCH_CHUNK_SIZE": "3", "IMAP_PARTIAL_FETCH": "false"},
+        clear=True,
+    )
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_respects_chunk_size(self, mock_imap):
+        """Test that bodies are requested in IMAP_FETCH_CHUNK_SIZE batches"""
+        email_ids = b" ".join([str(i).encode() for i in range(1, 8)])
+        mock_mail = self._setup_mock_imap(mock_imap, email_ids)
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        mock_mail.fetch.side_effect = self._multi_fetch(msg.as_bytes())
+
+        emails = EmailService.fetch_recent_emails("user@test.com", "pass")
+
+        assert [e["uid"] for e in emails] == list(range(1, 8))
+        requested = [c[0][0] for c in mock_mail.fetch.call_args_list]
+        assert requested == ["1:3", "4:6", "7"]
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_fetch_emails_chunk_failure_retries_singly(self, mock_imap):
+        """Test that a failed chunk is retried one message at a time"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1 2 3")
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        answer = self._multi_fetch(msg.as_bytes())
+
+        def fetch(message_set, spec):
+            if message_set in ("1:3", b"2"):
+                raise Exception("Fetch failed")
+            return answer(message_set, spec)
+
+        mock_mail.fetch.side_effect = fetch
+
+        emails = EmailService.fetch_recent_emails("user@test.com", "pass")
+
+        assert [e["uid"] for e in emails] == [1, 3]
+
+    @patch.dict(os.environ, {"IMAP_PARTIAL_FETCH": "false"})
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_unfetched_uid_is_reported(self, mock_imap):
+        """Test a UID whose FETCH fails mid-range comes back flagged, not dropped"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"11 12 13")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"7"])
+
+        msg = MIMEText("Test")
+        msg["Subject"] = "Test"
+        answer = self._multi_fetch(msg.as_bytes())
+
+        def fetch(message_set, spec):
+            if message_set in ("11:13", b"12"):
+                raise Exception("Fetch failed")
+            return answer(message_set, spec)
+
+        mock_mail.fetch.side_effect = fetch
+
+        emails = list(
+            EmailService.iter_recent_emails(
+                "user@test.com", "pass", sync_state={"uidvalidity": 7, "last_uid": 10}
+            )
+        )
+
+        assert [(e["uid"], bool(e.get("fetch_failed"))) for e in emails] == [
+            (11, False),
+            (12, True),
+            (13, False),
+        ]
+        assert emails[1]["uidvalidity"] == 7
+        assert emails[1]["account_email"] == "user@test.com"
+
+    def _receipt_with_attachment(self):
+        """multipart/mixed: alternative(plain QP, html base64) + PDF attachment"""
+        from email.mime.application import MIMEApplication
+        from email.mime.multipart import MIMEMultipart
+
+        alternative = MIMEMultipart("alternative")
+        alternative.attach(MIMEText("Total café $12.00", "plain", "utf-8"))
+        alternative.attach(MIMEText("<p>Total <b>$12.00</b></p>", "html", "utf-8"))
+        alternative.get_payload(0).replace_header(
+            "Content-Transfer-Encoding", "quoted-printable"
+        )
+        alternative.get_payload(0).set_payload("Total caf=C3=A9 $12.00")
+        pdf = MIMEApplication(b"%PDF-1.4" * 1000, "pdf")
+        pdf.add_header("Content-Disposition", "attachment", filename="invoice.pdf")
+
+        msg = MIMEMultipart("mixed")
+        msg["Subject"] = "Your receipt"
+        msg["From"] = "orders@shop.com"
+        msg["Message-ID"] = "<r1@shop.com>"
+        msg.attach(alternative)
+        msg.attach(pdf)
+
+        structure = (
+            b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 22 1 '
+            b'NIL NIL NIL NIL)("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 40 '
+            b'1 NIL NIL NIL NIL) "ALTERNATIVE" NIL NIL NIL NIL)("APPLICATION" "PDF" '
+            b'NIL NIL NIL "BASE64" 10000 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf"))'
+            b' NIL NIL) "MIXED" NIL NIL NIL NIL'
+        )
+        sections = {
+            "1.1": alternative.get_payload(0).get_payload().encode(),
+            "1.2": alternative.get_payload(1).get_payload().encode(),
+        }
+        return msg, structure, sections
+
+    def _partial_fetch(self, msg, structure, sections):
+        """FETCH side effect answering BODYSTRUCTURE and section requests"""
+        header = "".join(f"{k}: {v}\r\n" for k, v in msg.items()).encode() + b"\r\n"
+        full = self._multi_fetch(msg.as_bytes())
+
+        def fetch(message_set, spec):
+            uid = int(message_set)
+            if "BODYSTRUCTURE" in spec:
+                return (
+                    "OK",
+                    [b"%d (UID %d BODYSTRUCTURE (%s))" % (uid, uid, structure)],
+                )
+            if "BODY[]" in spec:
+                return full(message_set, spec)
+            data = [
+                (
+                    b"%d (UID %d BODY[HEADER.FIELDS (X)] {%d}"
+                    % (uid, uid, len(header)),
+                    header,
+                )
+            ]
+            for section, payload in sections.items():
+                data.append((f" BODY[{section}] {{{len(payload)}}}".encode(), payload))
+            return ("OK", data + [b")"])
+
+        return fetch
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_partial_fetch_skips_attachments(self, mock_imap):
+        """Test that only text sections are downloaded and parse identically"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1")
+        msg, structure, sections = self._receipt_with_attachment()
+        mock_mail.fetch.side_effect = self._partial_fetch(msg, structure, sections)
+
+        emails = EmailService.fetch_recent_emails("user@test.com", "pass")
+
+        specs = [c[0][1] for c in mock_mail.fetch.call_args_list]
+        assert specs[0] == "(UID BODYSTRUCTURE)"
+        assert "BODY.PEEK[1.1] BODY.PEEK[1.2])" in specs[1]
+        assert not any("BODY[]" in spec for spec in specs)
+
+        expected = EmailService._parse_message(msg.as_bytes())
+        assert len(emails) == 1
+        for key in ("message_id", "from", "subject", "body", "html_body"):
+            assert emails[0][key] == expected[key]
+        assert emails[0]["body"] == "Total café $12.00"
+
+    @patch.dict(os.environ, {"IMAP_BODY_BYTE_CAP": "4096"})
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_partial_fetch_byte_cap(self, mock_imap):
+        """Test that IMAP_BODY_BYTE_CAP requests a truncated range per section"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1")
+        msg, structure, sections = self._receipt_with_attachment()
+        mock_mail.fetch.side_effect = self._partial_fetch(msg, structure, sections)
+
+        EmailService.fetch_recent_emails("user@test.com", "pass")
+
+        spec = mock_mail.fetch.call_args_list[1][0][1]
+        assert "BODY.PEEK[1.1]<0.4096> BODY.PEEK[1.2]<0.4096>" in spec
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_partial_fetch_missing_section_falls_back_to_full_body(self, mock_imap):
+        """Test that a message missing a planned section is fetched whole"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"1")
+        msg, structure, sections = self._receipt_with_attachment()
+        del sections["1.2"]
+        mock_mail.fetch.side_effect = self._partial_fetch(msg, structure, sections)
+
+        emails = EmailService.fetch_recent_emails("user@test.com", "pass")
+
+        specs = [c[0][1] for c in mock_mail.fetch.call_args_list]
+        assert specs[-1] == "(UID BODY[])"
+        assert emails[0]["html_body"] == "<p>Total <b>$12.00</b></p>"
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_search_profile_gmail_combined_with_uid_range(self, mock_imap):
+        """Test that a Gmail profile is ANDed with the incremental UID range"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"")
+        mock_mail.capabilities = ("IMAP4REV1", "X-GM-EXT-1")
+        mock_mail.response.return_value = ("UIDVALIDITY", [b"7"])
+
+        EmailService.fetch_recent_emails(
+            "user@gmail.com",
+            "pass",
+            sync_state={"uidvalidity": 7, "last_uid": 40},
+            search_profile={"exclude_categories": ["promotions"]},
+        )
+
+        mock_mail.search.assert_called_once_with(
+            None, 'UID 41:* X-GM-RAW "-category:promotions"'
+        )
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_search_profile_standard_imap_with_date_window(self, mock_imap):
+        """Test that non-Gmail servers get standard SEARCH keys"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"")
+        mock_mail.capabilities = ("IMAP4REV1",)
+
+        EmailService.fetch_recent_emails(
+            "user@icloud.com",
+            "pass",
+            "imap.mail.me.com",
+            search_profile={"exclude_from": ["news@shop.com"]},
+        )
+
+        criterion = mock_mail.search.call_args[0][1]
+        assert criterion.startswith('(SINCE "')
+        assert criterion.endswith(' NOT FROM "news@shop.com"')
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_search_profile_rejected_falls_back_to_window(self, mock_imap):
+        """Test that a server rejecting the profile is searched without it"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"")
+        mock_mail.capabilities = ("IMAP4REV1",)
+        mock_mail.search.side_effect = [Exception("BAD"), ("OK", [b""])]
+
+        EmailService.fetch_recent_emails(
+            "user@example.com",
+            "pass",
+            "imap.example.com",
+            search_profile={"imap_raw": "X-UNKNOWN"},
+        )
+
+        criteria = [c[0][1] for c in mock_mail.search.call_args_list]
+        assert criteria[0].endswith(" X-UNKNOWN")
+        assert criteria[1].startswith('(SINCE "') and "X-UNKNOWN" not in criteria[1]
+
+    @patch("backend.services.imap_pool.imaplib.IMAP4_SSL")
+    def test_search_profile_ignored_with_custom_criterion(self, mock_imap):
+        """Test that an explicit search_criterion is used verbatim"""
+        mock_mail = self._setup_mock_imap(mock_imap, b"")
+
+        EmailService.fetch_recent_emails(
+            "user@gmail.com",
+            "pass",
+            search_criterion="ALL",
+            search_profile={"unseen_only": True},
+        )
+
+        mock_mail.search.assert_called_once_with(None, "ALL")
+
+    @patch.dict(
+        os.environ,
+        {
+            "EMAIL_ACCOUNTS": '[{"email":"a@gmail.com","password":"p",'
+            '"search_profile":{"unseen_only":true}}]'
+        },
+        clear=True,
+    )
+    def test_get_all_accounts_keeps_search_profile(self):
+        """Test that a per-account search profile is read from EMAIL_ACCOUNTS"""
+        accounts = EmailService.get_all_accounts()
+        assert accounts[0]["search_profile"] == {"unseen_only": True}
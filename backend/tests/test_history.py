@@ -4,6 +4,7 @@ from unittest.mock import patch
 import pytest
 from backend.models import ProcessedEmail, ProcessingRun
 from backend.routers import history
+from backend.services.detector import DetectionResult
 from sqlmodel import Session, SQLModel, create_engine, select
 from sqlmodel.pool import StaticPool
 
@@ -626,10 +627,8 @@ class TestHistoryReprocess:
         # Mock dependencies
         monkeypatch.setenv("WIFE_EMAIL", "wife@example.com")
         with patch(
-            "backend.services.detector.ReceiptDetector.is_receipt", return_value=True
-        ), patch(
-            "backend.services.detector.ReceiptDetector.categorize_receipt",
-            return_value="Shopping",
+            "backend.services.detector.ReceiptDetector.detect",
+            return_value=DetectionResult(is_receipt=True, category="Shopping"),
         ), patch(
             "backend.services.forwarder.EmailForwarder.forward_email", return_value=True
         ):
@@ -660,7 +659,8 @@ class TestHistoryReprocess:
         session.commit()
 
         with patch(
-            "backend.services.detector.ReceiptDetector.is_receipt", return_value=True
+            "backend.services.detector.ReceiptDetector.detect",
+            return_value=DetectionResult(is_receipt=True, category="Shopping"),
         ), patch(
             "backend.services.forwarder.EmailForwarder.forward_email", return_value=True
         ):
@@ -800,16 +800,49 @@ class TestHistoryReprocess:
             return_value=mock_fetched,
         ), patch(
             "backend.services.detector.ReceiptDetector.debug_is_receipt",
-            return_value={"final_decision": True},
-        ), patch(
-            "backend.services.detector.ReceiptDetector.categorize_receipt",
-            return_value="shopping",
+            return_value={"final_decision": True, "category": "shopping"},
         ):
             result = reprocess_email(email_id=email.id, session=session)
 
             assert result["suggested_status"] == "forwarded"
             assert result["category"] == "shopping"
 
+    def test_reprocess_email_imap_fallback_uses_stored_location(self, session: Session):
+        """Test that the recorded UID location is passed to the IMAP fallback"""
+        email = ProcessedEmail(
+            email_id="<located@example.com>",
+            subject="Located",
+            sender="test@example.com",
+            status="ignored",
+            account_email="test@example.com",
+            imap_folder="inbox",
+            imap_uidvalidity=7,
+            imap_uid=42,
+        )
+        session.add(email)
+        session.commit()
+
+        from backend.routers.history import reprocess_email
+
+        assert email.id is not None
+        with patch(
+            "backend.services.email_service.EmailService.get_credentials_for_account",
+            return_value=MOCK_IMAP_CREDENTIALS,
+        ), patch(
+            "backend.services.email_service.EmailService.fetch_email_by_id",
+            return_value={"body": "Fetched", "html_body": ""},
+        ) as mock_fetch, patch(
+            "backend.services.detector.ReceiptDetector.debug_is_receipt",
+            return_value={"final_decision": False},
+        ):
+            reprocess_email(email_id=email.id, session=session)
+
+        assert mock_fetch.call_args.kwargs["location"] == {
+            "folder": "inbox",
+            "uidvalidity": 7,
+            "uid": 42,
+        }
+
     def test_submit_feedback_email_not_found(self, session: Session):
         """Test submitting feedback for a non-existent email"""
         from backend.routers.history import submit_feedback
@@ -0,0 +1,95 @@
+import json
+import os
+from unittest.mock import patch
+
+from backend.services.identity import (
+    DEFAULT_WIFE_EMAIL,
+    IdentityRegistry,
+    get_identity_registry,
+    normalize_address,
+    reload_identity_registry,
+)
+
+
+def test_normalize_address():
+    """Test display names, case and sub-address tags are stripped"""
+    assert normalize_address("Me <Me+Shop@Example.com>") == "me@example.com"
+    assert normalize_address("  me@example.com ") == "me@example.com"
+    assert normalize_address('"A <b>" <a@example.com>') == "a@example.com"
+    assert normalize_address("<broken@example.com") == "broken@example.com"
+    assert normalize_address("") == ""
+    assert normalize_address(None) == ""
+
+
+def test_is_own_matches_whole_addresses_only():
+    """Test a sender is ours only when its address is, not when it contains one"""
+    registry = IdentityRegistry(["me@example.com"])
+
+    assert registry.is_own("me@example.com")
+    assert registry.is_own("Me <ME@example.com>")
+    assert registry.is_own("me+receipts@example.com")
+    assert not registry.is_own("notme@example.com")
+    assert not registry.is_own("me@example.com.evil.net")
+    assert not registry.is_own("")
+
+
+def test_from_env_collects_addresses():
+    """Test every configured account, recipient and alias is included"""
+    accounts = [
+        {"email": "Multi@Example.com", "password": "p"},
+        {"email": "other@example.com", "password": "p"},
+    ]
+    env = {
+        "WIFE_EMAIL": "wife@example.com",
+        "GMAIL_EMAIL": "gmail@example.com",
+        "ICLOUD_EMAIL": "icloud@example.com",
+        "SENDER_EMAIL": "sender@example.com",
+        "EMAIL_ACCOUNTS": json.dumps(accounts),
+        "EMAIL_ALIASES": "alias@example.com, Alias2@Example.com,,",
+    }
+    with patch.dict(os.environ, env):
+        registry = IdentityRegistry.from_env()
+
+    assert registry.addresses == {
+        "wife@example.com",
+        "gmail@example.com",
+        "icloud@example.com",
+        "sender@example.com",
+        "multi@example.com",
+        "other@example.com",
+        "alias@example.com",
+        "alias2@example.com",
+    }
+
+
+def test_from_env_defaults_wife_email():
+    """Test the placeholder recipient applies when WIFE_EMAIL is unset"""
+    with patch.dict(os.environ, {"WIFE_EMAIL": ""}):
+        registry = IdentityRegistry.from_env()
+    assert DEFAULT_WIFE_EMAIL in registry.addresses
+
+
+@patch("backend.services.identity.EmailService.get_all_accounts")
+def test_registry_parses_accounts_once(mock_get_accounts):
+    """Test lookups reuse the registry until it is reloaded"""
+    mock_get_accounts.return_value = [{"email": "acc@example.com"}]
+    reload_identity_registry()
+
+    for _ in range(5):
+        assert get_identity_registry().is_own("acc@example.com")
+    assert mock_get_accounts.call_count == 1
+
+    mock_get_accounts.return_value = []
+    registry = reload_identity_registry()
+    assert not registry.is_own("acc@example.com")
+    assert get_identity_registry() is registry
+
+
+def test_fingerprint_follows_addresses():
+    """Test the fingerprint ignores order and changes with the address set"""
+    first = IdentityRegistry(["a@example.com", "b@example.com"])
+    same = IdentityRegistry(["B@example.com", "a@example.com"])
+    other = IdentityRegistry(["a@example.com"])
+
+    assert first.fingerprint == same.fingerprint
+    assert first.fingerprint != other.fingerprint
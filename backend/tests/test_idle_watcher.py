@@ -0,0 +1,153 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from backend.services import idle_watcher
+from backend.services.idle_watcher import (
+    IdleNotSupported,
+    IdleWatcher,
+    idle_enabled,
+    start_idle_watchers,
+    stop_idle_watchers,
+)
+
+ACCOUNT = {"email": "user@example.com", "password": "pw"}
+
+
+def _watcher_with_lines(lines):
+    """Builds a watcher whose socket reads replay `lines` (None = timeout)."""
+    watcher = IdleWatcher(ACCOUNT, MagicMock(), idle_timeout=1)
+    watcher._mail = MagicMock()
+    watcher._read_line = MagicMock(side_effect=lines)
+    return watcher
+
+
+def test_idle_enabled_env():
+    with patch.dict(os.environ, {"IMAP_IDLE_ENABLED": "true"}):
+        assert idle_enabled()
+    with patch.dict(os.environ, {"IMAP_IDLE_ENABLED": ""}):
+        assert not idle_enabled()
+
+
+def test_wait_for_new_mail_on_exists():
+    watcher = _watcher_with_lines(
+        [b"+ idling", b"* 5 EXISTS", b"IDLE1 OK IDLE terminated"]
+    )
+
+    assert watcher._wait_for_new_mail() is True
+    sent = [c[0][0] for c in watcher._mail.send.call_args_list]
+    assert sent == [b"IDLE1 IDLE\r\n", b"DONE\r\n"]
+
+
+def test_wait_for_new_mail_refreshes_on_timeout():
+    watcher = _watcher_with_lines([b"+ idling", None, b"IDLE1 OK IDLE terminated"])
+
+    assert watcher._wait_for_new_mail() is False
+    assert watcher._mail.send.call_args_list[-1][0][0] == b"DONE\r\n"
+
+
+def test_wait_for_new_mail_ignores_other_untagged():
+    watcher = _watcher_with_lines(
+        [b"+ idling", b"* 3 EXPUNGE", b"* 4 EXISTS", b"IDLE1 OK done"]
+    )
+
+    assert watcher._wait_for_new_mail() is True
+
+
+def test_wait_for_new_mail_untagged_before_continuation():
+    """Test untagged lines before "+ idling" are skipped, and EXISTS counts"""
+    watcher = _watcher_with_lines(
+        [b"* 7 EXISTS", b"* 1 RECENT", b"+ idling", b"IDLE1 OK IDLE terminated"]
+    )
+
+    assert watcher._wait_for_new_mail() is True
+    sent = [c[0][0] for c in watcher._mail.send.call_args_list]
+    assert sent == [b"IDLE1 IDLE\r\n", b"DONE\r\n"]
+
+
+def test_wait_for_new_mail_rejected():
+    watcher = _watcher_with_lines([b"IDLE1 BAD unknown command"])
+
+    try:
+        watcher._wait_for_new_mail()
+        assert False, "expected an IMAP error"
+    except Exception as e:
+        assert "IDLE rejected" in str(e)
+
+
+@patch("backend.services.idle_watcher.imaplib.IMAP4_SSL")
+def test_connect_requires_idle_capability(mock_imap):
+    mock_imap.return_value.capabilities = ("IMAP4REV1",)
+    watcher = IdleWatcher(ACCOUNT, MagicMock(), idle_timeout=1)
+
+    try:
+        watcher._connect()
+        assert False, "expected IdleNotSupported"
+    except IdleNotSupported:
+        pass
+
+
+@patch("backend.services.idle_watcher.imaplib.IMAP4_SSL")
+def test_run_exits_without_idle_support(mock_imap):
+    mock_imap.return_value.capabilities = ("IMAP4REV1",)
+    on_new_mail = MagicMock()
+    watcher = IdleWatcher(ACCOUNT, on_new_mail, idle_timeout=1)
+
+    watcher.run()  # Returns instead of retrying forever
+
+    on_new_mail.assert_not_called()
+    mock_imap.return_value.logout.assert_called_once()
+
+
+@patch("backend.services.idle_watcher.imaplib.IMAP4_SSL")
+def test_run_notifies_and_checks_pending_mail(mock_imap):
+    mail = mock_imap.return_value
+    mail.capabilities = ("IMAP4REV1", "IDLE")
+    # EXISTS after SELECT is discarded; NOOP after the catch-up poll reports
+    # nothing, after the pushed mail one more, then none
+    mail.response.side_effect = [
+        ("EXISTS", [b"3"]),
+        ("EXISTS", [None]),
+        ("EXISTS", [b"4"]),
+        ("EXISTS", [None]),
+    ]
+    on_new_mail = MagicMock()
+    watcher = IdleWatcher(ACCOUNT, on_new_mail, idle_timeout=1)
+
+    def wait_once():
+        if on_new_mail.call_count > 1:
+            watcher._stop_event.set()
+            return False
+        return True
+
+    with patch.object(watcher, "_wait_for_new_mail", side_effect=wait_once):
+        watcher.run()
+
+    # Catch-up poll on connect, the pushed mail, and the mail found by NOOP
+    assert on_new_mail.call_count == 3
+    on_new_mail.assert_called_with(ACCOUNT)
+    mail.select.assert_called_once_with("inbox", readonly=True)
+
+
+def test_notify_swallows_errors():
+    on_new_mail = MagicMock(side_effect=RuntimeError("boom"))
+    watcher = IdleWatcher(ACCOUNT, on_new_mail, idle_timeout=1)
+
+    watcher._notify()  # Should not raise
+
+    on_new_mail.assert_called_once_with(ACCOUNT)
+
+
+@patch("backend.services.idle_watcher.IdleWatcher.start")
+def test_start_and_stop_idle_watchers(mock_start):
+    accounts = [ACCOUNT, {"email": "nopass@example.com", "password": None}]
+
+    start_idle_watchers(accounts, MagicMock())
+
+    assert mock_start.call_count == 1
+    assert len(idle_watcher._watchers) == 1
+    watcher = idle_watcher._watchers[0]
+
+    stop_idle_watchers()
+
+    assert watcher.stopped
+    assert idle_watcher._watchers == []
@@ -0,0 +1,103 @@
+from backend.services.imap_bodystructure import (
+    decode_section,
+    iter_section_response,
+    parse_bodystructures,
+    plan_text_sections,
+)
+
+RECEIPT_STRUCTURE = (
+    b'12 (UID 12 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL '
+    b'"QUOTED-PRINTABLE" 120 4 NIL NIL NIL NIL)("TEXT" "HTML" ("CHARSET" "utf-8") '
+    b'NIL NIL "BASE64" 2400 31 NIL NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "b1") '
+    b'NIL NIL NIL)("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" '
+    b'2048000 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL NIL) "MIXED" '
+    b'("BOUNDARY" "b0") NIL NIL NIL))'
+)
+
+
+def test_plan_skips_attachments():
+    structures = parse_bodystructures([RECEIPT_STRUCTURE])
+
+    assert list(structures) == [12]
+    assert plan_text_sections(structures[12]) == [
+        ("1.1", "plain", "quoted-printable"),
+        ("1.2", "html", "base64"),
+    ]
+
+
+def test_plan_skips_text_attachment_and_descends_into_rfc822():
+    data = [
+        b'3 (UID 3 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 10 1 NIL NIL '
+        b'NIL NIL)("TEXT" "PLAIN" NIL NIL NIL "7BIT" 10 1 NIL ("attachment" NIL) '
+        b'NIL NIL)("MESSAGE" "RFC822" NIL NIL NIL "7BIT" 300 (NIL "Fwd" NIL NIL '
+        b'NIL NIL NIL NIL NIL NIL) ("TEXT" "HTML" NIL NIL NIL "7BIT" 40 2 NIL NIL '
+        b'NIL NIL) 12 NIL ("ATTACHMENT" NIL) NIL NIL) "MIXED" ("BOUNDARY" "x") NIL '
+        b"NIL NIL))"
+    ]
+
+    structure = parse_bodystructures(data)[3]
+
+    assert plan_text_sections(structure) == [
+        ("1", "plain", "7bit"),
+        ("3.1", "html", "7bit"),
+    ]
+
+
+def test_plan_single_part_message():
+    data = [
+        b'7 (UID 7 BODYSTRUCTURE ("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL '
+        b'"7BIT" 512 10 NIL NIL NIL NIL))'
+    ]
+
+    assert plan_text_sections(parse_bodystructures(data)[7]) == [("1", "html", "7bit")]
+
+
+def test_parse_handles_literal_strings():
+    data = [
+        (
+            b'5 (UID 5 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1 NIL '
+            b'NIL NIL NIL)("APPLICATION" "PDF" ("NAME" {9}',
+            b"r\xc3\xa9cu.pdf",
+        ),
+        b') NIL NIL "BASE64" 900 NIL ("ATTACHMENT" NIL) NIL NIL) "MIXED" NIL NIL '
+        b"NIL NIL))",
+    ]
+
+    structure = parse_bodystructures(data)[5]
+
+    assert plan_text_sections(structure) == [("1", "plain", "7bit")]
+
+
+def test_unparseable_response_is_skipped():
+    data = [(b"1 (UID 1 BODY[] {5}", b"hello"), b")"]
+
+    assert parse_bodystructures(data) == {}
+
+
+def test_iter_section_response():
+    data = [
+        (
+            b"4 (UID 4 BODY[HEADER.FIELDS (MESSAGE-ID)] {20}",
+            b"Message-ID: <a@b>\r\n\r\n",
+        ),
+        (b" BODY[1.1]<0> {5}", b"hello"),
+        (b" BODY[1.2] {6}", b"<p>hi"),
+        b")",
+        (b"9 (BODY[HEADER.FIELDS (MESSAGE-ID)] {4}", b"\r\n\r\n"),
+        (b" BODY[1] {3}", b"abc"),
+        b" UID 9)",
+    ]
+
+    results = list(iter_section_response(data))
+
+    assert [uid for uid, _ in results] == [4, 9]
+    assert results[0][1]["1.1"] == b"hello"
+    assert results[0][1]["1.2"] == b"<p>hi"
+    assert "HEADER.FIELDS (MESSAGE-ID)" in results[0][1]
+    assert results[1][1]["1"] == b"abc"
+
+
+def test_decode_section():
+    assert decode_section(b"aGVsbG8=", "base64") == b"hello"
+    assert decode_section(b"caf=C3=A9", "quoted-printable") == "café".encode()
+    assert decode_section(b"plain", "7bit") == b"plain"
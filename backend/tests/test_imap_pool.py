@@ -0,0 +1,193 @@
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from backend.services.imap_pool import ImapConnectionPool, ImapPoolExhausted
+
+
+def _pool(**kwargs):
+    options = {
+        "max_per_server": 2,
+        "keepalive_interval": 60,
+        "max_idle": 600,
+        "wait_timeout": 0.05,
+    }
+    options.update(kwargs)
+    return ImapConnectionPool(**options)
+
+
+@pytest.fixture(name="mock_imap")
+def mock_imap_fixture():
+    with patch("backend.services.imap_pool.imaplib.IMAP4_SSL") as mock_imap:
+        mock_imap.side_effect = lambda *args, **kwargs: Mock(
+            noop=Mock(return_value=("OK", [b""]))
+        )
+        yield mock_imap
+
+
+def test_connection_is_reused(mock_imap):
+    pool = _pool()
+
+    with pool.connection("a@example.com", "pw") as first:
+        pass
+    with pool.connection("A@example.com", "pw") as second:
+        pass
+
+    assert first is second
+    assert mock_imap.call_count == 1
+    first.login.assert_called_once_with("a@example.com", "pw")
+    assert pool.stats()["created"] == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_new_password_gets_its_own_session(mock_imap):
+    """Test a pooled session is never handed out for a different password"""
+    pool = _pool()
+
+    with pool.connection("a@example.com", "old") as first:
+        pass
+    with pool.connection("a@example.com", "new") as second:
+        pass
+
+    assert first is not second
+    second.login.assert_called_once_with("a@example.com", "new")
+
+
+def test_connection_discarded_after_error(mock_imap):
+    pool = _pool()
+
+    with pytest.raises(RuntimeError):
+        with pool.connection("a@example.com", "pw") as mail:
+            raise RuntimeError("socket closed")
+
+    mail.shutdown.assert_called_once()
+    stats = pool.stats()
+    assert stats["discarded"] == 1
+    assert stats["servers"]["imap.gmail.com:993"]["open"] == 0
+
+
+def test_generator_exit_keeps_session(mock_imap):
+    pool = _pool()
+
+    def stream():
+        with pool.connection("a@example.com", "pw"):
+            yield 1
+            yield 2
+
+    items = stream()
+    next(items)
+    items.close()
+
+    assert pool.stats()["discarded"] == 0
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["idle"] == 1
+
+
+def test_login_failure_frees_slot(mock_imap):
+    mock_imap.side_effect = lambda *args, **kwargs: Mock(
+        login=Mock(side_effect=Exception("auth failed"))
+    )
+    pool = _pool(max_per_server=1)
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="auth failed"):
+            with pool.connection("a@example.com", "bad"):
+                pass
+
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["open"] == 0
+
+
+def test_stale_session_replaced(mock_imap):
+    pool = _pool(keepalive_interval=0.001)
+
+    with pool.connection("a@example.com", "pw") as first:
+        first.noop.return_value = ("BYE", [b"timeout"])
+    time.sleep(0.01)
+
+    with pool.connection("a@example.com", "pw") as second:
+        pass
+
+    assert second is not first
+    assert pool.stats()["stale"] == 1
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["open"] == 1
+
+
+def test_fresh_session_skips_noop(mock_imap):
+    pool = _pool()
+
+    with pool.connection("a@example.com", "pw") as mail:
+        pass
+    with pool.connection("a@example.com", "pw"):
+        pass
+
+    mail.noop.assert_not_called()
+
+
+def test_cap_evicts_idle_session_of_other_account(mock_imap):
+    pool = _pool(max_per_server=1)
+
+    with pool.connection("a@example.com", "pw") as first:
+        pass
+    with pool.connection("b@example.com", "pw") as second:
+        pass
+
+    assert second is not first
+    first.logout.assert_called_once()
+    assert pool.stats()["evicted"] == 1
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["open"] == 1
+
+
+def test_cap_exhausted_while_borrowed(mock_imap):
+    pool = _pool(max_per_server=1)
+
+    with pool.connection("a@example.com", "pw"):
+        with pytest.raises(ImapPoolExhausted):
+            with pool.connection("b@example.com", "pw"):
+                pass
+
+    assert pool.stats()["waits"] >= 1
+
+
+def test_cap_is_per_server(mock_imap):
+    pool = _pool(max_per_server=1)
+
+    with pool.connection("a@example.com", "pw", "imap.gmail.com"):
+        with pool.connection("b@icloud.com", "pw", "imap.mail.me.com"):
+            pass
+
+    assert mock_imap.call_count == 2
+
+
+def test_keepalive_noops_and_evicts(mock_imap):
+    pool = _pool()
+
+    with pool.connection("a@example.com", "pw") as kept:
+        pass
+    with pool.connection("b@example.com", "pw") as dead:
+        dead.noop.return_value = ("NO", [b""])
+
+    pool.keepalive()
+
+    kept.noop.assert_called_once()
+    dead.shutdown.assert_called_once()
+    assert pool.stats()["servers"]["imap.gmail.com:993"] == {
+        "open": 1,
+        "idle": 1,
+        "in_use": 0,
+    }
+
+    pool.max_idle = 0.000001
+    pool.keepalive()
+
+    kept.logout.assert_called_once()
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["open"] == 0
+
+
+def test_close_all(mock_imap):
+    pool = _pool()
+
+    with pool.connection("a@example.com", "pw") as mail:
+        pass
+    pool.close_all()
+
+    mail.logout.assert_called_once()
+    assert pool.stats()["servers"]["imap.gmail.com:993"]["open"] == 0
@@ -0,0 +1,48 @@
+from backend.services.keyword_matcher import KeywordMatcher
+
+CATEGORIES = {
+    "promo": ["sale", "off", "gift card"],
+    "receipt": ["receipt", "order total", "sale"],
+    "empty": [],
+}
+
+
+def _check_matcher(matcher):
+    hits = matcher.scan("Your receipt: office gift card, order total $5")
+
+    assert hits.has("promo")
+    assert hits.has("receipt")
+    assert not hits.has("empty")
+    assert not hits.has("unknown")
+    # Substring semantics: "off" matches inside "office"
+    assert hits.keywords("promo") == {"off", "gift card"}
+    assert hits.keywords("receipt") == {"receipt", "order total"}
+    # Case-sensitive, like `in`
+    assert not matcher.scan("BIG SALE").has("promo")
+    assert matcher.scan("big sale").keywords("receipt") == {"sale"}
+    assert not matcher.scan("").has("promo")
+
+
+def test_substring_backend():
+    matcher = KeywordMatcher(CATEGORIES, backend="substring")
+
+    assert matcher.backend == "substring"
+    _check_matcher(matcher)
+
+
+def test_ahocorasick_backend(monkeypatch):
+    # pyahocorasick is a requirement, so it is the default backend
+    monkeypatch.delenv("DETECTOR_KEYWORD_BACKEND", raising=False)
+    matcher = KeywordMatcher(CATEGORIES)
+
+    assert matcher.backend == "ahocorasick"
+    _check_matcher(matcher)
+
+
+def test_missing_accelerated_backend_falls_back(monkeypatch):
+    monkeypatch.setattr("backend.services.keyword_matcher.ahocorasick", None)
+
+    matcher = KeywordMatcher(CATEGORIES, backend="ahocorasick")
+
+    assert matcher.backend == "substring"
+    _check_matcher(matcher)
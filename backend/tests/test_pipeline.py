@@ -0,0 +1,78 @@
+import threading
+
+from backend.services.pipeline import Pipeline, Stage, StageStats
+
+
+def test_pipeline_passes_items_through_stages():
+    """Test every item reaches the last stage and stats count items per stage"""
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+    last = Stage("last", collect, workers=3)
+    first = Stage(
+        "first", lambda batch: [last.put(n * 10) for n in batch], item_size=len
+    )
+
+    with Pipeline([first, last]) as pipeline:
+        first.put([1, 2])
+        first.put([3])
+
+    assert sorted(results) == [10, 20, 30]
+    stats = pipeline.stats()
+    assert list(stats) == ["first", "last"]
+    assert stats["first"]["items"] == 3
+    assert stats["last"]["items"] == 3
+    assert stats["last"]["workers"] == 3
+
+
+def test_full_queue_blocks_producer():
+    """Test a slow stage holds back its producer instead of buffering everything"""
+    release = threading.Event()
+    stage = Stage("slow", lambda item: release.wait(5), queue_size=2)
+    stage.start()
+
+    producer = threading.Thread(target=lambda: [stage.put(i) for i in range(5)])
+    producer.start()
+    producer.join(0.3)
+    # One item in the handler, two queued, the producer stuck on the fourth
+    assert producer.is_alive()
+
+    release.set()
+    producer.join(5)
+    stage.close()
+
+    stats = stage.stats.to_dict()
+    assert stats["items"] == 5
+    assert stats["max_queue"] == 2
+    assert stats["wait_ms"] > 100
+
+
+def test_stage_reports_errors_and_continues():
+    """Test a failing item goes to on_error and the next items are still handled"""
+    handled, errors = [], []
+
+    def handler(item):
+        if item == "bad":
+            raise ValueError("boom")
+        handled.append(item)
+
+    stage = Stage(
+        "flaky", handler, on_error=lambda item, e: errors.append((item, str(e)))
+    )
+    with Pipeline([stage]):
+        for item in ("a", "bad", "b"):
+            stage.put(item)
+
+    assert handled == ["a", "b"]
+    assert errors == [("bad", "boom")]
+
+
+def test_stage_stats_without_items():
+    stats = StageStats(workers=2).to_dict()
+    assert stats["items"] == 0
+    assert stats["per_sec"] is None
+    assert stats["avg_queue"] == 0.0
@@ -0,0 +1,115 @@
+import pytest
+from backend.models import ProcessedEmail
+from backend.services.processed_writer import ProcessedEmailWriter
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    # A file database, so savepoints behave as they do in production
+    engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def count_commits(session):
+    commits = []
+    event.listen(session, "after_commit", lambda s: commits.append(1))
+    return commits
+
+
+def saved_ids(engine):
+    with Session(engine) as session:
+        return sorted(e.email_id for e in session.exec(select(ProcessedEmail)))
+
+
+def test_rows_are_committed_in_chunks(engine):
+    """Test rows are buffered and written one commit per chunk"""
+    with Session(engine) as session:
+        commits = count_commits(session)
+        writer = ProcessedEmailWriter(session, chunk_size=3)
+        for i in range(7):
+            writer.add(ProcessedEmail(email_id=f"m{i}"))
+
+        assert len(commits) == 2
+        assert len(saved_ids(engine)) == 6
+
+        writer.flush()
+        writer.flush()  # Nothing left to write
+
+    assert len(commits) == 3
+    assert saved_ids(engine) == [f"m{i}" for i in range(7)]
+    stats = writer.stats()
+    assert (stats["saved"], stats["failed"], stats["commits"]) == (7, 0, 3)
+    assert stats["db_ms"] > 0
+
+
+def test_failed_email_drops_only_its_rows(engine):
+    """Test an email that raises discards what it added, and nothing else"""
+    with Session(engine) as session:
+        writer = ProcessedEmailWriter(session, chunk_size=10)
+        with writer.email():
+            writer.add(ProcessedEmail(email_id="good"))
+        with pytest.raises(RuntimeError):
+            with writer.email():
+                writer.add(ProcessedEmail(email_id="bad"))
+                raise RuntimeError("SMTP error")
+        writer.flush()
+
+    assert saved_ids(engine) == ["good"]
+
+
+def test_email_block_flushes_once_complete(engine):
+    """Test a full chunk is written after the email that filled it, not during"""
+    with Session(engine) as session:
+        commits = count_commits(session)
+        writer = ProcessedEmailWriter(session, chunk_size=1)
+        with writer.email():
+            writer.add(ProcessedEmail(email_id="m1"))
+            assert commits == []
+        assert len(commits) == 1
+
+
+def test_bad_row_does_not_fail_its_chunk(engine):
+    """Test a row the database rejects is reported and the rest still saved"""
+    with Session(engine) as session:
+        session.add(ProcessedEmail(email_id="dup"))
+        session.commit()
+
+        errors = []
+        writer = ProcessedEmailWriter(
+            session,
+            chunk_size=10,
+            on_error=lambda source, e: errors.append((source, type(e).__name__)),
+        )
+        writer.add(ProcessedEmail(email_id="a"), {"subject": "a"})
+        writer.add(ProcessedEmail(email_id="dup"), {"subject": "dup"})
+        writer.add(ProcessedEmail(email_id="b"), {"subject": "b"})
+        writer.flush()
+
+    assert saved_ids(engine) == ["a", "b", "dup"]
+    assert errors == [({"subject": "dup"}, "IntegrityError")]
+    stats = writer.stats()
+    assert (stats["saved"], stats["failed"], stats["commits"]) == (2, 1, 1)
+
+
+def test_failed_commit_reports_every_row(engine):
+    """Test rows are reported as failed when their transaction cannot commit"""
+    with Session(engine) as session:
+        errors = []
+        writer = ProcessedEmailWriter(
+            session, on_error=lambda source, e: errors.append(source)
+        )
+        writer.add(ProcessedEmail(email_id="a"), "a")
+        writer.add(ProcessedEmail(email_id="b"), "b")
+
+        def fail():
+            raise RuntimeError("disk full")
+
+        session.commit = fail
+        writer.flush()
+
+    assert errors == ["a", "b"]
+    assert saved_ids(engine) == []
+    assert writer.stats()["failed"] == 2
@@ -0,0 +1,172 @@
+import fnmatch
+import itertools
+
+import pytest
+from backend.models import ManualRule, Preference
+from backend.services.rules_snapshot import (
+    RulesSnapshot,
+    bump_rules_version,
+    get_rules_snapshot,
+    get_rules_version,
+)
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _reference_match(rules, subject, sender):
+    """The original per-email loop: fnmatch over rules in priority order."""
+    for rule in rules:
+        if rule.email_pattern and not fnmatch.fnmatch(
+            sender, rule.email_pattern.lower()
+        ):
+            continue
+        if rule.subject_pattern and not fnmatch.fnmatch(
+            subject, rule.subject_pattern.lower()
+        ):
+            continue
+        return rule
+    return None
+
+
+def test_match_rule_agrees_with_fnmatch():
+    email_patterns = [
+        None,
+        "billing@shop.com",
+        "*@shop.com",
+        "*@SHOP.com",
+        "*shop*",
+        "*@*.shop.com",
+        "news?@shop.com",
+        "[bn]*@shop.com",
+        "*@a@shop.com",
+    ]
+    subject_patterns = [None, "*receipt*", "order #*"]
+    rules = [
+        ManualRule(id=i, email_pattern=e, subject_pattern=s, priority=i % 3)
+        for i, (e, s) in enumerate(itertools.product(email_patterns, subject_patterns))
+    ]
+    ordered = sorted(rules, key=lambda r: (-r.priority, r.id))
+    snapshot = RulesSnapshot(ordered, [], [])
+
+    senders = [
+        "billing@shop.com",
+        "news1@shop.com",
+        "x@a@shop.com",
+        "sales@eu.shop.com",
+        "shop <billing@shop.com>",
+        "nobody@other.com",
+        "no-at-sign",
+        "",
+    ]
+    subjects = ["your receipt", "order #12", "hello", ""]
+    for sender, subject in itertools.product(senders, subjects):
+        expected = _reference_match(ordered, subject, sender)
+        assert snapshot.match_rule(subject, sender) is expected, (subject, sender)
+
+
+def test_indexed_rule_respects_priority():
+    rules = [
+        ManualRule(id=1, email_pattern="*@shop.com", priority=50, purpose="domain"),
+        ManualRule(id=2, email_pattern="*", priority=20, purpose="catch-all"),
+        ManualRule(id=3, email_pattern="a@shop.com", priority=10, purpose="exact"),
+    ]
+    snapshot = RulesSnapshot(rules, [], [])
+
+    assert snapshot.match_rule("hi", "a@shop.com").purpose == "domain"
+    assert snapshot.match_rule("hi", "b@other.com").purpose == "catch-all"
+
+
+def test_preferences_match_substrings_in_order():
+    snapshot = RulesSnapshot(
+        [],
+        [Preference(item="Amazon", type="Always Forward")],
+        [
+            Preference(item="Spam", type="Blocked Sender"),
+            Preference(item="deals", type="Blocked Category"),
+        ],
+    )
+
+    assert snapshot.always_forward("order", "orders@amazon.com").item == "Amazon"
+    assert snapshot.always_forward("order", "orders@ebay.com") is None
+    assert snapshot.blocked("hot deals inside", "spam@x.com").item == "Spam"
+    assert snapshot.blocked("hot deals inside", "a@x.com").item == "deals"
+    assert snapshot.blocked("receipt", "a@x.com") is None
+
+
+def test_empty_preference_item_matches_everything():
+    snapshot = RulesSnapshot([], [], [Preference(item="", type="Blocked Sender")])
+    assert snapshot.blocked("anything", "anyone@example.com") is not None
+
+
+def test_load_returns_detached_rules(session):
+    session.add(ManualRule(email_pattern="*@shop.com", priority=5, purpose="Shop"))
+    session.add(Preference(item="amazon", type="Always Forward"))
+    session.add(Preference(item="spam", type="Blocked Sender"))
+    session.add(Preference(item="ignored", type="Something Else"))
+    session.commit()
+
+    snapshot = RulesSnapshot.load(session)
+    session.close()
+
+    assert snapshot.rule_count == 1
+    assert snapshot.match_rule("", "a@shop.com").purpose == "Shop"
+    assert snapshot.always_forward("", "amazon.com") is not None
+    assert snapshot.blocked("ignored", "") is None
+
+
+def test_bump_rules_version(session):
+    assert get_rules_version(session) == 0
+
+    bump_rules_version(session)
+    session.commit()
+    assert get_rules_version(session) == 1
+
+    bump_rules_version(session)
+    bump_rules_version(session)
+    session.commit()
+    assert get_rules_version(session) == 3
+
+
+def test_get_rules_snapshot_reloads_only_after_bump(session):
+    session.add(ManualRule(email_pattern="*@one.com", purpose="One"))
+    session.commit()
+
+    first = get_rules_snapshot(session)
+    assert get_rules_snapshot(session) is first
+
+    # Written without a bump: the cached snapshot is still served
+    session.add(ManualRule(email_pattern="*@two.com", purpose="Two"))
+    session.commit()
+    assert get_rules_snapshot(session) is first
+
+    bump_rules_version(session)
+    session.commit()
+    second = get_rules_snapshot(session)
+    assert second is not first
+    assert second.match_rule("", "a@two.com").purpose == "Two"
+
+
+def test_fingerprint_tracks_decisive_fields_only():
+    def snapshot(**changes):
+        rule = ManualRule(id=1, email_pattern="*@shop.com", purpose="Shop")
+        for name, value in changes.items():
+            setattr(rule, name, value)
+        return RulesSnapshot([rule], [], [Preference(id=2, item="spam", type="x")])
+
+    base = snapshot().fingerprint
+    assert snapshot(match_count=7).fingerprint == base
+    assert snapshot(email_pattern="*@other.com").fingerprint != base
+    assert snapshot(confidence=0.5).fingerprint != base
+    assert RulesSnapshot([], [], []).fingerprint != base
@@ -4,10 +4,12 @@ from unittest.mock import MagicMock, patch
 
 import backend.services.scheduler as scheduler_module
 import pytest
-from backend.models import ProcessedEmail, ProcessingRun
+from backend.models import ManualRule, ProcessedEmail, ProcessingRun
+from backend.services.detector import DetectionResult
 from backend.services.scheduler import (cleanup_expired_emails, process_emails,
                                         redact_email, start_scheduler,
                                         stop_scheduler)
+from sqlalchemy import event
 from sqlmodel import Session, SQLModel, create_engine, select
 from sqlmodel.pool import StaticPool
 
@@ -35,9 +37,20 @@ def engine_fixture():
     return engine
 
 
+def smtp_fails_for(*message_ids):
+    """forward_email stand-in failing for the given Message-IDs, in any send order"""
+
+    def forward(email_data, target_email):
+        if email_data.get("message_id") in message_ids:
+            raise Exception("SMTP error")
+        return True
+
+    return forward
+
+
 @patch.dict(os.environ, {"POLL_INTERVAL": "30", "WIFE_EMAIL": "wife@example.com"})
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 def test_process_emails_creates_run_with_no_emails(
     mock_fetch, mock_engine_patch, engine
 ):
@@ -51,7 +64,7 @@ def test_process_emails_creates_run_with_no_emails(
     scheduler_module.engine = engine
 
     try:
-        # Mock fetch_recent_emails to return empty list
+        # Mock iter_recent_emails to yield nothing
         mock_fetch.return_value = []
 
         # Set required environment variables
@@ -90,13 +103,11 @@ def test_process_emails_creates_run_with_no_emails(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.scheduler.EmailForwarder.forward_email")
-@patch("backend.services.scheduler.ReceiptDetector.is_receipt")
-@patch("backend.services.scheduler.ReceiptDetector.categorize_receipt")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
 def test_process_emails_creates_run_with_emails(
-    mock_categorize,
-    mock_is_receipt,
+    mock_detect,
     mock_forward,
     mock_fetch,
     mock_engine_patch,
@@ -124,8 +135,7 @@ def test_process_emails_creates_run_with_emails(
             },
         ]
         mock_fetch.return_value = mock_emails
-        mock_is_receipt.return_value = True
-        mock_categorize.return_value = "Shopping"
+        mock_detect.return_value = DetectionResult(is_receipt=True, category="Shopping")
         mock_forward.return_value = True
 
         # Call process_emails
@@ -160,11 +170,12 @@ def test_start_scheduler_uses_poll_interval(mock_scheduler):
 
     # Verify scheduler was started and jobs were added
     mock_scheduler.start.assert_called_once()
-    assert mock_scheduler.add_job.call_count == 2
-    # Verify both function jobs were added
+    assert mock_scheduler.add_job.call_count == 3
+    # Verify all function jobs were added
     calls = [c[0][0].__name__ for c in mock_scheduler.add_job.call_args_list]
     assert "process_emails" in calls
     assert "cleanup_expired_emails" in calls
+    assert "keepalive" in calls
 
 
 @patch.dict(
@@ -178,7 +189,7 @@ def test_start_scheduler_uses_poll_interval(mock_scheduler):
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 def test_process_emails_records_error(mock_fetch, mock_engine_patch, engine):
     """Test that errors during processing are recorded in ProcessingRun"""
     # Use our test engine in the scheduler module
@@ -216,13 +227,11 @@ def test_process_emails_records_error(mock_fetch, mock_engine_patch, engine):
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.scheduler.EmailForwarder.forward_email")
-@patch("backend.services.scheduler.ReceiptDetector.is_receipt")
-@patch("backend.services.scheduler.ReceiptDetector.categorize_receipt")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
 def test_multi_account_email_tagging(
-    mock_categorize,
-    mock_is_receipt,
+    mock_detect,
     mock_forward,
     mock_fetch,
     mock_engine_patch,
@@ -252,8 +261,8 @@ def test_multi_account_email_tagging(
             }
         ]
 
-        # Mock fetch_recent_emails to return different emails for different accounts
-        def fetch_side_effect(user, pwd, server):
+        # Mock iter_recent_emails to yield different emails for different accounts
+        def fetch_side_effect(user, pwd, server, **kwargs):
             if user == "acc1@example.com":
                 return emails_acc1.copy()  # Return copy to avoid mutations
             elif user == "acc2@example.com":
@@ -261,8 +270,7 @@ def test_multi_account_email_tagging(
             return []
 
         mock_fetch.side_effect = fetch_side_effect
-        mock_is_receipt.return_value = True
-        mock_categorize.return_value = "Shopping"
+        mock_detect.return_value = DetectionResult(is_receipt=True, category="Shopping")
         mock_forward.return_value = True
 
         # Call process_emails
@@ -422,7 +430,7 @@ def test_process_emails_no_accounts_configured(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 def test_process_emails_no_wife_email(mock_fetch, mock_engine_patch, engine):
     """Test that process_emails handles missing WIFE_EMAIL"""
     # Use our test engine in the scheduler module
@@ -474,17 +482,18 @@ def test_process_emails_no_wife_email(mock_fetch, mock_engine_patch, engine):
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.scheduler.EmailForwarder.forward_email")
-@patch("backend.services.scheduler.ReceiptDetector.is_receipt")
-@patch("backend.services.scheduler.ReceiptDetector.categorize_receipt")
-@patch("backend.services.learning_service.LearningService.run_shadow_mode")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+@patch(
+    "backend.services.learning_service.LearningService.count_shadow_matches",
+    return_value={},
+)
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_duplicate_detection(
     mock_auto_promote,
     mock_shadow_mode,
-    mock_categorize,
-    mock_is_receipt,
+    mock_detect,
     mock_forward,
     mock_fetch,
     mock_engine_patch,
@@ -506,8 +515,7 @@ def test_process_emails_duplicate_detection(
             }
         ]
         mock_fetch.return_value = mock_emails
-        mock_is_receipt.return_value = True
-        mock_categorize.return_value = "Shopping"
+        mock_detect.return_value = DetectionResult(is_receipt=True, category="Shopping")
         mock_forward.return_value = True
 
         # First call - should process the email
@@ -540,10 +548,13 @@ def test_process_emails_duplicate_detection(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.command_service.CommandService.is_command_email")
 @patch("backend.services.command_service.CommandService.process_command")
-@patch("backend.services.learning_service.LearningService.run_shadow_mode")
+@patch(
+    "backend.services.learning_service.LearningService.count_shadow_matches",
+    return_value={},
+)
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_command_processing(
     mock_auto_promote,
@@ -600,10 +611,13 @@ def test_process_emails_command_processing(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.command_service.CommandService.is_command_email")
 @patch("backend.services.command_service.CommandService.process_command")
-@patch("backend.services.learning_service.LearningService.run_shadow_mode")
+@patch(
+    "backend.services.learning_service.LearningService.count_shadow_matches",
+    return_value={},
+)
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_command_no_action(
     mock_auto_promote,
@@ -660,17 +674,18 @@ def test_process_emails_command_no_action(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.scheduler.EmailForwarder.forward_email")
-@patch("backend.services.scheduler.ReceiptDetector.is_receipt")
-@patch("backend.services.scheduler.ReceiptDetector.categorize_receipt")
-@patch("backend.services.learning_service.LearningService.run_shadow_mode")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+@patch(
+    "backend.services.learning_service.LearningService.count_shadow_matches",
+    return_value={},
+)
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_individual_error_handling(
     mock_auto_promote,
     mock_shadow_mode,
-    mock_categorize,
-    mock_is_receipt,
+    mock_detect,
     mock_forward,
     mock_fetch,
     mock_engine_patch,
@@ -698,10 +713,9 @@ def test_process_emails_individual_error_handling(
             },
         ]
         mock_fetch.return_value = mock_emails
-        mock_is_receipt.return_value = True
-        mock_categorize.return_value = "Shopping"
+        mock_detect.return_value = DetectionResult(is_receipt=True, category="Shopping")
         # First email succeeds, second fails
-        mock_forward.side_effect = [True, Exception("SMTP error")]
+        mock_forward.side_effect = smtp_fails_for("msg2")
 
         # Call process_emails
         process_emails()
@@ -732,7 +746,7 @@ def test_process_emails_individual_error_handling(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 def test_process_emails_top_level_exception(mock_fetch, mock_engine_patch, engine):
     """Test that top-level exceptions are caught and recorded"""
     # Use our test engine in the scheduler module
@@ -767,8 +781,8 @@ def test_start_scheduler_adds_cleanup_job(mock_scheduler):
     # Verify scheduler was started
     mock_scheduler.start.assert_called_once()
 
-    # Verify two jobs were added
-    assert mock_scheduler.add_job.call_count == 2
+    # Verify the poll, cleanup and IMAP keepalive jobs were added
+    assert mock_scheduler.add_job.call_count == 3
 
     # Verify the cleanup job was added with 1 hour interval
     calls = mock_scheduler.add_job.call_args_list
@@ -901,6 +915,15 @@ def test_stop_scheduler(mock_scheduler):
     mock_scheduler.shutdown.assert_called_once()
 
 
+@patch("backend.services.scheduler.imap_pool")
+@patch("backend.services.scheduler.scheduler")
+def test_stop_scheduler_closes_imap_pool(mock_scheduler, mock_pool):
+    """Test that pooled IMAP sessions are logged out on shutdown"""
+    stop_scheduler()
+
+    mock_pool.close_all.assert_called_once()
+
+
 @patch.dict(
     os.environ,
     {
@@ -912,17 +935,18 @@ def test_stop_scheduler(mock_scheduler):
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.scheduler.EmailForwarder.forward_email")
-@patch("backend.services.scheduler.ReceiptDetector.is_receipt")
-@patch("backend.services.scheduler.ReceiptDetector.categorize_receipt")
-@patch("backend.services.learning_service.LearningService.run_shadow_mode")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+@patch(
+    "backend.services.learning_service.LearningService.count_shadow_matches",
+    return_value={},
+)
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_multiple_errors(
     mock_auto_promote,
     mock_shadow_mode,
-    mock_categorize,
-    mock_is_receipt,
+    mock_detect,
     mock_forward,
     mock_fetch,
     mock_engine_patch,
@@ -956,14 +980,9 @@ def test_process_emails_multiple_errors(
             },
         ]
         mock_fetch.return_value = mock_emails
-        mock_is_receipt.return_value = True
-        mock_categorize.return_value = "Shopping"
+        mock_detect.return_value = DetectionResult(is_receipt=True, category="Shopping")
         # First email succeeds, second and third fail
-        mock_forward.side_effect = [
-            True,
-            Exception("SMTP error 1"),
-            Exception("SMTP error 2"),
-        ]
+        mock_forward.side_effect = smtp_fails_for("msg2", "msg3")
 
         # Call process_emails
         process_emails()
@@ -993,7 +1012,7 @@ def test_process_emails_multiple_errors(
     },
 )
 @patch("backend.services.scheduler.engine")
-@patch("backend.services.scheduler.EmailService.fetch_recent_emails")
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
 @patch("backend.services.learning_service.LearningService.auto_promote_rules")
 def test_process_emails_outer_exception(
     mock_auto_promote,
@@ -1031,3 +1050,745 @@ def test_process_emails_outer_exception(
     finally:
         # Restore original engine
         scheduler_module.engine = original_engine
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "SECRET_KEY": "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+def test_process_emails_keeps_cursor_below_unfetched_uid(
+    mock_detect, mock_forward, mock_fetch, engine
+):
+    """Test a message whose download failed is fetched again next poll"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    def fetched(uid):
+        return {
+            "message_id": f"msg{uid}",
+            "subject": "Hello",
+            "from": "sender@example.com",
+            "body": f"Body {uid}",
+            "uid": uid,
+            "uidvalidity": 7,
+            "folder": "inbox",
+        }
+
+    try:
+        mock_fetch.return_value = [
+            fetched(11),
+            {
+                "message_id": None,
+                "subject": None,
+                "from": None,
+                "body": "",
+                "html_body": "",
+                "uid": 12,
+                "uidvalidity": 7,
+                "folder": "inbox",
+                "fetch_failed": True,
+            },
+            fetched(13),
+        ]
+        mock_detect.return_value = DetectionResult(is_receipt=False)
+
+        process_emails()
+
+        with Session(engine) as session:
+            state = session.exec(select(scheduler_module.MailboxSyncState)).one()
+            assert (state.uidvalidity, state.last_uid) == (7, 11)
+            saved = session.exec(select(ProcessedEmail)).all()
+            assert sorted(e.email_id for e in saved) == ["msg11", "msg13"]
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.status == "error"
+            assert "1 emails could not be fetched" in run.error_message
+    finally:
+        scheduler_module.engine = original_engine
+
+
+def test_compute_sync_cursors_stops_before_failures():
+    """Test that cursors advance to the highest UID below the first failure"""
+    emails = [
+        {"account_email": "a@x.com", "folder": "inbox", "uid": 5, "uidvalidity": 9},
+        {"account_email": "a@x.com", "folder": "inbox", "uid": 6, "uidvalidity": 9},
+        {"account_email": "a@x.com", "folder": "inbox", "uid": 7, "uidvalidity": 9},
+        {"account_email": "b@x.com", "folder": "inbox", "uid": 3, "uidvalidity": 1},
+        {"account_email": "c@x.com", "message_id": "no-uid"},
+    ]
+    failed = {("a@x.com", "inbox"): [6]}
+
+    cursors = scheduler_module.compute_sync_cursors(emails, failed)
+
+    assert cursors == {("a@x.com", "inbox"): (9, 5), ("b@x.com", "inbox"): (1, 3)}
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+def test_process_emails_persists_sync_state(
+    mock_detect, mock_forward, mock_fetch, engine
+):
+    """Test that a run stores the sync cursor and the next poll passes it back"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = [
+            {
+                "message_id": f"msg{uid}",
+                "subject": "Hello",
+                "from": "sender@example.com",
+                "body": "Body",
+                "uid": uid,
+                "uidvalidity": 42,
+                "folder": "inbox",
+            }
+            for uid in (10, 11)
+        ]
+        mock_detect.return_value = DetectionResult(
+            is_receipt=False, category="Shopping"
+        )
+
+        process_emails()
+
+        with Session(engine) as session:
+            state = session.exec(select(scheduler_module.MailboxSyncState)).one()
+            assert state.account_email == "test@example.com"
+            assert state.uidvalidity == 42
+            assert state.last_uid == 11
+
+            # Each saved email records where its original lives
+            saved = session.exec(
+                select(ProcessedEmail).where(ProcessedEmail.email_id == "msg10")
+            ).one()
+            assert (saved.imap_folder, saved.imap_uidvalidity, saved.imap_uid) == (
+                "inbox",
+                42,
+                10,
+            )
+
+        mock_fetch.return_value = []
+        process_emails()
+        assert mock_fetch.call_args.kwargs["sync_state"] == {
+            "uidvalidity": 42,
+            "last_uid": 11,
+        }
+    finally:
+        scheduler_module.engine = original_engine
+
+
+def test_filter_processed_message_ids(engine):
+    """Test that known Message-IDs are resolved in one lookup"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        with Session(engine) as session:
+            session.add(ProcessedEmail(email_id="<a@x.com>", status="forwarded"))
+            session.commit()
+
+        seen = scheduler_module.filter_processed_message_ids(["<a@x.com>", "<b@x.com>"])
+        assert seen == {"<a@x.com>"}
+        assert scheduler_module.filter_processed_message_ids([]) == set()
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(os.environ, {"DEDUPE_CHUNK_SIZE": "2"})
+def test_find_processed_keys_uses_chunked_lookups(engine):
+    """Test known Message-IDs and hashes are found in chunks of IN queries"""
+    with Session(engine) as session:
+        session.add(ProcessedEmail(email_id="m1", content_hash="h1"))
+        session.add(ProcessedEmail(email_id="unknown", content_hash="h4"))
+        session.commit()
+
+        statements = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        known = scheduler_module.find_processed_keys(
+            session,
+            [("m1", "h1"), ("m2", "h2"), ("m3", "h3"), (None, "h4"), ("m2", "h2")],
+        )
+
+    assert known == {"m1", "h4"}
+    # Message-IDs m1, m2, m3 in two chunks; hashes h2, h3, h4 (not h1) in two
+    assert len(statements) == 4
+    assert scheduler_module.find_processed_keys(session, []) == set()
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "SECRET_KEY": "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email", return_value=True)
+@patch("backend.services.scheduler.ReceiptDetector.classify_batch")
+def test_process_emails_dedupes_batch_before_processing(
+    mock_classify, mock_forward, mock_fetch, engine
+):
+    """Test duplicates across accounts and the DB are dropped with bulk lookups"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        with Session(engine) as session:
+            session.add(ProcessedEmail(email_id="old", status="forwarded"))
+            session.commit()
+
+        def emails(username, *args, **kwargs):
+            return [
+                {"message_id": "shared", "subject": "Receipt", "body": "1"},
+                {"message_id": "old", "subject": "Old receipt", "body": "2"},
+                {"message_id": f"own-{username}", "subject": "Order", "body": username},
+            ]
+
+        mock_fetch.side_effect = emails
+        mock_classify.side_effect = lambda batch, **kwargs: [
+            DetectionResult(is_receipt=True) for _ in batch
+        ]
+        statements = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        process_emails(
+            accounts=[
+                {"email": "a@example.com", "password": "p"},
+                {"email": "b@example.com", "password": "p"},
+            ]
+        )
+
+        classified = [e["message_id"] for e in mock_classify.call_args.args[0]]
+        assert sorted(classified) == [
+            "own-a@example.com",
+            "own-b@example.com",
+            "shared",
+        ]
+        assert mock_forward.call_count == 3
+        lookups = [
+            sql
+            for sql in statements
+            if sql.lstrip().startswith("SELECT processedemail.email_id")
+            or sql.lstrip().startswith("SELECT processedemail.content_hash")
+        ]
+        # One Message-ID and one content hash query for the six emails
+        assert len(lookups) == 2
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.emails_checked == 6
+            assert run.emails_processed == 3
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "SECRET_KEY": "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+        "PERSIST_CHUNK_SIZE": "2",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email")
+@patch("backend.services.scheduler.ReceiptDetector.classify_batch")
+def test_process_emails_persists_in_chunks(
+    mock_classify, mock_forward, mock_fetch, engine
+):
+    """Test rows are committed per chunk and shadow matches once per run"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        with Session(engine) as session:
+            rule = ManualRule(
+                email_pattern="*@shop.com", is_shadow_mode=True, confidence=0.5
+            )
+            session.add(rule)
+            session.commit()
+
+        mock_fetch.return_value = [
+            {
+                "message_id": f"m{uid}",
+                "subject": f"Receipt {uid}",
+                "from": "orders@shop.com",
+                "body": str(uid),
+                "uid": uid,
+                "uidvalidity": 1,
+                "folder": "inbox",
+            }
+            for uid in range(1, 6)
+        ]
+        mock_classify.side_effect = lambda batch, **kwargs: [
+            DetectionResult(is_receipt=True) for _ in batch
+        ]
+        # The third email fails after its shadow match was counted
+        mock_forward.side_effect = smtp_fails_for("m3")
+        commits, statements = [], []
+        event.listen(engine, "commit", lambda conn: commits.append(1))
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2].lstrip()),
+        )
+
+        process_emails()
+        run_statements = list(statements)
+
+        with Session(engine) as session:
+            saved = session.exec(select(ProcessedEmail)).all()
+            assert sorted(e.email_id for e in saved) == ["m1", "m2", "m4", "m5"]
+            # Matched when classified, so the email that failed to send counts too
+            rule = session.exec(select(ManualRule)).one()
+            assert rule.match_count == 5
+            assert rule.confidence == pytest.approx(0.75)
+            # The failed email is fetched again next run
+            state = session.exec(select(scheduler_module.MailboxSyncState)).one()
+            assert state.last_uid == 2
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.status == "error"
+            assert "Receipt 3" in run.error_message
+        # Run start, two chunks of two rows, and the run's final update
+        assert len(commits) == 4
+        # Shadow rules come from the rules snapshot and are saved in one UPDATE
+        assert (
+            len([q for q in run_statements if q.startswith("UPDATE manualrule")]) == 1
+        )
+        rule_loads = [
+            q
+            for q in run_statements
+            if q.startswith("SELECT") and "FROM manualrule" in q.split("WHERE")[0]
+        ]
+        # The snapshot and auto-promotion, not a query per email
+        assert len(rule_loads) == 2
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "SECRET_KEY": "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=",
+        "DETECTOR_BATCH_SIZE": "1",
+        "FORWARD_WORKERS": "1",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email")
+@patch("backend.services.scheduler.ReceiptDetector.classify_batch")
+def test_process_emails_classifies_while_forwarding(
+    mock_classify, mock_forward, mock_fetch, engine
+):
+    """Test a slow SMTP send does not hold up classification of the next emails"""
+    import threading
+
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = [
+            {"message_id": f"m{i}", "subject": f"Receipt {i}", "body": str(i)}
+            for i in range(1, 4)
+        ]
+        all_classified = threading.Event()
+
+        def classify(emails, **kwargs):
+            if emails[-1]["message_id"] == "m3":
+                all_classified.set()
+            return [DetectionResult(is_receipt=True) for _ in emails]
+
+        def forward(email_data, target_email):
+            # The first send only completes once the last email was classified
+            return email_data["message_id"] != "m1" or all_classified.wait(5)
+
+        mock_classify.side_effect = classify
+        mock_forward.side_effect = forward
+
+        process_emails(accounts=[{"email": "acc@example.com", "password": "p"}])
+
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.emails_forwarded == 3
+            stats = run.pipeline_stats
+            assert list(stats) == ["fetch", "dedupe", "classify", "forward", "persist"]
+            assert stats["fetch"]["items"] == 3
+            assert stats["fetch"]["workers"] == 1
+            assert stats["classify"]["items"] == 3
+            assert stats["forward"]["items"] == 3
+            assert stats["persist"]["items"] == 3
+            assert stats["forward"]["busy_ms"] > 0
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.ReceiptDetector.detect")
+def test_process_emails_skips_header_only_entries(mock_detect, mock_fetch, engine):
+    """Test that entries flagged already_processed are counted but not analyzed"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = [
+            {
+                "message_id": "<seen@x.com>",
+                "subject": "Seen",
+                "from": "sender@example.com",
+                "body": "",
+                "uid": 7,
+                "uidvalidity": 1,
+                "folder": "inbox",
+                "already_processed": True,
+            }
+        ]
+
+        process_emails()
+
+        mock_detect.assert_not_called()
+        assert (
+            mock_fetch.call_args.kwargs["processed_filter"]
+            is scheduler_module.filter_processed_message_ids
+        )
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.emails_checked == 1
+            assert run.emails_processed == 0
+            state = session.exec(select(scheduler_module.MailboxSyncState)).one()
+            assert state.last_uid == 7
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(os.environ, {"MAX_CONCURRENT_ACCOUNTS": "2"})
+@patch("backend.services.scheduler.get_sync_state", return_value=None)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_stream_all_accounts_runs_concurrently(mock_fetch, mock_sync_state):
+    """Test that accounts are fetched in parallel and failures stay isolated"""
+    import threading
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fetch_side_effect(user, pwd, server, **kwargs):
+        # Both accounts must be in flight at once for the barrier to release
+        barrier.wait()
+        if user == "bad@example.com":
+            raise Exception("Login failed")
+        return [{"message_id": "m1", "subject": "Hi"}]
+
+    mock_fetch.side_effect = fetch_side_effect
+    accounts = [
+        {"email": "good@example.com", "password": "p"},
+        {"email": "bad@example.com", "password": "p"},
+    ]
+
+    timings, errors = [], []
+    emails = list(scheduler_module.stream_all_accounts(accounts, timings, errors))
+
+    assert [e["account_email"] for e in emails] == ["good@example.com"]
+    assert [t["status"] for t in timings] == ["ok", "error"]
+    assert timings[0]["emails"] == 1
+    assert timings[0]["account"] == redact_email("good@example.com")
+    assert errors == ["Error scanning account #2: Connection failed (Exception)"]
+
+
+@patch.dict(os.environ, {"ACCOUNT_FETCH_TIMEOUT": "1"})
+@patch("backend.services.scheduler.get_sync_state", return_value=None)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_stream_all_accounts_enforces_timeout(mock_fetch, mock_sync_state):
+    """Test that a hung account is abandoned after its budget"""
+    import threading
+    import time
+
+    release = threading.Event()
+
+    def fetch_side_effect(user, pwd, server, **kwargs):
+        if user == "slow@example.com":
+            release.wait(10)
+        return []
+
+    mock_fetch.side_effect = fetch_side_effect
+    accounts = [
+        {"email": "slow@example.com", "password": "p"},
+        {"email": "fast@example.com", "password": "p"},
+    ]
+
+    timings, errors = [], []
+    started = time.monotonic()
+    try:
+        list(scheduler_module.stream_all_accounts(accounts, timings, errors))
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 5
+    assert [t["status"] for t in timings] == ["timeout", "ok"]
+    assert errors == ["Error scanning account #1: Timed out"]
+    assert mock_fetch.call_args_list[0].kwargs["timeout"] == 1
+
+
+@patch.dict(os.environ, {"ACCOUNT_FETCH_TIMEOUT": "1", "MAX_CONCURRENT_ACCOUNTS": "1"})
+@patch("backend.services.scheduler.get_sync_state", return_value=None)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_stream_all_accounts_times_each_account_from_its_start(
+    mock_fetch, mock_sync_state
+):
+    """Test a hung account does not use up the budget of the accounts queued behind it"""
+    import threading
+    import time
+
+    release = threading.Event()
+
+    def fetch_side_effect(user, pwd, server, **kwargs):
+        if user == "slow@example.com":
+            release.wait(10)
+            return []
+        # Each queued account takes most of its own budget
+        time.sleep(0.7)
+        return [{"message_id": user, "subject": "Hi"}]
+
+    mock_fetch.side_effect = fetch_side_effect
+    accounts = [
+        {"email": "slow@example.com", "password": "p"},
+        {"email": "one@example.com", "password": "p"},
+        {"email": "two@example.com", "password": "p"},
+    ]
+
+    timings, errors = [], []
+    try:
+        emails = list(scheduler_module.stream_all_accounts(accounts, timings, errors))
+    finally:
+        release.set()
+
+    assert [e["account_email"] for e in emails] == [
+        "one@example.com",
+        "two@example.com",
+    ]
+    assert [t["status"] for t in timings] == ["timeout", "ok", "ok"]
+    assert 1 <= timings[0]["seconds"] < 2
+    assert errors == ["Error scanning account #1: Timed out"]
+
+
+@patch.dict(os.environ, {"IMAP_SEARCH_PROFILE": '{"unseen_only": true}'})
+@patch("backend.services.scheduler.get_sync_state", return_value=None)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_stream_all_accounts_passes_search_profiles(mock_fetch, mock_sync_state):
+    """Test that each account gets its own profile, else the env default"""
+    mock_fetch.return_value = []
+    accounts = [
+        {
+            "email": "own@example.com",
+            "password": "p",
+            "search_profile": {"exclude_categories": ["promotions"]},
+        },
+        {"email": "default@example.com", "password": "p"},
+    ]
+
+    list(scheduler_module.stream_all_accounts(accounts, [], []))
+
+    profiles = {c[0][0]: c.kwargs["search_profile"] for c in mock_fetch.call_args_list}
+    assert profiles == {
+        "own@example.com": {"exclude_categories": ["promotions"]},
+        "default@example.com": {"unseen_only": True},
+    }
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_process_emails_records_account_timings(mock_fetch, engine):
+    """Test that per-account timings are stored on the ProcessingRun"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = []
+
+        process_emails()
+
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+            assert len(run.account_timings) == 1
+            assert run.account_timings[0]["status"] == "ok"
+            assert run.account_timings[0]["emails"] == 0
+            assert run.account_timings[0]["seconds"] >= 0
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "GMAIL_EMAIL": "test@example.com",
+        "GMAIL_PASSWORD": "password",
+        "EMAIL_ACCOUNTS": "",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_process_emails_limited_to_given_accounts(mock_fetch, engine):
+    """Test that an IDLE-triggered run only fetches the pushed account"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = []
+
+        process_emails(accounts=[{"email": "push@example.com", "password": "p"}])
+
+        assert mock_fetch.call_count == 1
+        assert mock_fetch.call_args[0][0] == "push@example.com"
+    finally:
+        scheduler_module.engine = original_engine
+
+
+@patch.dict(os.environ, {"POLL_INTERVAL": "45", "IMAP_IDLE_ENABLED": "true"})
+@patch("backend.services.scheduler.start_idle_watchers")
+@patch("backend.services.scheduler.EmailService.get_all_accounts")
+@patch("backend.services.scheduler.scheduler")
+def test_start_scheduler_starts_idle_watchers(
+    mock_scheduler, mock_accounts, mock_start_idle
+):
+    """Test that IDLE watchers start alongside the polling job when enabled"""
+    mock_accounts.return_value = [{"email": "a@example.com", "password": "p"}]
+
+    start_scheduler()
+
+    assert mock_scheduler.add_job.call_count == 3
+    mock_start_idle.assert_called_once()
+    assert mock_start_idle.call_args[0][0] == mock_accounts.return_value
+
+
+@patch.dict(os.environ, {"STREAM_QUEUE_SIZE": "1"})
+@patch("backend.services.scheduler.get_sync_state", return_value=None)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+def test_stream_all_accounts_applies_backpressure(mock_iter, mock_sync_state):
+    """Test that workers cannot run far ahead of a slow consumer"""
+    import time
+
+    produced = []
+
+    def generate(user, pwd, server, **kwargs):
+        for uid in range(1, 11):
+            produced.append(uid)
+            yield {"message_id": f"m{uid}", "uid": uid}
+
+    mock_iter.side_effect = generate
+    timings, errors = [], []
+    stream = scheduler_module.stream_all_accounts(
+        [{"email": "a@example.com", "password": "p"}], timings, errors
+    )
+
+    first = next(stream)
+    time.sleep(0.2)
+
+    assert first["account_email"] == "a@example.com"
+    # One handed over, one queued, one blocked in put()
+    assert len(produced) <= 3
+    assert [e["uid"] for e in stream] == list(range(2, 11))
+    assert timings[0]["status"] == "ok"
+    assert timings[0]["emails"] == 10
+    assert errors == []
+
+
+@patch.dict(
+    os.environ,
+    {
+        "POLL_INTERVAL": "60",
+        "WIFE_EMAIL": "wife@example.com",
+        "SECRET_KEY": "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=",
+        "DETECTOR_BATCH_SIZE": "2",
+    },
+)
+@patch("backend.services.scheduler.EmailService.iter_recent_emails")
+@patch("backend.services.scheduler.EmailForwarder.forward_email", return_value=True)
+@patch("backend.services.scheduler.ReceiptDetector.classify_batch")
+def test_process_emails_classifies_in_batches(
+    mock_classify, mock_forward, mock_fetch, engine
+):
+    """Test that new emails are classified in batches and duplicates within a batch are skipped"""
+    original_engine = scheduler_module.engine
+    scheduler_module.engine = engine
+
+    try:
+        mock_fetch.return_value = [
+            {"message_id": "m1", "subject": "One", "from": "a@shop.com", "body": "1"},
+            {"message_id": "m1", "subject": "One", "from": "a@shop.com", "body": "1"},
+            {"message_id": "m2", "subject": "Two", "from": "b@shop.com", "body": "2"},
+            {"message_id": "m3", "subject": "Three", "from": "c@shop.com", "body": "3"},
+        ]
+        mock_classify.side_effect = lambda emails, **kwargs: [
+            DetectionResult(is_receipt=e["subject"] != "Two", category="Shopping")
+            for e in emails
+        ]
+
+        process_emails(accounts=[{"email": "acc@example.com", "password": "p"}])
+
+        batches = [
+            [e["message_id"] for e in c.args[0]] for c in mock_classify.call_args_list
+        ]
+        # Fetched emails are batched in twos; the repeated m1 never reaches the detector
+        assert batches == [["m1"], ["m2", "m3"]]
+        assert mock_forward.call_count == 2
+
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+            assert run.emails_checked == 4
+            assert run.emails_processed == 3
+            assert run.emails_forwarded == 2
+            statuses = {
+                e.email_id: e.status for e in session.exec(select(ProcessedEmail)).all()
+            }
+            assert statuses == {"m1": "forwarded", "m2": "ignored", "m3": "forwarded"}
+    finally:
+        scheduler_module.engine = original_engine
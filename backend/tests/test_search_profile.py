@@ -0,0 +1,76 @@
+import os
+from unittest.mock import patch
+
+from backend.services.search_profile import (
+    compile_search_profile,
+    parse_search_profile,
+    profile_for_account,
+)
+
+PROFILE = {
+    "exclude_categories": ["promotions", "Social"],
+    "exclude_labels": ["receipts-forwarded"],
+    "exclude_from": ["news@shop.com"],
+}
+
+
+def test_compile_gmail_uses_x_gm_raw():
+    criterion = compile_search_profile(PROFILE, gmail=True)
+
+    assert criterion == (
+        'X-GM-RAW "-category:promotions -category:social '
+        '-label:receipts-forwarded -from:news@shop.com"'
+    )
+
+
+def test_compile_gmail_quotes_terms_with_spaces():
+    criterion = compile_search_profile(
+        {"exclude_labels": ["My Receipts"], "from": ["a@x.com", "b@y.com"]},
+        gmail=True,
+    )
+
+    assert criterion == (
+        'X-GM-RAW "-label:\\"My Receipts\\" from:(a@x.com OR b@y.com)"'
+    )
+
+
+def test_compile_imap_uses_standard_keys():
+    criterion = compile_search_profile(PROFILE, gmail=False)
+
+    # Categories are Gmail-only
+    assert criterion == 'UNKEYWORD receipts-forwarded NOT FROM "news@shop.com"'
+
+
+def test_compile_imap_nests_or_for_senders():
+    criterion = compile_search_profile(
+        {"from": ["a@x.com", "b@y.com", "c@z.com"], "unseen_only": True},
+        gmail=False,
+    )
+
+    assert criterion == 'OR FROM "a@x.com" OR FROM "b@y.com" FROM "c@z.com" UNSEEN'
+
+
+def test_compile_imap_skips_labels_that_are_not_keywords():
+    assert compile_search_profile({"exclude_labels": ["two words"]}, False) is None
+
+
+def test_compile_empty_profile():
+    assert compile_search_profile(None, gmail=True) is None
+    assert compile_search_profile({"exclude_categories": ["bogus"]}, True) is None
+
+
+def test_parse_search_profile():
+    assert parse_search_profile('{"unseen_only": true, "bogus": 1}') == {
+        "unseen_only": True
+    }
+    assert parse_search_profile("not json") is None
+    assert parse_search_profile("[1, 2]") is None
+    assert parse_search_profile({"exclude_labels": []}) is None
+
+
+@patch.dict(os.environ, {"IMAP_SEARCH_PROFILE": '{"unseen_only": true}'})
+def test_profile_for_account_prefers_account_profile():
+    own = {"email": "a@x.com", "search_profile": {"exclude_from": ["n@x.com"]}}
+
+    assert profile_for_account(own) == {"exclude_from": ["n@x.com"]}
+    assert profile_for_account({"email": "b@x.com"}) == {"unseen_only": True}
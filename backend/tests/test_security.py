@@ -1,7 +1,12 @@
 from unittest.mock import patch
 
 import pytest
-from backend.security import decrypt_content, encrypt_content, get_fernet
+from backend.security import (
+    COMPRESSED_PREFIX,
+    decrypt_content,
+    encrypt_content,
+    get_fernet,
+)
 from cryptography.fernet import Fernet
 
 
@@ -53,3 +58,42 @@ def test_decrypt_unexpected_exception():
         # Should catch the exception and return empty string
         result = decrypt_content(encrypted)
         assert result == ""
+
+
+def test_large_content_is_compressed():
+    content = "<table><tr><td>Item</td><td>$12.99</td></tr></table>" * 200
+    encrypted = encrypt_content(content)
+    assert encrypted.startswith(COMPRESSED_PREFIX)
+    assert len(encrypted) < len(content)
+    assert decrypt_content(encrypted) == content
+
+
+def test_incompressible_content_stays_plain_fernet():
+    encrypted = encrypt_content("Hi")
+    assert not encrypted.startswith(COMPRESSED_PREFIX)
+    assert decrypt_content(encrypted) == "Hi"
+
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_COMPRESSION", "none")
+    content = "receipt " * 500
+    encrypted = encrypt_content(content)
+    assert not encrypted.startswith(COMPRESSED_PREFIX)
+    assert decrypt_content(encrypted) == content
+
+
+def test_existing_fernet_tokens_still_decrypt():
+    """Test rows written before compression (plain Fernet tokens) still decrypt"""
+    content = "Order #123 " * 100
+    legacy = get_fernet().encrypt(content.encode()).decode()
+    assert decrypt_content(legacy) == content
+
+
+def test_get_fernet_is_cached_until_key_changes(monkeypatch):
+    assert get_fernet() is get_fernet()
+
+    encrypted = encrypt_content("secret " * 50)
+    monkeypatch.setenv("SECRET_KEY", Fernet.generate_key().decode())
+    # A new key builds a new cipher, which cannot read the old ciphertext
+    assert decrypt_content(encrypted) == ""
+    assert decrypt_content(encrypt_content("secret " * 50)) == "secret " * 50
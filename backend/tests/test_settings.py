@@ -48,6 +48,26 @@ def test_delete_rule(session: Session):
     assert len(rules) == 0
 
 
+def test_rule_and_preference_writes_bump_rules_version(session: Session):
+    from backend.routers.settings import (
+        create_preference,
+        create_rule,
+        delete_preference,
+        delete_rule,
+    )
+    from backend.services.rules_snapshot import get_rules_version
+
+    rule = create_rule(ManualRule(email_pattern="*@a.com"), session=session)
+    pref = create_preference(
+        Preference(item="spam", type="Blocked Sender"), session=session
+    )
+    assert get_rules_version(session) == 2
+
+    delete_rule(rule.id, session=session)
+    delete_preference(pref.id, session=session)
+    assert get_rules_version(session) == 4
+
+
 def test_get_preferences_default(session: Session):
     from backend.routers.settings import get_preferences
 
@@ -222,3 +242,21 @@ def test_update_email_template_existing(session: Session):
     # Verify it was actually updated
     current = get_email_template(session=session)
     assert current["template"] == "Updated template"
+
+
+def test_get_imap_pool_stats():
+    from backend.routers.settings import get_imap_pool_stats
+
+    stats = get_imap_pool_stats()
+    assert "created" in stats
+    assert "servers" in stats
+    assert stats["max_per_server"] >= 1
+
+
+def test_get_detection_cache_stats():
+    from backend.routers.settings import get_detection_cache_stats
+
+    stats = get_detection_cache_stats()
+    assert stats["hits"] == 0
+    assert "hit_rate" in stats
+    assert stats["max_size"] >= 0
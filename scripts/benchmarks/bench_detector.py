@@ -0,0 +1,273 @@
+"""
+Benchmark: detector throughput and latency, with JSON baselines.
+
+Times ReceiptDetector.is_receipt, categorize_receipt, get_detection_confidence
+and get_email_content_hash over an email corpus (see detector_corpus.py: plain
+receipts, promotions, shipping notices, newsletters and replies, plus HTML-only
+mail with long footers). For each function it reports emails/second and
+per-email p50/p99 latency; is_receipt is also scored against the corpus labels.
+Detector log lines are silenced so only classification time is measured.
+
+--save writes the results as a JSON baseline; --baseline compares a run with
+one and exits non-zero when a function got slower (throughput or p99) by more
+than --tolerance, or accuracy dropped. Baselines are only comparable on the
+same machine. --profile prints the top cProfile entries for each function.
+
+--compare-windows classifies the corpus with the whole body and with the
+DETECTOR_BODY_HEAD/TAIL windows, reporting decision agreement and per-email
+p50/p99 for both.
+
+Usage:
+    python scripts/benchmarks/bench_detector.py [--emails 2000] [--repeat 3]
+    python scripts/benchmarks/bench_detector.py --save baseline.json
+    python scripts/benchmarks/bench_detector.py --baseline baseline.json
+    python scripts/benchmarks/bench_detector.py --corpus anonymized.jsonl --profile 15
+    python scripts/benchmarks/bench_detector.py --footer-kb 40 --compare-windows
+    DETECTOR_KEYWORD_BACKEND=substring python scripts/benchmarks/bench_detector.py
+"""
+
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from backend.security import get_email_content_hash  # noqa: E402
+from backend.services.detector import ReceiptDetector  # noqa: E402
+from backend.services.detector_engine import get_engine, rebuild_engine  # noqa: E402
+from detector_corpus import build_corpus, load_corpus  # noqa: E402
+
+FUNCTIONS = {
+    "is_receipt": ReceiptDetector.is_receipt,
+    "categorize_receipt": ReceiptDetector.categorize_receipt,
+    "get_detection_confidence": ReceiptDetector.get_detection_confidence,
+    "get_email_content_hash": get_email_content_hash,
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(function, corpus, repeat):
+    """
+    Best-of-`repeat` total time, plus the outputs and the per-email times
+    (fastest run of each email) for percentiles.
+    """
+    best = None
+    per_email = [float("inf")] * len(corpus)
+    outputs = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        outputs = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = clock()
+            for i, email in enumerate(corpus):
+                email_started = clock()
+                outputs.append(function(email))
+                per_email[i] = min(per_email[i], clock() - email_started)
+            elapsed = clock() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return outputs, best, per_email
+
+
+def summarize(corpus, elapsed, per_email):
+    return {
+        "total_s": round(elapsed, 4),
+        "emails_per_sec": round(len(corpus) / elapsed, 1),
+        "p50_us": round(percentile(per_email, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(per_email, 0.99) * 1e6, 1),
+    }
+
+
+def accuracy(corpus, decisions):
+    labelled = [
+        (email["expected"], decision)
+        for email, decision in zip(corpus, decisions)
+        if "expected" in email
+    ]
+    if not labelled:
+        return None
+    return {
+        "labelled": len(labelled),
+        "accuracy": round(sum(e == d for e, d in labelled) / len(labelled), 4),
+        "false_positives": sum(d and not e for e, d in labelled),
+        "false_negatives": sum(e and not d for e, d in labelled),
+    }
+
+
+def report(label, stats):
+    print(
+        f"   {label:<26} {stats['total_s']:7.3f}s  "
+        f"{stats['emails_per_sec']:9.0f} emails/s  "
+        f"p50={stats['p50_us']:8.1f}us  p99={stats['p99_us']:9.1f}us"
+    )
+
+
+def profile(function, corpus, top):
+    profiler = cProfile.Profile()
+    with contextlib.redirect_stdout(io.StringIO()):
+        profiler.enable()
+        for email in corpus:
+            function(email)
+        profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("tottime").print_stats(top)
+    # Drop the header lines pstats prints before the table
+    lines = out.getvalue().splitlines()
+    start = next((i for i, line in enumerate(lines) if "ncalls" in line), 0)
+    print("\n".join(f"      {line}" for line in lines[start:] if line.strip()))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(corpus, args):
+    engine = get_engine()
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "cpus": os.cpu_count(),
+            "emails": len(corpus),
+            "corpus": args.corpus or f"synthetic seed={args.seed}",
+            "repeat": args.repeat,
+            "keyword_backend": engine.keywords.backend,
+            "body_windows": [engine.body_head, engine.body_tail],
+        },
+        "functions": {},
+        "accuracy": None,
+    }
+    for name, function in FUNCTIONS.items():
+        outputs, elapsed, per_email = run(function, corpus, args.repeat)
+        stats = summarize(corpus, elapsed, per_email)
+        results["functions"][name] = stats
+        report(name, stats)
+        if name == "is_receipt":
+            results["accuracy"] = accuracy(corpus, outputs)
+        if args.profile:
+            profile(function, corpus, args.profile)
+
+    if results["accuracy"]:
+        acc = results["accuracy"]
+        print(
+            f"   is_receipt accuracy {acc['accuracy']:.2%} on {acc['labelled']} "
+            f"labelled emails (fp={acc['false_positives']} fn={acc['false_negatives']})"
+        )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change per metric; returns the regressions found."""
+    print(f"\n📐 Against baseline {baseline['meta'].get('created_at')}")
+    regressions = []
+    for name, stats in results["functions"].items():
+        old = baseline["functions"].get(name)
+        if not old:
+            continue
+        throughput = stats["emails_per_sec"] / old["emails_per_sec"] - 1
+        p99 = stats["p99_us"] / old["p99_us"] - 1
+        flag = ""
+        if throughput < -tolerance or p99 > tolerance:
+            flag = "  ⚠️ regression"
+            regressions.append(name)
+        print(f"   {name:<26} emails/s {throughput:+7.1%}  p99 {p99:+7.1%}{flag}")
+    old_acc, new_acc = baseline.get("accuracy"), results["accuracy"]
+    if old_acc and new_acc and new_acc["accuracy"] < old_acc["accuracy"]:
+        print(
+            f"   ⚠️ accuracy dropped: {old_acc['accuracy']:.2%} -> {new_acc['accuracy']:.2%}"
+        )
+        regressions.append("accuracy")
+    return regressions
+
+
+def compare_windows(corpus, repeat):
+    engine = get_engine()
+    head, tail = engine.body_head, engine.body_tail
+    saved = os.environ.get("DETECTOR_BODY_HEAD")
+    os.environ["DETECTOR_BODY_HEAD"] = "0"
+    try:
+        rebuild_engine()
+        whole = run(ReceiptDetector.is_receipt, corpus, repeat)
+    finally:
+        if saved is None:
+            os.environ.pop("DETECTOR_BODY_HEAD")
+        else:
+            os.environ["DETECTOR_BODY_HEAD"] = saved
+        rebuild_engine()
+    windowed = run(ReceiptDetector.is_receipt, corpus, repeat)
+
+    agree = sum(a == b for a, b in zip(whole[0], windowed[0]))
+    report("whole body", summarize(corpus, *whole[1:]))
+    report(f"head={head} tail={tail}", summarize(corpus, *windowed[1:]))
+    print(f"   decisions agree on {agree}/{len(corpus)} emails")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--corpus", help="JSONL corpus instead of synthetic mail")
+    parser.add_argument("--html-share", type=float, default=0.3)
+    parser.add_argument("--footer-kb", type=int, default=40)
+    parser.add_argument("--profile", type=int, default=0, metavar="TOP")
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--compare-windows", action="store_true")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = build_corpus(
+            args.emails,
+            seed=args.seed,
+            html_share=args.html_share,
+            footer_kb=args.footer_kb,
+        )
+    print(
+        f"\n📊 {len(corpus)} emails, best of {args.repeat}, "
+        f"keyword backend: {get_engine().keywords.backend}"
+    )
+    if args.compare_windows:
+        compare_windows(corpus, args.repeat)
+        return 0
+
+    results = run_suite(corpus, args)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved baseline to {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Benchmark: body/HTML encryption as ProcessedEmail rows store it.
+
+Encrypts the text and HTML of a synthetic corpus (detector_corpus.py) the
+old way (a new Fernet per call, no compression) and with encrypt_content
+(cached cipher, zlib before encryption), writes each set to its own SQLite
+file, and reports raw vs. stored size, database file size and throughput.
+
+Usage:
+    python scripts/benchmarks/bench_encryption.py [--emails 1000] [--html-share 0.6]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=")
+
+from backend.models import ProcessedEmail  # noqa: E402
+from backend.security import decrypt_content, encrypt_content  # noqa: E402
+from cryptography.fernet import Fernet  # noqa: E402
+from detector_corpus import build_corpus  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+
+def encrypt_uncached(content):
+    # encrypt_content before the cipher cache and compression
+    if not content:
+        return ""
+    return Fernet(os.environ["SECRET_KEY"].encode()).encrypt(content.encode()).decode()
+
+
+def decrypt_uncached(content):
+    if not content:
+        return ""
+    return Fernet(os.environ["SECRET_KEY"].encode()).decrypt(content.encode()).decode()
+
+
+def run(corpus, encrypt, decrypt, path):
+    started = time.perf_counter()
+    rows = [
+        (encrypt(email.get("body", "")), encrypt(email.get("html_body", "")))
+        for email in corpus
+    ]
+    encrypt_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for body, html in rows:
+        decrypt(body)
+        decrypt(html)
+    decrypt_time = time.perf_counter() - started
+
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            ProcessedEmail(email_id=f"m{i}", encrypted_body=body, encrypted_html=html)
+            for i, (body, html) in enumerate(rows)
+        )
+        session.commit()
+    engine.dispose()
+
+    stored = sum(len(body) + len(html) for body, html in rows)
+    return encrypt_time, decrypt_time, stored, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--html-share", type=float, default=0.6)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.emails, html_share=args.html_share)
+    raw = sum(
+        len(email.get("body", "").encode()) + len(email.get("html_body", "").encode())
+        for email in corpus
+    )
+    mb = raw / 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "uncached, plain": run(
+                corpus,
+                encrypt_uncached,
+                decrypt_uncached,
+                os.path.join(tmp, "old.db"),
+            ),
+            "cached, zlib": run(
+                corpus, encrypt_content, decrypt_content, os.path.join(tmp, "new.db")
+            ),
+        }
+
+    print(
+        f"\n📊 {args.emails} emails, {args.html_share:.0%} with HTML, "
+        f"{mb:.1f} MB of body + HTML"
+    )
+    print(
+        f"   {'':<16} {'encrypt MB/s':>12} {'decrypt MB/s':>12} "
+        f"{'stored MB':>10} {'x raw':>6} {'db file MB':>10}"
+    )
+    for name, (enc, dec, stored, db_size) in results.items():
+        print(
+            f"   {name:<16} {mb / enc:>12.1f} {mb / dec:>12.1f} "
+            f"{stored / 1e6:>10.2f} {stored / raw:>6.2f} {db_size / 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
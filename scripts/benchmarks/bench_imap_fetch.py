@@ -0,0 +1,71 @@
+"""
+Benchmark: one UID FETCH per message vs. pipelined chunked UID FETCH.
+
+Runs EmailService.fetch_recent_emails against a local IMAP stand-in that adds
+a fixed delay to every command, mimicking the round trip to Gmail/iCloud.
+
+Usage:
+    python scripts/benchmarks/bench_imap_fetch.py [--messages 100] [--latency-ms 40]
+"""
+
+import argparse
+import imaplib
+import os
+import sys
+import time
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from backend.services.email_service import EmailService  # noqa: E402
+from backend.services.imap_pool import imap_pool  # noqa: E402
+from imap_standin import ImapStandIn  # noqa: E402
+
+
+def build_corpus(count):
+    messages = []
+    for i in range(1, count + 1):
+        msg = MIMEText(f"Order #{100000 + i} total $19.99 " + "lorem ipsum " * 300)
+        msg["Subject"] = f"Your receipt #{i}"
+        msg["From"] = "orders@example.com"
+        msg["Message-ID"] = f"<bench-{i}@example.com>"
+        messages.append(msg.as_bytes().replace(b"\n", b"\r\n"))
+    return messages
+
+
+def run(server, chunk_size):
+    os.environ["IMAP_FETCH_CHUNK_SIZE"] = str(chunk_size)
+    started = time.perf_counter()
+    with patch.object(
+        imaplib,
+        "IMAP4_SSL",
+        lambda host, port=993, timeout=None: imaplib.IMAP4("127.0.0.1", server.port),
+    ):
+        emails = EmailService.fetch_recent_emails("bench@example.com", "pw")
+    # Start every run from a fresh login so chunk sizes are compared fairly
+    imap_pool.close_all()
+    return len(emails), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    os.environ["EMAIL_BATCH_LIMIT"] = str(args.messages)
+    with ImapStandIn(build_corpus(args.messages), args.latency_ms / 1000) as server:
+        results = {size: run(server, size) for size in (1, 10, 50)}
+
+    print(f"\n📊 {args.messages} messages, {args.latency_ms:.0f} ms simulated RTT")
+    baseline = results[1][1]
+    for size, (count, elapsed) in results.items():
+        print(
+            f"   chunk={size:<3} fetched={count:<4} {elapsed:7.3f}s "
+            f"({baseline / elapsed:5.1f}x vs one-per-message)"
+        )
+
+
+if __name__ == "__main__":
+    main()
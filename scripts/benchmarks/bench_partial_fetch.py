@@ -0,0 +1,116 @@
+"""
+Benchmark: full BODY[] download vs. BODYSTRUCTURE-driven partial fetch.
+
+Builds receipts shaped like real ones (plain + HTML alternative, plus PDF and
+image attachments), serves them from the local IMAP stand-in and compares bytes
+on the wire, wall time and client CPU time (socket reads plus MIME parsing; the
+stand-in runs on other threads) for EmailService.fetch_recent_emails with
+IMAP_PARTIAL_FETCH off and on.
+
+Usage:
+    python scripts/benchmarks/bench_partial_fetch.py [--messages 100] [--attachment-kb 300]
+"""
+
+import argparse
+import imaplib
+import os
+import random
+import sys
+import time
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from backend.services.email_service import EmailService  # noqa: E402
+from backend.services.imap_pool import imap_pool  # noqa: E402
+from imap_standin import ImapStandIn  # noqa: E402
+
+
+def build_corpus(count, attachment_kb):
+    rng = random.Random(42)
+    messages = []
+    for i in range(1, count + 1):
+        text = f"Order #{100000 + i} total ${rng.randint(5, 500)}.99 " + "item " * 200
+        alternative = MIMEMultipart("alternative")
+        alternative.attach(MIMEText(text, "plain"))
+        alternative.attach(MIMEText(f"<html><body><p>{text}</p></body></html>", "html"))
+
+        msg = MIMEMultipart("mixed")
+        msg["Subject"] = f"Your receipt #{i}"
+        msg["From"] = "orders@example.com"
+        msg["Message-ID"] = f"<bench-{i}@example.com>"
+        msg.attach(alternative)
+        pdf = MIMEApplication(rng.randbytes(attachment_kb * 1024), "pdf")
+        pdf.add_header("Content-Disposition", "attachment", filename=f"receipt-{i}.pdf")
+        msg.attach(pdf)
+        if i % 3 == 0:
+            logo = MIMEImage(rng.randbytes(attachment_kb * 256), "png")
+            logo.add_header("Content-Disposition", "inline", filename="logo.png")
+            msg.attach(logo)
+        messages.append(msg.as_bytes().replace(b"\n", b"\r\n"))
+    return messages
+
+
+def run(server, partial):
+    os.environ["IMAP_PARTIAL_FETCH"] = "true" if partial else "false"
+    server.bytes_sent = 0
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    with patch.object(
+        imaplib,
+        "IMAP4_SSL",
+        lambda host, port=993, timeout=None: imaplib.IMAP4("127.0.0.1", server.port),
+    ):
+        emails = EmailService.fetch_recent_emails("bench@example.com", "pw")
+    cpu = time.thread_time() - cpu_started
+    elapsed = time.perf_counter() - started
+    imap_pool.close_all()
+    return emails, server.bytes_sent, elapsed, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--attachment-kb", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    os.environ["EMAIL_BATCH_LIMIT"] = str(args.messages)
+    corpus = build_corpus(args.messages, args.attachment_kb)
+    with ImapStandIn(corpus, args.latency_ms / 1000) as server:
+        # Real servers keep MIME structure indexed; do not time the stand-in's parse
+        for uid in range(1, len(corpus) + 1):
+            server.parsed(uid)
+        full_emails, full_bytes, full_time, full_cpu = run(server, partial=False)
+        part_emails, part_bytes, part_time, part_cpu = run(server, partial=True)
+
+    fields = ("message_id", "subject", "body", "html_body")
+    identical = len(full_emails) == len(part_emails) and all(
+        a[k] == b[k] for a, b in zip(full_emails, part_emails) for k in fields
+    )
+    print(
+        f"\n📊 {args.messages} receipts, {args.attachment_kb} KB attachments, "
+        f"{args.latency_ms:.0f} ms simulated RTT"
+    )
+    print(
+        f"   BODY[]   {full_bytes / 1e6:9.2f} MB  wall {full_time:7.3f}s  "
+        f"client CPU {full_cpu:7.3f}s"
+    )
+    print(
+        f"   partial  {part_bytes / 1e6:9.2f} MB  wall {part_time:7.3f}s  "
+        f"client CPU {part_cpu:7.3f}s"
+    )
+    print(
+        f"   {full_bytes / max(part_bytes, 1):.1f}x fewer bytes, "
+        f"{full_time / part_time:.1f}x faster, "
+        f"{full_cpu / max(part_cpu, 1e-9):.1f}x less client CPU"
+    )
+    print(f"   parsed results identical: {'✅' if identical else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: a commit per ProcessedEmail and its shadow-mode matches vs.
+ProcessedEmailWriter's bulk insert and single commit per chunk, with shadow
+rules matched against the rules snapshot and saved in one UPDATE per rule.
+
+Persists the same emails both ways, with the shadow-rule evaluation the
+scheduler does for each one, and reports the time spent in the database and
+the number of commits. Uses a SQLite file by default (commits fsync, as in
+production); pass --database-url to measure against Postgres.
+
+Usage:
+    python scripts/benchmarks/bench_persistence.py [--emails 500] [--chunk-size 50]
+    python scripts/benchmarks/bench_persistence.py --database-url postgresql://...
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=")
+
+from backend.models import ManualRule, ProcessedEmail  # noqa: E402
+from backend.security import encrypt_content  # noqa: E402
+from backend.services.learning_service import LearningService  # noqa: E402
+from backend.services.processed_writer import ProcessedEmailWriter  # noqa: E402
+from backend.services.rules_snapshot import RulesSnapshot  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine, delete  # noqa: E402
+
+
+def build_emails(count, run):
+    emails = []
+    for i in range(count):
+        sender = "orders@shop.com" if i % 4 == 0 else f"news{i % 7}@example.com"
+        emails.append(
+            {
+                "message_id": f"<bench-{run}-{i}@example.com>",
+                "subject": f"Your receipt #{i}",
+                "from": sender,
+                "body": f"Order #{100000 + i} total $12.99 " + "item " * 200,
+            }
+        )
+    return emails
+
+
+def record(email_data):
+    now = datetime.now(timezone.utc)
+    return ProcessedEmail(
+        email_id=email_data["message_id"],
+        subject=email_data["subject"],
+        sender=email_data["from"],
+        received_at=now,
+        processed_at=now,
+        status="forwarded",
+        account_email="bench@example.com",
+        category="receipt",
+        reason="Detected as receipt",
+        retention_expires_at=now + timedelta(hours=24),
+        encrypted_body=encrypt_content(email_data["body"]),
+    )
+
+
+def per_email(session, emails):
+    for email_data, processed in emails:
+        # Shadow rules loaded and saved for every email
+        LearningService.apply_shadow_matches(
+            session,
+            LearningService.count_shadow_matches(
+                [email_data], RulesSnapshot.load(session)
+            ),
+        )
+        session.add(processed)
+        session.commit()
+
+
+def batched(session, emails, chunk_size):
+    counts = LearningService.count_shadow_matches(
+        [email_data for email_data, _ in emails], RulesSnapshot.load(session)
+    )
+    writer = ProcessedEmailWriter(session, chunk_size)
+    for email_data, processed in emails:
+        writer.add(processed, email_data)
+    writer.flush()
+    LearningService.apply_shadow_matches(session, counts)
+    session.commit()
+
+
+def timed(engine, persist, emails, *args):
+    # Rows are built (and bodies encrypted) up front, so only DB work is timed
+    emails = [(email_data, record(email_data)) for email_data in emails]
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    with Session(engine) as session:
+        started = time.perf_counter()
+        persist(session, emails, *args)
+        elapsed = time.perf_counter() - started
+    return elapsed, len(commits)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.exec(delete(ProcessedEmail))
+            session.exec(delete(ManualRule))
+            session.add(ManualRule(email_pattern="*@shop.com", is_shadow_mode=True))
+            session.add(ManualRule(subject_pattern="*invoice*", is_shadow_mode=True))
+            session.commit()
+
+        old_time, old_commits = timed(engine, per_email, build_emails(args.emails, "a"))
+        new_time, new_commits = timed(
+            engine, batched, build_emails(args.emails, "b"), args.chunk_size
+        )
+        engine.dispose()
+
+    print(
+        f"\n📊 {args.emails} emails, 2 shadow rules, "
+        f"{url.split(':', 1)[0]}, chunks of {args.chunk_size}"
+    )
+    print(f"   commit per email  {old_time:7.3f}s  {old_commits:5} commits")
+    print(f"   chunked writer    {new_time:7.3f}s  {new_commits:5} commits")
+    print(f"   {old_time / max(new_time, 1e-9):.1f}x less time in the database")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: one scheduler run end to end with slow SMTP.
+
+Feeds a synthetic corpus (detector_corpus.py) through process_emails with the
+IMAP fetch stubbed out and forward_email replaced by a sleep of --smtp-ms, on
+a throwaway SQLite file, then prints the run's wall time and the per-stage
+metrics stored on ProcessingRun.pipeline_stats.
+
+Usage:
+    python scripts/benchmarks/bench_pipeline.py [--emails 300] [--smtp-ms 200] [--forward-workers 2]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "cpUbNMiXWufM3gAPx1arHE1h7Y72s9sBri-MDiWtwb4=")
+os.environ.setdefault("WIFE_EMAIL", "wife@example.com")
+
+import backend.services.scheduler as scheduler_module  # noqa: E402
+from backend.models import ProcessingRun  # noqa: E402
+from detector_corpus import build_corpus  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine, select  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--smtp-ms", type=float, default=200.0)
+    parser.add_argument("--forward-workers", type=int, default=2)
+    args = parser.parse_args()
+    os.environ["FORWARD_WORKERS"] = str(args.forward_workers)
+
+    corpus = build_corpus(args.emails)
+    for i, email in enumerate(corpus):
+        email["message_id"] = f"<bench-{i}@example.com>"
+
+    def fetch(*_args, **_kwargs):
+        return ({k: v for k, v in email.items() if k != "expected"} for email in corpus)
+
+    def forward(email_data, target_email):
+        time.sleep(args.smtp_ms / 1000)
+        return True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        with patch.object(scheduler_module, "engine", engine), patch.object(
+            scheduler_module.EmailService, "iter_recent_emails", fetch
+        ), patch.object(scheduler_module.EmailForwarder, "forward_email", forward):
+            started = time.perf_counter()
+            scheduler_module.process_emails(
+                accounts=[{"email": "bench@example.com", "password": "p"}]
+            )
+            elapsed = time.perf_counter() - started
+        with Session(engine) as session:
+            run = session.exec(select(ProcessingRun)).one()
+        engine.dispose()
+
+    receipts = sum(1 for email in corpus if email.get("expected"))
+    print(
+        f"\n📊 {args.emails} emails ({run.emails_forwarded} forwarded of "
+        f"{receipts} receipts), {args.smtp_ms:.0f} ms per SMTP send, "
+        f"{args.forward_workers} forward workers"
+    )
+    print(f"   run wall time {elapsed:7.2f}s")
+    print(
+        f"   {'stage':<9} {'workers':>7} {'items':>6} {'busy ms':>10} "
+        f"{'wait ms':>10} {'per sec':>8} {'max q':>6} {'avg q':>6}"
+    )
+    for name, stage in (run.pipeline_stats or {}).items():
+        print(
+            f"   {name:<9} {stage['workers']:>7} {stage['items']:>6} "
+            f"{stage['busy_ms']:>10.1f} {stage['wait_ms']:>10.1f} "
+            f"{stage['per_sec'] or 0:>8.1f} {stage['max_queue']:>6} "
+            f"{stage['avg_queue']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Minimal local IMAP4rev1 stand-in for benchmarks.
+
+Implements just enough of the protocol for imaplib and EmailService:
+CAPABILITY, LOGIN, SELECT/EXAMINE, UID SEARCH, UID FETCH (BODY[], header
+fields, BODYSTRUCTURE and numbered sections with <0.N> ranges), NOOP, CLOSE,
+LOGOUT. Every tagged completion is delayed by `latency` seconds to simulate the
+round trip to a remote server such as Gmail or iCloud, and every byte written
+is counted in `bytes_sent`.
+"""
+
+import email
+import re
+import socketserver
+import threading
+import time
+
+_RANGE_RE = re.compile(r"UID (\d+):(\d+|\*)", re.IGNORECASE)
+_SECTION_RE = re.compile(r"BODY(?:\.PEEK)?\[([0-9.]+)\](?:<0\.(\d+)>)?", re.IGNORECASE)
+
+
+def parse_uid_set(message_set, max_uid):
+    """Expands an IMAP sequence set such as "1:3,7,9:*" into UIDs."""
+    uids = []
+    for item in message_set.split(","):
+        start, _, end = item.partition(":")
+        start_uid = max_uid if start == "*" else int(start)
+        end_uid = start_uid if not end else (max_uid if end == "*" else int(end))
+        low, high = sorted((start_uid, end_uid))
+        uids.extend(range(low, high + 1))
+    return uids
+
+
+def _quote(value):
+    return "NIL" if value is None else '"' + str(value).replace('"', '\\"') + '"'
+
+
+def _params(pairs):
+    if not pairs:
+        return "NIL"
+    return "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in pairs) + ")"
+
+
+def body_structure(part):
+    """Renders a BODYSTRUCTURE list for an email.message.Message."""
+    if part.is_multipart():
+        children = "".join(body_structure(child) for child in part.get_payload())
+        return (
+            f"({children} {_quote(part.get_content_subtype().upper())} NIL NIL NIL NIL)"
+        )
+    payload = part.get_payload()
+    size = len(payload) if isinstance(payload, str) else 0
+    disposition = "NIL"
+    if part.get_content_disposition():
+        disposition = f"({_quote(part.get_content_disposition().upper())} NIL)"
+    fields = (
+        f"{_quote(part.get_content_maintype().upper())} "
+        f"{_quote(part.get_content_subtype().upper())} "
+        f"{_params(part.get_params()[1:])} NIL NIL "
+        f"{_quote((part.get('Content-Transfer-Encoding') or '7BIT').upper())} {size}"
+    )
+    if part.get_content_maintype() == "text":
+        fields += f" {payload.count(chr(10)) + 1}"
+    return f"({fields} NIL {disposition} NIL NIL)"
+
+
+def section_bytes(msg, section):
+    """Returns the encoded body of a numbered MIME section such as "1.2"."""
+    part = msg
+    for number in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+        elif number != "1":
+            return b""
+    payload = part.get_payload()
+    return (
+        payload.encode("ascii", "surrogateescape") if isinstance(payload, str) else b""
+    )
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _write(self, data):
+        self.server.count_bytes(len(data))
+        self.wfile.write(data)
+
+    def _send(self, line):
+        self._write(line.encode() + b"\r\n")
+
+    def _complete(self, tag, text="OK completed"):
+        time.sleep(self.server.latency)
+        self._send(f"{tag} {text}")
+        self.wfile.flush()
+
+    def handle(self):
+        messages = self.server.messages
+        self._send("* OK [CAPABILITY IMAP4rev1] Stand-in ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().strip().split(" ", 2)
+            tag, command = parts[0], parts[1].upper() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else ""
+
+            if command == "CAPABILITY":
+                self._send("* CAPABILITY IMAP4rev1")
+                self._complete(tag)
+            elif command in ("LOGIN", "NOOP", "CLOSE"):
+                self._complete(tag)
+            elif command in ("SELECT", "EXAMINE"):
+                self._send(f"* {len(messages)} EXISTS")
+                self._send(f"* OK [UIDVALIDITY {self.server.uidvalidity}] UIDs valid")
+                self._send(f"* OK [UIDNEXT {len(messages) + 1}] Predicted next UID")
+                self._complete(tag, "OK [READ-WRITE] SELECT completed")
+            elif command == "UID":
+                self._handle_uid(tag, args)
+            elif command == "LOGOUT":
+                self._send("* BYE Stand-in logging out")
+                self._complete(tag)
+                return
+            else:
+                self._complete(tag, "BAD unsupported command")
+
+    def _handle_uid(self, tag, args):
+        messages = self.server.messages
+        sub_command, _, rest = args.partition(" ")
+        if sub_command.upper() == "SEARCH":
+            uids = list(range(1, len(messages) + 1))
+            uid_range = _RANGE_RE.search(rest)
+            if uid_range:
+                uids = parse_uid_set(
+                    f"{uid_range.group(1)}:{uid_range.group(2)}", len(messages)
+                )
+            self._send("* SEARCH " + " ".join(str(u) for u in uids))
+            self._complete(tag)
+            return
+
+        message_set, _, items = rest.partition(" ")
+        for uid in parse_uid_set(message_set, len(messages)):
+            if not 1 <= uid <= len(messages):
+                continue
+            raw = messages[uid - 1]
+            if "BODYSTRUCTURE" in items.upper():
+                msg = self.server.parsed(uid)
+                self._send(
+                    f"* {uid} FETCH (UID {uid} BODYSTRUCTURE {body_structure(msg)})"
+                )
+                continue
+            literals = []
+            if "HEADER.FIELDS" in items.upper():
+                start = items.upper().index("BODY")
+                section = items[start : items.index("]", start) + 1]
+                section = section.replace("BODY.PEEK", "BODY")
+                literals.append((section, raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"))
+            sections = _SECTION_RE.findall(items)
+            if sections:
+                msg = self.server.parsed(uid)
+                for number, cap in sections:
+                    data = section_bytes(msg, number)
+                    if cap:
+                        literals.append((f"BODY[{number}]<0>", data[: int(cap)]))
+                    else:
+                        literals.append((f"BODY[{number}]", data))
+            if not literals:
+                literals.append(("BODY[]", raw))
+            prefix = f"* {uid} FETCH (UID {uid}"
+            for section, literal in literals:
+                self._write(f"{prefix} {section} {{{len(literal)}}}\r\n".encode())
+                self._write(literal)
+                prefix = ""
+            self._write(b")\r\n")
+        self._complete(tag)
+
+
+class ImapStandIn(socketserver.ThreadingTCPServer):
+    """Threaded stand-in server; use as a context manager."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages, latency=0.0, uidvalidity=1):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.messages = messages
+        self.latency = latency
+        self.uidvalidity = uidvalidity
+        self.bytes_sent = 0
+        self._bytes_lock = threading.Lock()
+        self._parsed = {}
+
+    def parsed(self, uid):
+        """MIME tree for a message, parsed once like a real server's index."""
+        if uid not in self._parsed:
+            self._parsed[uid] = email.message_from_bytes(self.messages[uid - 1])
+        return self._parsed[uid]
+
+    def count_bytes(self, count):
+        with self._bytes_lock:
+            self.bytes_sent += count
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
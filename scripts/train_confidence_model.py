@@ -0,0 +1,92 @@
+"""
+Fits the detection confidence model from the feedback recorded in the
+history view ("Should be receipt?"), and saves it as JSON.
+
+The fitted model is a logistic regression over DetectorEngine.features(), so
+its confidences are calibrated: 80 means about 80% of similar emails were
+receipts. The app keeps the hand-tuned weights until DETECTOR_CONFIDENCE_MODEL
+points at the saved file; after retraining, a restart picks the new weights up.
+
+Usage:
+    python scripts/train_confidence_model.py --out confidence_model.json
+    python scripts/train_confidence_model.py --out model.json --corpus corpus.jsonl
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import engine  # noqa: E402
+from backend.services import confidence_model as cm  # noqa: E402
+from backend.services.detector_engine import get_engine  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+
+def corpus_samples(path):
+    """Rows and labels from a labelled benchmark corpus (detector_corpus.py)."""
+    sys.path.append(os.path.join(os.path.dirname(__file__), "benchmarks"))
+    from detector_corpus import load_corpus
+
+    detector_engine = get_engine()
+    rows, labels = [], []
+    for email in load_corpus(path):
+        if "expected" not in email:
+            continue
+        prepared = detector_engine.prepare(
+            email.get("subject", ""), email.get("body", ""), email.get("from", "")
+        )
+        rows.append(detector_engine.features(prepared))
+        labels.append(bool(email["expected"]))
+    return rows, labels
+
+
+def accuracy(model, rows, labels):
+    scores = model.score_vectors(rows)
+    return sum((score >= 50) == label for score, label in zip(scores, labels)) / len(
+        labels
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--corpus", help="Also train on a labelled JSONL corpus")
+    parser.add_argument("--min-samples", type=int, default=20)
+    parser.add_argument("--epochs", type=int, default=2000)
+    parser.add_argument("--l2", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        rows, labels = cm.feedback_samples(session, get_engine())
+    print(f"📥 {len(rows)} emails with feedback")
+    if args.corpus:
+        corpus_rows, corpus_labels = corpus_samples(args.corpus)
+        rows += corpus_rows
+        labels += corpus_labels
+        print(f"📥 {len(corpus_rows)} labelled emails from {args.corpus}")
+
+    if len(rows) < args.min_samples or len(set(labels)) < 2:
+        print(
+            f"❌ Need at least {args.min_samples} samples with both receipts and "
+            "non-receipts; keep the hand-tuned weights for now."
+        )
+        return 1
+
+    hand = cm.ConfidenceModel(cm.HAND_WEIGHTS, gates=cm.HAND_GATES)
+    model = cm.fit_confidence_model(rows, labels, epochs=args.epochs, l2=args.l2)
+    for name in model.features:
+        print(f"   {name:<26} {model.to_dict()['weights'][name]:+8.3f}")
+    print(f"   {'bias':<26} {model.bias:+8.3f}")
+    print(
+        f"🎯 Accuracy at 50: fitted {accuracy(model, rows, labels):.2%}, "
+        f"hand weights {accuracy(hand, rows, labels):.2%}"
+    )
+    cm.save_confidence_model(model, args.out)
+    print(f"💾 Saved to {args.out}; set DETECTOR_CONFIDENCE_MODEL={args.out} to use it")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())